@@ -0,0 +1,377 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import requests
+
+from synthetic import Universe
+
+ABBREVIATED_MIME = "application/vnd.npm.install-v1+json"
+LIVE_REGISTRY_URL = "https://registry.npmjs.org"
+LIVE_OSV_URL = "https://api.osv.dev"
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+def _fixture_name(name):
+    return quote(name, safe="")
+
+
+class Fixtures:
+    """
+    Recorded upstream responses, used in preference to the synthetic
+    universe: packuments/<name>.json, osv/<name>.json (a /v1/query
+    response), tarballs/<file>.tgz and an optional names.txt for _all_docs.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root) if root else None
+
+    def _read(self, *parts):
+        if self.root is None:
+            return None
+        path = self.root.joinpath(*parts)
+        return path.read_bytes() if path.exists() else None
+
+    def packument(self, name):
+        raw = self._read("packuments", f"{_fixture_name(name)}.json")
+        return json.loads(raw) if raw else None
+
+    def osv(self, name):
+        raw = self._read("osv", f"{_fixture_name(name)}.json")
+        return json.loads(raw) if raw else None
+
+    def tarball(self, filename):
+        return self._read("tarballs", filename)
+
+    def names(self):
+        raw = self._read("names.txt")
+        return sorted({n for n in raw.decode("utf-8").split("\n") if n}) if raw else None
+
+
+def record_fixtures(names, fixtures_dir, registry_url=LIVE_REGISTRY_URL, osv_url=LIVE_OSV_URL):
+    """Fetch packuments, latest tarballs and OSV results for names from the live services."""
+    root = Path(fixtures_dir)
+    for sub in ("packuments", "osv", "tarballs"):
+        (root / sub).mkdir(parents=True, exist_ok=True)
+    session = requests.Session()
+
+    for name in names:
+        res = session.get(f"{registry_url}/{quote(name, safe='@')}", timeout=30)
+        if res.status_code != 200:
+            print(f"[WARN] {name}: registry returned {res.status_code}")
+            continue
+        doc = res.json()
+        (root / "packuments" / f"{_fixture_name(name)}.json").write_bytes(res.content)
+
+        latest = doc.get("dist-tags", {}).get("latest")
+        tarball = doc.get("versions", {}).get(latest, {}).get("dist", {}).get("tarball")
+        if tarball:
+            tgz = session.get(tarball, timeout=60)
+            if tgz.status_code == 200:
+                (root / "tarballs" / tarball.rsplit("/", 1)[-1]).write_bytes(tgz.content)
+
+        query = {"package": {"name": name, "ecosystem": "npm"}, "version": latest}
+        res = session.post(f"{osv_url}/v1/query", json=query, timeout=30)
+        if res.status_code == 200:
+            (root / "osv" / f"{_fixture_name(name)}.json").write_bytes(res.content)
+        print(f"[INFO] Recorded {name}")
+
+    with open(root / "names.txt", "a") as f:
+        f.writelines(n + "\n" for n in names)
+
+
+# -----------------------------
+# Server
+# -----------------------------
+class FakeUpstream:
+    """
+    Stand-in for the npm registry, the replication endpoint (/registry)
+    and the OSV API on one local port. Every request can be delayed by
+    latency_ms (+ up to jitter_ms) and failed with probability error_rate
+    (503) or throttle_rate (429 with Retry-After). Counters are served at
+    /__stats and cleared with POST /__reset.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, universe=None, fixtures=None,
+                 latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=0, seed=0):
+        self.universe = universe or Universe()
+        self.fixtures = Fixtures(fixtures)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.names = self.fixtures.names() or sorted(self.universe.names)
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+        handler = type("Handler", (_Handler,), {"upstream": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Stats ------------------------------------------------------------
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "bytes": 0, "errors_injected": 0, "by_route": {},
+                          "started_at": time.time()}
+
+    def count(self, route, status, size):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += size
+            by = self.stats["by_route"].setdefault(route, {})
+            by[str(status)] = by.get(str(status), 0) + 1
+
+    def inject(self):
+        """Sleep for the configured latency; return a status to fail with, or None."""
+        delay = self.latency_ms + (self.rng.random() * self.jitter_ms if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+        roll = self.rng.random()
+        if roll < self.error_rate:
+            status = 503
+        elif roll < self.error_rate + self.throttle_rate:
+            status = 429
+        else:
+            return None
+        with self._lock:
+            self.stats["errors_injected"] += 1
+        return status
+
+    # Documents --------------------------------------------------------
+    def packument(self, name, abbreviated):
+        key = (name, abbreviated)
+        with self._lock:
+            body = self._bodies.get(key)
+        if body is not None:
+            return body
+
+        doc = self.fixtures.packument(name)
+        if doc is not None:
+            for info in doc.get("versions", {}).values():
+                dist = info.get("dist", {})
+                filename = dist.get("tarball", "").rsplit("/", 1)[-1]
+                if filename and self.fixtures.tarball(filename) is not None:
+                    dist["tarball"] = f"{self.url}/{quote(name, safe='@')}/-/{filename}"
+        elif self.universe.exists(name):
+            doc = self.universe.packument(name, self.url)
+        else:
+            return None
+
+        if abbreviated:
+            doc = {
+                "name": doc.get("name", name),
+                "modified": doc.get("time", {}).get("modified"),
+                "dist-tags": doc.get("dist-tags", {}),
+                "versions": {
+                    v: {k: info[k] for k in ("name", "version", "dependencies", "dist", "engines") if k in info}
+                    for v, info in doc.get("versions", {}).items()
+                },
+            }
+        body = json.dumps(doc).encode("utf-8")
+        with self._lock:
+            self._bodies[key] = body
+        return body
+
+    def tarball(self, name, filename):
+        tgz = self.fixtures.tarball(filename)
+        if tgz is not None:
+            return tgz
+        version = filename[len(name.split("/")[-1]) + 1:-len(".tgz")]
+        if not self.universe.exists(name) or version != self.universe.version(name):
+            return None
+        return self.universe.tarball(name, version)
+
+    def vulns(self, name):
+        recorded = self.fixtures.osv(name)
+        if recorded is not None:
+            return recorded.get("vulns", [])
+        return [{"id": vid, "summary": f"Synthetic advisory for {name}", "modified": "2024-01-01T00:00:00Z"}
+                for vid in self.universe.vulnerabilities(name)]
+
+    def all_docs(self, startkey, limit):
+        start = bisect_left(self.names, startkey) if startkey is not None else 0
+        rows = [{"id": n, "key": n, "value": {"rev": "1-bench"}} for n in self.names[start:start + limit]]
+        return {"total_rows": len(self.names), "offset": start, "rows": rows}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    upstream = None  # set per server
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", route="", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if route == "tarball" else "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        if route:
+            self.upstream.count(route, status, len(body))
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _fail_injected(self, route):
+        status = self.upstream.inject()
+        if status is None:
+            return False
+        headers = {"Retry-After": str(self.upstream.retry_after)} if status == 429 else None
+        self._send(status, {"error": "injected"}, route, headers)
+        return True
+
+    def do_GET(self):
+        up = self.upstream
+        parts = urlsplit(self.path)
+        path, query = unquote(parts.path), parse_qs(parts.query)
+
+        if path == "/__stats":
+            return self._send(200, up.stats)
+
+        if path.startswith("/registry"):
+            rest = path[len("/registry"):].strip("/")
+            if self._fail_injected("replicate"):
+                return
+            if rest == "":
+                return self._send(200, {"db_name": "registry", "update_seq": 1}, "replicate")
+            if rest == "_all_docs":
+                startkey = json.loads(query["startkey"][0]) if "startkey" in query else None
+                limit = int(query.get("limit", ["1000"])[0])
+                return self._send(200, up.all_docs(startkey, limit), "all_docs")
+            if rest == "_changes":
+                since = query.get("since", ["0"])[0]
+                return self._send(200, {"results": [], "last_seq": since}, "changes")
+            return self._send(404, {"error": "not_found"}, "replicate")
+
+        if path.startswith("/v1/vulns/"):
+            if self._fail_injected("osv_vuln"):
+                return
+            vuln_id = path[len("/v1/vulns/"):]
+            return self._send(200, {"id": vuln_id, "summary": f"Synthetic advisory {vuln_id}"}, "osv_vuln")
+
+        if "/-/" in path:
+            name, _, filename = path.lstrip("/").partition("/-/")
+            if self._fail_injected("tarball"):
+                return
+            tgz = up.tarball(name, filename)
+            if tgz is None:
+                return self._send(404, b"", "tarball")
+            return self._send(200, tgz, "tarball")
+
+        name = path.lstrip("/")
+        if not name:
+            return self._send(404, {"error": "not_found"})
+        abbreviated = ABBREVIATED_MIME in (self.headers.get("Accept") or "")
+        route = "packument_abbreviated" if abbreviated else "packument"
+        if self._fail_injected(route):
+            return
+        body = up.packument(name, abbreviated)
+        if body is None:
+            return self._send(404, {"error": "Not found"}, route)
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", route, {"ETag": etag})
+        return self._send(200, body, route, {"ETag": etag})
+
+    def do_POST(self):
+        up = self.upstream
+        path = urlsplit(self.path).path
+
+        if path == "/__reset":
+            up.reset_stats()
+            return self._send(200, {"ok": True})
+
+        if path == "/v1/querybatch":
+            queries = self._read_json().get("queries", [])
+            if self._fail_injected("osv_querybatch"):
+                return
+            results = []
+            for q in queries:
+                vulns = up.vulns(q.get("package", {}).get("name", ""))
+                results.append({"vulns": [{"id": v["id"], "modified": v.get("modified")} for v in vulns]}
+                               if vulns else {})
+            return self._send(200, {"results": results}, "osv_querybatch")
+
+        if path == "/v1/query":
+            q = self._read_json()
+            if self._fail_injected("osv_query"):
+                return
+            vulns = up.vulns(q.get("package", {}).get("name", ""))
+            return self._send(200, {"vulns": vulns} if vulns else {}, "osv_query")
+
+        self._send(404, {"error": "not_found"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake npm registry + OSV server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--packages", type=int, default=5000, help="synthetic universe size")
+    parser.add_argument("--fixtures", help="directory of recorded responses")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction answered 429")
+    parser.add_argument("--record", help="file of package names to record into --fixtures, then exit")
+    args = parser.parse_args()
+
+    if args.record:
+        with open(args.record) as f:
+            record_fixtures([line.strip() for line in f if line.strip()], args.fixtures or "fixtures")
+        return
+
+    upstream = FakeUpstream(
+        args.host, args.port, Universe(args.packages), args.fixtures,
+        args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate,
+    )
+    print(f"[INFO] Fake registry/OSV listening on {upstream.url}")
+    print(f"[INFO]   NPM_REGISTRY_URL={upstream.url} OSV_API_URL={upstream.url} "
+          f"NPM_REPLICATE_URL={upstream.url}/registry")
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
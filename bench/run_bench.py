@@ -0,0 +1,462 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from fake_upstream import FakeUpstream
+from synthetic import Universe, scaled_upload, typo_variants
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+DATA_DIR = REPO_DIR / "data"
+BACKEND_DIR = REPO_DIR / "finalproj" / "backend"
+RESULTS_FILE = BENCH_DIR / "results.jsonl"
+
+SCENARIOS = ("crawl", "typosquat", "nodemedic", "pipeline", "upload", "risk")
+TYPOSQUAT_TARGETS = ("express", "react", "lodash")  # what typosquat_audit scans for
+
+# A run is flagged when it is this much worse than the previous comparable run
+THROUGHPUT_DROP = 0.10
+LATENCY_RISE = 0.20
+RSS_RISE = 0.20
+
+
+# -----------------------------
+# Measurement helpers
+# -----------------------------
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb(pid=None):
+    """Peak resident set size of this process, or of pid via /proc (Linux)."""
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Timed:
+    """Wrap an (async) callable to record each call's duration in ms."""
+
+    def __init__(self, owner, attr):
+        self.owner, self.attr = owner, attr
+        self.original = getattr(owner, attr)
+        self.samples = []
+
+    def __enter__(self):
+        original, samples = self.original, self.samples
+        if asyncio.iscoroutinefunction(original):
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    samples.append((time.perf_counter() - started) * 1000)
+        else:
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    samples.append((time.perf_counter() - started) * 1000)
+        setattr(self.owner, self.attr, wrapper)
+        return self
+
+    def __exit__(self, *exc):
+        setattr(self.owner, self.attr, self.original)
+
+
+def upstream_stats(url, reset=False):
+    if reset:
+        requests.post(f"{url}/__reset", timeout=5)
+        return None
+    return requests.get(f"{url}/__stats", timeout=5).json()
+
+
+# -----------------------------
+# Scenarios (run inside the child process)
+# -----------------------------
+def bench_crawl(params, upstream_url):
+    import recursive_dependency_checker as rdc
+    from async_fetch import RegistryFetcher
+    from dependency_db import DependencyDB
+
+    with DependencyDB("bench.db") as db, Timed(RegistryFetcher, "fetch_json") as timed:
+        started = time.perf_counter()
+        graph = asyncio.run(rdc.crawl_dependencies(
+            params["roots"], db, params["concurrency"], params["rate"]
+        ))
+        wall = time.perf_counter() - started
+    return {"wall_s": wall, "ops": len(graph), "latencies_ms": timed.samples}
+
+
+def bench_typosquat(params, upstream_url):
+    import typosquat_audit as ta
+    from typosquat_index import TyposquatIndex
+
+    started = time.perf_counter()
+    TyposquatIndex.build(ta.ALL_PACKAGES_FILE, "typosquat_index").close()
+    index_build = time.perf_counter() - started
+
+    with Timed(ta, "fetch_package_info") as timed:
+        ta.audit_typosquats(ta.ALL_PACKAGES_FILE, "typosquat_index")
+    wall = time.perf_counter() - started
+    return {"wall_s": wall, "ops": len(timed.samples), "latencies_ms": timed.samples,
+            "index_build_s": round(index_build, 3)}
+
+
+def bench_nodemedic(params, upstream_url):
+    import recursive_dependency_checker as rdc
+    import run_node_medic_fine as rnm
+    from dependency_db import DependencyDB, DB_FILE
+
+    # Setup (not measured): crawl the roots so the runner has jobs
+    with DependencyDB(DB_FILE) as db:
+        db.mark_roots(params["roots"])
+        asyncio.run(rdc.crawl_dependencies(params["roots"], db, 64, 10_000))
+    upstream_stats(upstream_url, reset=True)
+
+    started = time.perf_counter()
+    rnm.main(params["workers"], params["batch"])
+    wall = time.perf_counter() - started
+
+    latencies = []
+    with open(rnm.TIMINGS_FILE) as f:
+        for line in f:
+            rec = json.loads(line)
+            if "package" in rec:
+                latencies.append(1000 * sum(v for k, v in rec.items() if k.endswith("_s")))
+    return {"wall_s": wall, "ops": len(latencies), "latencies_ms": latencies}
+
+
+def bench_pipeline(params, upstream_url):
+    import pipeline
+    import run_node_medic_fine as rnm
+
+    started = time.perf_counter()
+    out = pipeline.Pipeline(list(TYPOSQUAT_TARGETS), analysis_workers=params["workers"],
+                            batch=params["batch"]).execute()
+    wall = time.perf_counter() - started
+
+    latencies = []
+    with open(rnm.TIMINGS_FILE) as f:
+        for line in f:
+            rec = json.loads(line)
+            latencies.append(1000 * sum(v for k, v in rec.items() if k.endswith("_s")))
+    return {"wall_s": wall, "ops": len(latencies), "latencies_ms": latencies, **out}
+
+
+def bench_upload(params, upstream_url):
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=os.environ.copy(),
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(200):
+            try:
+                if requests.get(f"{base}/api/cache/stats", timeout=1).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("backend did not start")
+
+        body = Path("upload.json").read_bytes()
+        upstream_stats(upstream_url, reset=True)
+        latencies, failures = [], 0
+
+        async def load():
+            nonlocal failures
+            sem = asyncio.Semaphore(params["clients"])
+            async with httpx.AsyncClient(timeout=300) as client:
+                async def one():
+                    nonlocal failures
+                    async with sem:
+                        t = time.perf_counter()
+                        res = await client.post(f"{base}{params['endpoint']}",
+                                                files={"file": ("upload.json", body)})
+                        await res.aread()
+                        latencies.append((time.perf_counter() - t) * 1000)
+                        failures += res.status_code != 200
+                await asyncio.gather(*(one() for _ in range(params["requests"])))
+
+        started = time.perf_counter()
+        asyncio.run(load())
+        wall = time.perf_counter() - started
+        rss = peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait(10)
+    return {"wall_s": wall, "ops": len(latencies), "latencies_ms": latencies,
+            "failures": failures, "peak_rss_mb": rss}
+
+
+def bench_risk(params, upstream_url):
+    sys.path.append(str(BACKEND_DIR))  # after data/, whose metrics module run_child reads
+    from risk import RiskGraph
+
+    # The streaming upload's pattern: build with no advisories, then fold
+    # each vulnerable package in with set_risk
+    universe = Universe(params["nodes"])
+    edges = [(name, dep) for name in universe.names for dep in universe.dependencies(name)]
+    vulnerable = [name for name in universe.names if universe.vulnerabilities(name)]
+
+    started = time.perf_counter()
+    graph = RiskGraph(universe.names, edges)
+    build = time.perf_counter() - started
+    with Timed(graph, "set_risk") as timed:
+        for name in vulnerable:
+            graph.set_risk(name, 1)
+    graph.summaries()
+    wall = time.perf_counter() - started
+
+    # Size of the reachability bitsets, the part that grows with graph size
+    reach_mb = sum(sys.getsizeof(mask) for mask in graph.reach) / 2 ** 20
+    return {"wall_s": wall, "ops": len(timed.samples), "latencies_ms": timed.samples,
+            "build_s": round(build, 3), "edges": len(edges), "risk_reach_mb": round(reach_mb, 2)}
+
+
+CHILD_SCENARIOS = {
+    "crawl": bench_crawl,
+    "typosquat": bench_typosquat,
+    "nodemedic": bench_nodemedic,
+    "pipeline": bench_pipeline,
+    "upload": bench_upload,
+    "risk": bench_risk,
+}
+
+
+def run_child(scenario, params, upstream_url):
+    sys.path.insert(0, str(DATA_DIR))
+    upstream_stats(upstream_url, reset=True)
+    out = CHILD_SCENARIOS[scenario](params, upstream_url)
+    stats = upstream_stats(upstream_url)
+    from metrics import metrics
+    phases = {h["labels"]["phase"]: round(h["sum"], 3)
+              for h in metrics.snapshot()["histograms"] if h["name"] == "phase_seconds"}
+
+    latencies = out.pop("latencies_ms")
+    wall = out.pop("wall_s")
+    result = {
+        "wall_s": round(wall, 3),
+        "ops": out.pop("ops"),
+        "p50_ms": _round(percentile(latencies, 50)),
+        "p99_ms": _round(percentile(latencies, 99)),
+        "peak_rss_mb": _round(out.pop("peak_rss_mb", None) or peak_rss_mb()),
+        "upstream_requests": stats["requests"],
+        "upstream_errors_injected": stats["errors_injected"],
+        "phase_s": phases,
+        **out,
+    }
+    result["ops_per_s"] = _round(result["ops"] / wall if wall else None)
+    result["upstream_req_per_s"] = _round(stats["requests"] / wall if wall else None)
+    print(json.dumps(result))
+
+
+def _round(x):
+    return round(x, 2) if isinstance(x, float) else x
+
+
+# -----------------------------
+# Driver (parent process)
+# -----------------------------
+def scenario_params(scenario, args, universe):
+    roots = universe.names[:args.roots]
+    if scenario == "crawl":
+        return {"roots": roots, "concurrency": args.concurrency, "rate": args.rate}
+    if scenario == "typosquat":
+        return {"packages": args.packages, "typos": args.typos}
+    if scenario == "nodemedic":
+        return {"roots": roots[:args.nodemedic_roots], "workers": args.workers, "batch": args.batch}
+    if scenario == "pipeline":
+        return {"packages": args.packages, "typos": args.typos, "workers": args.workers, "batch": args.batch}
+    if scenario == "risk":
+        return {"nodes": args.risk_nodes}
+    return {"scale": args.scale, "clients": args.clients, "requests": args.requests,
+            "endpoint": args.endpoint}
+
+
+def prepare_workdir(scenario, params, universe, workdir):
+    if scenario in ("typosquat", "pipeline"):
+        names = set(universe.names)
+        for target in TYPOSQUAT_TARGETS:
+            names.update(typo_variants(target, params["typos"]))
+        (workdir / "all_package_names.txt").write_text("\n".join(sorted(names)) + "\n")
+    elif scenario == "upload":
+        (workdir / "upload.json").write_text(json.dumps(scaled_upload(params["scale"])))
+
+
+def child_env(upstream_url, workdir, warm_cache):
+    env = os.environ.copy()
+    env.update({
+        "NPM_REGISTRY_URL": upstream_url,
+        "OSV_API_URL": upstream_url,
+        "NPM_REPLICATE_URL": f"{upstream_url}/registry",
+        "DOCKER": shlex.join([sys.executable, str(BENCH_DIR / "stub_docker.py")]),
+        "NODEMEDIC_IMAGE": "bench-stub",
+        "NODEMEDIC_DEBUG_LOG": str(workdir / "nm_debug.log"),
+        "TQDM_DISABLE": "1",
+        "PYTHONPATH": os.pathsep.join([str(BENCH_DIR), env.get("PYTHONPATH", "")]).rstrip(os.pathsep),
+    })
+    if not warm_cache:
+        env["NPM_HTTP_CACHE_DIR"] = str(workdir / "http_cache")
+    return env
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(results_file, scenario, config):
+    if not Path(results_file).exists():
+        return None
+    previous = None
+    with open(results_file) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("scenario") == scenario and rec.get("config") == config:
+                previous = rec
+    return previous
+
+
+def regressions(prev, cur):
+    found = []
+    if prev.get("ops_per_s") and cur.get("ops_per_s") is not None:
+        if cur["ops_per_s"] < prev["ops_per_s"] * (1 - THROUGHPUT_DROP):
+            found.append(f"throughput {prev['ops_per_s']} → {cur['ops_per_s']} ops/s")
+    for metric, limit in (("p99_ms", LATENCY_RISE), ("peak_rss_mb", RSS_RISE), ("risk_reach_mb", RSS_RISE)):
+        if prev.get(metric) and cur.get(metric) is not None and cur[metric] > prev[metric] * (1 + limit):
+            found.append(f"{metric} {prev[metric]} → {cur[metric]}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipelines against a local fake registry/OSV.")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help=", ".join(SCENARIOS))
+    parser.add_argument("--packages", type=int, default=5000, help="synthetic registry size")
+    parser.add_argument("--fixtures", help="recorded responses to serve instead of synthetic ones")
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--roots", type=int, default=100, help="crawl roots")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=1000, help="crawl requests/second budget")
+    parser.add_argument("--typos", type=int, default=50, help="typo variants per target")
+    parser.add_argument("--nodemedic-roots", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", action="store_true", help="NodeMedic warm-container mode")
+    parser.add_argument("--scale", type=int, default=20, help="copies of the sample graphs per upload")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent upload clients")
+    parser.add_argument("--requests", type=int, default=40, help="uploads to send")
+    parser.add_argument("--endpoint", default="/api/upload")
+    parser.add_argument("--risk-nodes", type=int, default=50_000, help="dependency graph size for risk")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the shared on-disk HTTP cache")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--results", default=str(RESULTS_FILE))
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--params", help=argparse.SUPPRESS)
+    parser.add_argument("--upstream", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, json.loads(args.params), args.upstream)
+        return
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    universe = Universe(args.packages)
+    upstream = FakeUpstream(
+        universe=universe, fixtures=args.fixtures, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+    ).start()
+    print(f"[INFO] Fake upstream on {upstream.url} ({args.packages} packages)")
+
+    flagged = []
+    try:
+        for scenario in args.scenarios:
+            params = scenario_params(scenario, args, universe)
+            upstream_cfg = {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                            "error_rate": args.error_rate, "throttle_rate": args.throttle_rate,
+                            "packages": args.packages, "fixtures": args.fixtures}
+            config = {**{k: v for k, v in params.items() if k != "roots"},
+                      "roots": len(params.get("roots", [])), **upstream_cfg}
+
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory(prefix=f"bench-{scenario}-") as tmp:
+                    workdir = Path(tmp)
+                    prepare_workdir(scenario, params, universe, workdir)
+                    proc = subprocess.run(
+                        [sys.executable, str(Path(__file__).resolve()), "--child", scenario,
+                         "--params", json.dumps(params), "--upstream", upstream.url],
+                        cwd=workdir, env=child_env(upstream.url, workdir, args.warm_cache),
+                        capture_output=True, text=True,
+                    )
+                if proc.returncode != 0:
+                    print(f"[ERROR] {scenario} failed:\n{proc.stderr[-4000:]}")
+                    continue
+
+                metrics = json.loads(proc.stdout.strip().splitlines()[-1])
+                record = {"scenario": scenario, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                          "commit": git_commit(), "config": config, **metrics}
+                prev = previous_result(args.results, scenario, config)
+                with open(args.results, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+
+                print(f"[INFO] {scenario}: {metrics['ops']} ops in {metrics['wall_s']}s "
+                      f"({metrics['ops_per_s']} ops/s, p50 {metrics['p50_ms']} ms, p99 {metrics['p99_ms']} ms, "
+                      f"upstream {metrics['upstream_req_per_s']} req/s, peak RSS {metrics['peak_rss_mb']} MB)")
+                if prev:
+                    for problem in regressions(prev, metrics):
+                        print(f"[WARN] {scenario} regression vs {prev.get('commit')}: {problem}")
+                        flagged.append((scenario, problem))
+    finally:
+        upstream.stop()
+
+    if flagged and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+import time
+
+# Minimal `docker` stand-in for benchmarking data/run_node_medic_fine.py
+# without the NodeMedic image: bench/run_bench.py sets DOCKER to
+# "python stub_docker.py". Only the subcommands the runner uses exist.
+# The "analysis" counts the package's files and sleeps to imitate work.
+STARTUP_SECONDS = float(os.environ.get("STUB_STARTUP_SECONDS", 0.3))   # cold `docker run`
+ANALYSIS_SECONDS = float(os.environ.get("STUB_ANALYSIS_SECONDS", 0.05))
+ENTRYPOINT = ["/stub/nodemedic"]
+
+
+def analyze(package_dir, output):
+    time.sleep(ANALYSIS_SECONDS)
+    files = sum(len(f) for _, _, f in os.walk(package_dir))
+    with open(output, "w") as f:
+        json.dump({"stub": True, "files": files, "taint_flows": []}, f)
+
+
+def _mount(args):
+    host, _, inner = args[args.index("-v") + 1].partition(":")
+    return host, inner
+
+
+def _flag(args, name):
+    return args[args.index(name) + 1]
+
+
+def main(argv):
+    cmd, args = argv[0], argv[1:]
+    if cmd == "image":
+        print(json.dumps(ENTRYPOINT))
+    elif cmd == "run" and "-d" in args:
+        # A warm container is just its mount, encoded in the id
+        host, _ = _mount(args)
+        print("stub" + host.encode("utf-8").hex())
+    elif cmd == "run":
+        time.sleep(STARTUP_SECONDS)
+        host, inner = _mount(args)
+        to_host = lambda p: host + p[len(inner):]
+        analyze(to_host(_flag(args, "--package-dir")), to_host(_flag(args, "--output")))
+    elif cmd == "exec":
+        host = bytes.fromhex(args[0][len("stub"):]).decode("utf-8")
+        to_host = lambda p: host + p[len("/batch"):]
+        analyze(to_host(_flag(args, "--package-dir")), to_host(_flag(args, "--output")))
+    elif cmd == "rm":
+        pass
+    else:
+        sys.exit(f"stub docker: unsupported command {cmd}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
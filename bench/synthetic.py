@@ -0,0 +1,194 @@
+import base64
+import hashlib
+import io
+import json
+import math
+import random
+import string
+import tarfile
+from pathlib import Path
+
+SAMPLE_DATA_DIR = Path(__file__).resolve().parent.parent / "finalproj" / "sample-data"
+VULNERABLE_FRACTION = 0.1   # packages that get an OSV advisory
+MAX_DEPS = 8
+
+
+def stable_int(*parts):
+    """Deterministic 64-bit hash (Python's hash() is salted per process)."""
+    digest = hashlib.blake2b("\x00".join(map(str, parts)).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+# -----------------------------
+# Sample graphs
+# -----------------------------
+def sample_trees(samples_dir=SAMPLE_DATA_DIR):
+    trees = []
+    for path in sorted(Path(samples_dir).glob("*.json")):
+        with open(path) as f:
+            trees.append(json.load(f))
+    return trees
+
+
+def _tree_names(deps, out):
+    for name, info in (deps or {}).items():
+        out.append(name)
+        _tree_names(info.get("dependencies"), out)
+
+
+def sample_names(samples_dir=SAMPLE_DATA_DIR):
+    names = []
+    for tree in sample_trees(samples_dir):
+        _tree_names(tree.get("dependencies"), names)
+    return list(dict.fromkeys(names))
+
+
+def _rename(deps, suffix):
+    return {
+        f"{name}{suffix}": {
+            "version": info.get("version"),
+            "dependencies": _rename(info.get("dependencies"), suffix),
+        }
+        for name, info in (deps or {}).items()
+    }
+
+
+def scaled_upload(factor, samples_dir=SAMPLE_DATA_DIR):
+    """
+    One npm-ls style document holding every sample graph `factor` times.
+    Copy k > 0 suffixes each package name with -bk, so every copy is a
+    distinct set of packages for enrichment.
+    """
+    deps = {}
+    for k in range(factor):
+        suffix = f"-b{k}" if k else ""
+        for tree in sample_trees(samples_dir):
+            deps.update(_rename(tree.get("dependencies"), suffix))
+    return {"name": "bench-root", "version": "1.0.0", "dependencies": deps}
+
+
+# -----------------------------
+# Package universe
+# -----------------------------
+class Universe:
+    """
+    Deterministic stand-in for the registry. Names are the packages from
+    finalproj/sample-data followed by generated ones; any other name also
+    resolves (to dependencies drawn from the universe) so scaled upload
+    graphs can be enriched. Names starting with "missing-" are 404s.
+    """
+
+    def __init__(self, size=5000, seed=0):
+        rng = random.Random(seed)
+        names = sample_names()
+        seen = set(names)
+        while len(names) < size:
+            word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12)))
+            if rng.random() < 0.3:
+                word += "-" + "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 6)))
+            if word not in seen:
+                seen.add(word)
+                names.append(word)
+        self.seed = seed
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self._tarballs = {}
+
+    def exists(self, name):
+        return not name.startswith("missing-")
+
+    def version(self, name):
+        h = stable_int(self.seed, "version", name)
+        return f"{h % 5}.{(h >> 8) % 20}.{(h >> 16) % 10}"
+
+    def dependencies(self, name):
+        """Direct dependencies; universe packages only depend on later ones (a DAG)."""
+        h = stable_int(self.seed, "deps", name)
+        # Exponentially distributed fan-out, mean ~2.5, like real packages
+        count = min(MAX_DEPS, int(-2.5 * math.log(1 - (h % 1000) / 1000.5)))
+        start = self.index.get(name, -1) + 1
+        if start >= len(self.names):
+            return []
+        rng = random.Random(h)
+        picks = {self.names[rng.randrange(start, len(self.names))] for _ in range(count)}
+        return sorted(picks)
+
+    def tarball(self, name, version):
+        key = (name, version)
+        if key not in self._tarballs:
+            files = {
+                "package/package.json": json.dumps({
+                    "name": name, "version": version, "main": "index.js",
+                    "dependencies": {d: "^" + self.version(d) for d in self.dependencies(name)},
+                }).encode(),
+                "package/index.js": f"module.exports = {json.dumps(name)};\n".encode(),
+            }
+            buf = io.BytesIO()
+            with tarfile.open(fileobj=buf, mode="w:gz", compresslevel=1) as tar:
+                for path, data in files.items():
+                    info = tarfile.TarInfo(path)
+                    info.size, info.mtime = len(data), 0
+                    tar.addfile(info, io.BytesIO(data))
+            self._tarballs[key] = buf.getvalue()
+        return self._tarballs[key]
+
+    def packument(self, name, base_url):
+        version = self.version(name)
+        deps = {d: "^" + self.version(d) for d in self.dependencies(name)}
+        tgz = self.tarball(name, version)
+        maintainers = [{"name": f"maint{stable_int(self.seed, 'm', name, i) % 500}"} for i in range(1 + len(name) % 3)]
+        older = {f"0.0.{i}": {"name": name, "version": f"0.0.{i}"} for i in range(len(name) % 4)}
+        return {
+            "_id": name,
+            "_rev": f"1-{stable_int(self.seed, 'rev', name, version):016x}",
+            "name": name,
+            "dist-tags": {"latest": version},
+            "versions": {
+                **older,
+                version: {
+                    "name": name,
+                    "version": version,
+                    "description": f"Synthetic package {name}",
+                    "keywords": ["bench"],
+                    "dependencies": deps,
+                    "maintainers": maintainers,
+                    "repository": {"type": "git", "url": f"git+https://example.invalid/{name}.git"},
+                    "dist": {
+                        "tarball": f"{base_url}/{name}/-/{name.split('/')[-1]}-{version}.tgz",
+                        "shasum": hashlib.sha1(tgz).hexdigest(),
+                        "integrity": "sha512-" + base64.b64encode(hashlib.sha512(tgz).digest()).decode(),
+                        "unpackedSize": len(tgz) * 3,
+                    },
+                },
+            },
+            "time": {"created": "2020-01-01T00:00:00.000Z", "modified": "2024-01-01T00:00:00.000Z"},
+            "maintainers": maintainers,
+            "readme": f"# {name}\n\n" + "Lorem ipsum. " * (stable_int(self.seed, "readme", name) % 400),
+        }
+
+    def vulnerabilities(self, name):
+        h = stable_int(self.seed, "vuln", name)
+        if (h % 1000) / 1000 >= VULNERABLE_FRACTION:
+            return []
+        return [f"GHSA-bench-{h % 10 ** 8:08d}"]
+
+
+def typo_variants(target, count, seed=0):
+    """Up to count distinct one-edit variants of target (no '-' or '/')."""
+    rng = random.Random(stable_int(seed, "typos", target))
+    out = set()
+    for _ in range(count * 20):
+        if len(out) >= count:
+            break
+        i = rng.randrange(len(target) + 1)
+        ch = rng.choice(string.ascii_lowercase)
+        op = rng.choice(("delete", "insert", "replace"))
+        if op == "delete" and i < len(target):
+            v = target[:i] + target[i + 1:]
+        elif op == "replace" and i < len(target):
+            v = target[:i] + ch + target[i + 1:]
+        else:
+            v = target[:i] + ch + target[i:]
+        if v and v != target:
+            out.add(v)
+    return sorted(out)
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+from http_cache import cache_key, load_entry, save_entry, conditional_headers, is_fresh
+from metrics import inc, record_upstream
+from metrics_core import upstream_name
+from packument_stream import ABBREVIATED_ACCEPT
+
+NPM_INFO_URL = os.environ.get("NPM_REGISTRY_URL", "https://registry.npmjs.org")
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """The registry kept failing (transport errors, 429/5xx, bad bodies) after every retry."""
+
+
+# -----------------------------
+# Rate limiting
+# -----------------------------
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# -----------------------------
+# Registry fetcher
+# -----------------------------
+class RegistryFetcher:
+    """
+    Async registry client for the pipeline scripts: bounded concurrency,
+    a token-bucket rate limit, retry with exponential backoff on 429/5xx
+    and transport errors, and the on-disk conditional cache from http_cache.
+    """
+
+    def __init__(self, concurrency=16, rate=20, retries=5, base_url=NPM_INFO_URL, timeout=10):
+        self.base_url = base_url
+        self.retries = retries
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate)
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    async def fetch_package(self, name, abbreviated=False, revalidate=False):
+        """
+        Packument for name, or None if the registry does not have it.
+        Raises FetchError when it could not be fetched at all. With
+        abbreviated, the registry's install-only document is requested;
+        with revalidate, a fresh cached copy is still checked with the server.
+        """
+        headers = {"Accept": ABBREVIATED_ACCEPT} if abbreviated else None
+        return await self.fetch_json(f"{self.base_url}/{name}", headers, revalidate)
+
+    async def fetch_json(self, url, headers=None, revalidate=False):
+        headers = dict(headers or {})
+        key = cache_key("GET", url, vary=headers.get("Accept", ""))
+        entry = await asyncio.to_thread(load_entry, key)
+        if not revalidate and is_fresh(entry):
+            inc("upstream_cache_total", result="fresh")
+            return entry["data"]
+
+        res = await self._get(url, conditional_headers(entry, headers))
+        if res is None or res.status_code in RETRY_STATUSES:
+            status = res.status_code if res is not None else "transport errors"
+            raise FetchError(f"{url}: {status} after {self.retries} retries")
+
+        if res.status_code == 304 and entry is not None:
+            inc("upstream_cache_total", result="revalidated")
+            entry["fetched_at"] = time.time()
+            await asyncio.to_thread(save_entry, key, entry)
+            return entry["data"]
+
+        if res.status_code != 200:
+            return None
+
+        try:
+            data = res.json()
+        except ValueError as e:
+            raise FetchError(f"{url}: unreadable body ({e})") from e
+        await asyncio.to_thread(save_entry, key, {
+            "url": url,
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "data": data,
+        })
+        return data
+
+    async def _get(self, url, headers):
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            async with self.semaphore:
+                started = time.perf_counter()
+                try:
+                    res = await self.client.get(url, headers=headers)
+                except httpx.TransportError:
+                    res = None
+                record_upstream(url, res.status_code if res is not None else None, time.perf_counter() - started)
+
+            if res is not None and res.status_code not in RETRY_STATUSES:
+                if res.status_code != 304:
+                    inc("upstream_cache_total", result="miss")
+                return res
+            if attempt == self.retries:
+                return res
+            inc("upstream_retries_total", upstream=upstream_name(url),
+                reason=str(res.status_code) if res is not None else "error")
+            await asyncio.sleep(_backoff(attempt, res))
+        return None
+
+
+def _backoff(attempt, res):
+    retry_after = res.headers.get("Retry-After") if res is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return min(60, 2 ** attempt) * (0.5 + random.random() / 2)
@@ -0,0 +1,176 @@
+import json
+import os
+from pathlib import Path
+
+SEGMENT_SIZE = 50000  # records per JSONL segment
+FSYNC_EVERY = 500     # appends between fsyncs
+
+# Returned instead of a document by fetches that failed in a way worth
+# retrying (timeout, 5xx, unreadable body). Never stored: the package stays
+# out of the checkpoint, so the next run fetches it again.
+FETCH_FAILED = object()
+
+
+class AuditStore:
+    """
+    Append-only result store: a directory of numbered JSONL segments, one
+    {"key": ..., "record": ...} object per line. Every record is flushed as
+    soon as it is appended, so the set of stored keys doubles as the resume
+    checkpoint. When a key is written more than once, the last write wins.
+    """
+
+    def __init__(self, path, segment_size=SEGMENT_SIZE, fsync_every=FSYNC_EVERY):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.fsync_every = fsync_every
+        self._file = None
+        self._segment_count = 0
+        self._records_in_last = 0
+        self._since_sync = 0
+        self._keys = set()
+        self._scan()
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+    def _segments(self):
+        return sorted(self.path.glob("seg-*.jsonl"))
+
+    def _iter_lines(self):
+        for seg in self._segments():
+            with open(seg) as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # torn write from a crash
+
+    def _scan(self):
+        segments = self._segments()
+        self._segment_count = len(segments)
+        if not segments:
+            return
+
+        # Drop a partial trailing line so the next append starts cleanly
+        with open(segments[-1], "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+        for seg in segments:
+            with open(seg) as f:
+                lines = 0
+                for line in f:
+                    lines += 1
+                    try:
+                        self._keys.add(json.loads(line)["key"])
+                    except ValueError:
+                        continue
+        self._records_in_last = lines
+
+    def completed(self):
+        """Keys already stored (the checkpoint for a resumed run)."""
+        return set(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def items(self):
+        """Yield (key, record) pairs, keeping only the latest write per key."""
+        latest = {}
+        for i, rec in enumerate(self._iter_lines()):
+            latest[rec["key"]] = i
+        wanted = set(latest.values())
+        del latest
+
+        for i, rec in enumerate(self._iter_lines()):
+            if i in wanted:
+                yield rec["key"], rec["record"]
+
+    def get(self, key):
+        record = None
+        for rec in self._iter_lines():
+            if rec["key"] == key:
+                record = rec["record"]
+        return record
+
+    def get_many(self, keys):
+        """Latest record of each stored key in keys, read in a single pass."""
+        keys = set(keys) & self._keys
+        found = {}
+        if keys:
+            for rec in self._iter_lines():
+                if rec["key"] in keys:
+                    found[rec["key"]] = rec["record"]
+        return found
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+    def append(self, key, record):
+        if self._file is None or self._records_in_last >= self.segment_size:
+            self._open_segment()
+        self._file.write(json.dumps({"key": key, "record": record}) + "\n")
+        self._file.flush()
+        self._records_in_last += 1
+        self._keys.add(key)
+
+        self._since_sync += 1
+        if self._since_sync >= self.fsync_every:
+            os.fsync(self._file.fileno())
+            self._since_sync = 0
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._close_file()
+        if self._segment_count == 0 or self._records_in_last >= self.segment_size:
+            self._segment_count += 1
+            self._records_in_last = 0
+        self._file = open(self.path / f"seg-{self._segment_count - 1:06d}.jsonl", "a")
+
+    def _close_file(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def close(self):
+        if self._file is not None:
+            self._close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -----------------------------
+    # Export
+    # -----------------------------
+    def export_json(self, out_path, indent=2):
+        """Write the store as one {key: record} JSON object, streaming."""
+        with open(out_path, "w") as f:
+            write_json_object(f, self.items(), indent)
+
+
+def write_json_object(f, pairs, indent=2, level=0):
+    """
+    Stream (key, value) pairs as a JSON object laid out like
+    json.dump(..., indent=indent) would, without building the dict.
+    A value that is itself an iterator of pairs is streamed as a nested object.
+    """
+    pad = " " * (indent * (level + 1))
+    first = True
+    f.write("{")
+    for key, value in pairs:
+        f.write(("\n" if first else ",\n") + f"{pad}{json.dumps(key)}: ")
+        if hasattr(value, "__next__"):
+            write_json_object(f, value, indent, level + 1)
+        else:
+            f.write(json.dumps(value, indent=indent).replace("\n", "\n" + pad))
+        first = False
+    f.write("}" if first else "\n" + " " * (indent * level) + "}")
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+# Directory layout, keys and entry format of the on-disk HTTP cache, shared
+# by data/http_cache.py and finalproj/backend/http_cache.py so full
+# packuments fetched by the pipeline are revalidated (not refetched) by the
+# backend and vice versa. Standard library only: the backend imports it.
+#
+#   <CACHE_DIR>/<key[:2]>/<key>.json
+#   {"url": ..., "etag": ..., "last_modified": ..., "fetched_at": ..., "data": <body>}
+
+CACHE_DIR = Path(os.environ.get("NPM_HTTP_CACHE_DIR", Path.home() / ".cache" / "npm-dep-web"))
+FRESH_SECONDS = float(os.environ.get("NPM_HTTP_CACHE_FRESH", 300))
+
+
+def cache_key(method, url, body="", vary=""):
+    """Entry key of a request; GETs vary by their Accept header, POSTs by their body."""
+    raw = "\n".join([method.upper(), url, vary, body])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def entry_path(key):
+    return CACHE_DIR / key[:2] / f"{key}.json"
+
+
+def load_entry(key):
+    try:
+        with open(entry_path(key)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_entry(key, entry):
+    path = entry_path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def is_fresh(entry, max_age=FRESH_SECONDS):
+    return entry is not None and time.time() - entry.get("fetched_at", 0) < max_age
+
+
+def conditional_headers(entry, headers=None):
+    """Add If-None-Match / If-Modified-Since for a stored entry."""
+    headers = dict(headers or {})
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
@@ -1,22 +1,39 @@
+import argparse
 import requests
-import json
+import os
+import subprocess
+import sys
 from tqdm import tqdm
 from pathlib import Path
-import time
 
-NPM_INFO_URL = "https://registry.npmjs.org"
+from audit_store import AuditStore, FETCH_FAILED, write_json_object
+from metrics import phase, write_summary
+from incremental import changes_since, current_seq, load_state, save_state, refresh_records, write_diff_report
+from name_table import open_name_table
+from owner_index import OwnerIndex
+from http_cache import cached_get_json, RateLimiter
+from packument_stream import extract_audit_document
+from sharding import shard_of, parse_shard, shard_suffix
+
+NPM_INFO_URL = os.environ.get("NPM_REGISTRY_URL", "https://registry.npmjs.org")
 ALL_PACKAGES_FILE = "all_package_names.txt"
 OUTPUT_FILE = "all_packages_audit.json"
+STORE_DIR = "all_packages_audit.store"  # append-only results + resume checkpoint
+STATE_FILE = "all_packages_audit.state.json"  # registry sequence the store is current to
+DIFF_FILE = "all_packages_audit.diff.json"    # what the last --incremental run changed
+REQUESTS_PER_SECOND = 40  # registry budget for the whole audit, split evenly across shards
 
-def fetch_package_info(name):
+def fetch_package_info(name, revalidate=False):
     """Fetch full metadata for a package from the npm registry."""
-    try:
-        res = requests.get(f"{NPM_INFO_URL}/{name}", timeout=10)
-        if res.status_code != 200:
-            return None
-        return res.json()
-    except requests.RequestException:
-        return None
+    with phase("fetch"):
+        try:
+            return cached_get_json(
+                f"{NPM_INFO_URL}/{name}", timeout=10,
+                parse=extract_audit_document, revalidate=revalidate,
+            )
+        except (requests.RequestException, ValueError) as e:
+            print(f"[WARN] Could not fetch {name}: {e}")
+            return FETCH_FAILED
 
 def extract_audit_features(name, data):
     """Extract the fields similar to your previous audit."""
@@ -34,40 +51,197 @@ def extract_audit_features(name, data):
         "latest_version": latest,
         "created": time_info.get("created"),
         "modified": time_info.get("modified"),
+        "rev": data.get("_rev"),
         "num_versions": len(versions),
         "num_maintainers": len(maintainers),
         "maintainers": [m.get("name") for m in maintainers],
         "description": latest_meta.get("description"),
         "keywords": latest_meta.get("keywords"),
-        "has_readme": "readme" in data,
-        "readme_length": len(data.get("readme", "")),
+        "has_readme": "readme" in data or "_readme_length" in data,
+        "readme_length": data.get("_readme_length", len(data.get("readme", ""))),
         "dependencies_count": len(latest_meta.get("dependencies", {}) or {}),
+        "dependencies": sorted(latest_meta.get("dependencies", {}) or {}),
         "dist_size": latest_meta.get("dist", {}).get("unpackedSize", None),
         "repository": latest_meta.get("repository", {}),
     }
 
-def main():
+def shard_path(path, shard):
+    """Per-shard variant of an output path: all_packages_audit.store → all_packages_audit.shard-3-of-8.store."""
+    if shard is None:
+        return path
+    head, rest = path.split(".", 1)
+    return f"{head}{shard_suffix(*shard)}.{rest}"
+
+def reaudit_changed(store, all_packages, fetch, mine, state_file, diff_file):
+    """
+    Refetch the packages that changed since the last audit (or, without a
+    usable changes log, revalidate every stored one) and record the diffs.
+    Returns the sequence the store is now current to.
+    """
+    since = load_state(state_file).get("last_seq")
+    changes = changes_since(since)
+    if changes is None:
+        print("[INFO] No changes log back to the last audit; revalidating every stored package...")
+        until = current_seq()
+        pairs, total, mode = store.items(), len(store), "revalidated"
+    else:
+        changed, deleted, until = changes
+        names = sorted(n for n in changed | deleted if mine(n) and (n in store or n in all_packages))
+        previous = store.get_many(names)
+        pairs = ((n, previous.get(n)) for n in names)
+        total, mode = len(names), "changes"
+        print(f"[INFO] {len(names)} packages changed since sequence {since}")
+
+    diffs, failed = refresh_records(store, pairs, fetch, extract_audit_features, total=total)
+    write_diff_report(diff_file, since, until, mode, diffs)
+
+    # Keep the ownership index in step with the store
+    if diffs and OwnerIndex.exists():
+        names = [d["name"] for d in diffs]
+        records = store.get_many(names)
+        with phase("owner_index"), OwnerIndex() as owners:
+            owners.update((name, records.get(name)) for name in names)
+    # Failed packages are only retried if the next run looks back this far again
+    return since if failed else until
+
+def main(incremental=False, shard=None, rate=REQUESTS_PER_SECOND):
+    """
+    Audit every package in the name list, or with shard=(I, K) only the
+    names that hash to shard I, into that shard's own store at rate/K
+    requests per second. Shards can run on separate machines given the
+    same name list; merge_shards combines their stores afterwards.
+    """
     if not Path(ALL_PACKAGES_FILE).exists():
         print(f"[ERROR] {ALL_PACKAGES_FILE} not found.")
         return
 
-    with open(ALL_PACKAGES_FILE) as f:
-        all_packages = [line.strip() for line in f if line.strip()]
+    # Names are read from the memory-mapped table rather than held in a list
+    all_packages = open_name_table(ALL_PACKAGES_FILE)
+
+    index, count = shard or (0, 1)
+    mine = (lambda name: shard_of(name, count) == index) if shard else (lambda name: True)
+    limiter = RateLimiter(rate / count)
+
+    def fetch(name, revalidate=False):
+        with phase("throttle"):
+            limiter.wait()
+        return fetch_package_info(name, revalidate)
 
-    audit_results = {}
+    # Results stream to the store as they are produced; a restart skips
+    # every package that already has a record.
+    store = AuditStore(shard_path(STORE_DIR, shard))
+    state_file = shard_path(STATE_FILE, shard)
 
-    print(f"[INFO] Auditing {len(all_packages)} packages...")
+    with store, all_packages:
+        # Anything fetched from here on is at least as new as the recorded sequence
+        if incremental:
+            save_state(state_file, reaudit_changed(
+                store, all_packages, fetch, mine, state_file, shard_path(DIFF_FILE, shard)
+            ))
+        elif not len(store):
+            save_state(state_file, current_seq())
 
-    for pkg in tqdm(all_packages, desc="Fetching package info"):
-        data = fetch_package_info(pkg)
-        audit_results[pkg] = extract_audit_features(pkg, data)
-        time.sleep(0.025)  # small delay to reduce rate-limiting issues
+        total = sum(1 for pkg in all_packages if mine(pkg)) if shard else len(all_packages)
+        done = sum(1 for pkg in store.completed() if pkg in all_packages and mine(pkg))
+        remaining = (pkg for pkg in all_packages if mine(pkg) and pkg not in store)
+        print(f"[INFO] Auditing {total - done} packages ({done} already done)...")
+        failed = 0
+        for pkg in tqdm(remaining, total=total - done, desc="Fetching package info", position=index):
+            data = fetch(pkg)
+            if data is FETCH_FAILED:
+                failed += 1
+                continue
+            with phase("extract"):
+                record = extract_audit_features(pkg, data)
+            with phase("store"):
+                store.append(pkg, record)
+        if failed:
+            print(f"[WARN] {failed} packages could not be fetched; rerun to retry them")
+
+    if shard:
+        print(f"[INFO] Shard {index}/{count} complete → {store.path}")
+        return
 
-    # Save results
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(audit_results, f, indent=2)
+    # Export in the original single-file shape
+    with phase("write"):
+        store.export_json(OUTPUT_FILE)
 
     print(f"[INFO] Audit complete → saved to {OUTPUT_FILE}")
 
+def merge_shards(count, allow_partial=False):
+    """
+    Combine the stores of shards 0..count-1 into OUTPUT_FILE. Every listed
+    name must have a record in its shard's store (unless allow_partial).
+    Records a store holds for names outside its shard (left from a run with
+    another K) or no longer listed are dropped, and a name written more than
+    once keeps its latest record, so each package appears exactly once.
+    """
+    all_packages = open_name_table(ALL_PACKAGES_FILE)
+    stores = [AuditStore(shard_path(STORE_DIR, (i, count))) for i in range(count)]
+
+    missing = [0] * count
+    for name in all_packages:
+        i = shard_of(name, count)
+        if name not in stores[i]:
+            missing[i] += 1
+    for i, n in enumerate(missing):
+        if n:
+            print(f"[WARN] Shard {i}/{count} has no record for {n} packages")
+    if any(missing) and not allow_partial:
+        print(f"[ERROR] {sum(missing)} packages missing; rerun those shards or merge with --allow-partial")
+        return False
+
+    def records():
+        for i, store in enumerate(stores):
+            for name, record in store.items():
+                if shard_of(name, count) == i and name in all_packages:
+                    yield name, record
+
+    with phase("merge"), all_packages, open(OUTPUT_FILE, "w") as f:
+        write_json_object(f, records())
+    print(f"[INFO] Merged {count} shards ({len(all_packages) - sum(missing)} packages) → {OUTPUT_FILE}")
+    return True
+
+def run_local(count, rate=REQUESTS_PER_SECOND, incremental=False):
+    """Run all count shards as local worker processes, then merge them."""
+    # Build the name table once, before the workers would race to
+    open_name_table(ALL_PACKAGES_FILE).close()
+
+    cmd = [sys.executable, os.path.abspath(__file__), "--rate", str(rate)]
+    if incremental:
+        cmd.append("--incremental")
+    with phase("shards"):
+        workers = [subprocess.Popen(cmd + ["--shard", f"{i}/{count}"]) for i in range(count)]
+        failed = [i for i, worker in enumerate(workers) if worker.wait() != 0]
+    if failed:
+        print(f"[ERROR] Shards {failed} failed; rerun them with --shard I/{count} (they resume)")
+        return False
+    return merge_shards(count)
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Audit every package in the registry name list.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="refetch only packages changed since the last run and write a diff report")
+    parser.add_argument("--shard", metavar="I/K",
+                        help="audit only shard I of K (0-based) into its own resumable store")
+    parser.add_argument("--local", type=int, metavar="K", help="run K shards as local processes, then merge")
+    parser.add_argument("--merge", type=int, metavar="K", help="merge the stores of K shards into " + OUTPUT_FILE)
+    parser.add_argument("--allow-partial", action="store_true", help="merge even if some packages have no record")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND,
+                        help="registry requests per second for the whole run, across all shards")
+    args = parser.parse_args()
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Each shard worker writes its own metrics next to its store
+    try:
+        if args.merge:
+            sys.exit(0 if merge_shards(args.merge, args.allow_partial) else 1)
+        elif args.local:
+            sys.exit(0 if run_local(args.local, args.rate, args.incremental) else 1)
+        else:
+            main(incremental=args.incremental, shard=shard, rate=args.rate)
+    finally:
+        write_summary("all_packages_audit", shard_suffix(*shard) if shard else "")
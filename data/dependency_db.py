@@ -0,0 +1,203 @@
+import json
+import sqlite3
+import zlib
+
+from audit_store import write_json_object
+
+DB_FILE = "dependency_audit.db"
+# Error of packages the registry could not be reached for; they do not
+# count as crawled, so the next run fetches them again
+FETCH_FAILED = "fetch_failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    name      TEXT PRIMARY KEY,
+    latest    TEXT,
+    tarball   TEXT,
+    integrity TEXT,
+    shasum    TEXT,
+    error     TEXT,
+    is_root   INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS edges (
+    parent   TEXT NOT NULL,
+    child    TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (parent, child)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS edges_by_child ON edges (child, parent);
+CREATE TABLE IF NOT EXISTS packuments (
+    name TEXT PRIMARY KEY,
+    body BLOB NOT NULL
+);
+"""
+
+
+class DependencyDB:
+    """
+    SQLite store for the recursive dependency audit. Slim per-package
+    columns (latest version, tarball, integrity) and the edge list live in
+    indexed tables; full packuments are zlib-compressed in a separate table
+    and only decoded when asked for.
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+    def add_package(self, name, packument, deps, error=None):
+        """
+        Record one crawled package: slim columns, edges and packument. A
+        missing packument is recorded as "Package not found" unless error
+        says why (e.g. FETCH_FAILED).
+        """
+        latest = tarball = integrity = shasum = None
+        if packument:
+            latest = packument.get("dist-tags", {}).get("latest")
+            dist = packument.get("versions", {}).get(latest, {}).get("dist", {}) if latest else {}
+            tarball, integrity, shasum = dist.get("tarball"), dist.get("integrity"), dist.get("shasum")
+        elif error is None:
+            error = "Package not found"
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO packages (name, latest, tarball, integrity, shasum, error, is_root) "
+            "VALUES (?, ?, ?, ?, ?, ?, COALESCE((SELECT is_root FROM packages WHERE name = ?), 0))",
+            (name, latest, tarball, integrity, shasum, error, name),
+        )
+        self.conn.execute("DELETE FROM edges WHERE parent = ?", (name,))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO edges (parent, child, position) VALUES (?, ?, ?)",
+            [(name, dep, i) for i, dep in enumerate(deps)],
+        )
+        if packument:
+            body = zlib.compress(json.dumps(packument).encode("utf-8"))
+            self.conn.execute("INSERT OR REPLACE INTO packuments (name, body) VALUES (?, ?)", (name, body))
+        else:
+            self.conn.execute("DELETE FROM packuments WHERE name = ?", (name,))
+
+    def mark_roots(self, names):
+        self.conn.executemany(
+            "INSERT INTO packages (name, is_root) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET is_root = 1",
+            [(n,) for n in names],
+        )
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+    def __contains__(self, name):
+        """True once name is crawled for good (fetch failures are not)."""
+        row = self.conn.execute(
+            "SELECT 1 FROM packages WHERE name = ? AND (latest IS NOT NULL OR error IS NOT NULL) "
+            "AND error IS NOT ?", (name, FETCH_FAILED)
+        ).fetchone()
+        return row is not None
+
+    def roots(self):
+        return [r[0] for r in self.conn.execute("SELECT name FROM packages WHERE is_root = 1 ORDER BY rowid")]
+
+    def iter_packages(self):
+        """Yield slim rows: (name, latest, tarball, integrity, shasum, error)."""
+        yield from self.conn.execute(
+            "SELECT name, latest, tarball, integrity, shasum, error FROM packages "
+            "WHERE latest IS NOT NULL OR error IS NOT NULL ORDER BY name"
+        )
+
+    def package(self, name):
+        """Slim row for one crawled package, or None if it has not been crawled."""
+        return self.conn.execute(
+            "SELECT name, latest, tarball, integrity, shasum, error FROM packages "
+            "WHERE name = ? AND (latest IS NOT NULL OR error IS NOT NULL)", (name,)
+        ).fetchone()
+
+    def packument(self, name):
+        row = self.conn.execute("SELECT body FROM packuments WHERE name = ?", (name,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def dependencies(self, name):
+        return [r[0] for r in self.conn.execute(
+            "SELECT child FROM edges WHERE parent = ? ORDER BY position", (name,)
+        )]
+
+    def dependents(self, name):
+        return [r[0] for r in self.conn.execute(
+            "SELECT parent FROM edges WHERE child = ? ORDER BY parent", (name,)
+        )]
+
+    def descendants(self, name):
+        """Every package reachable from name (transitive dependencies)."""
+        return [r[0] for r in self.conn.execute(
+            """
+            WITH RECURSIVE reach(n) AS (
+                SELECT child FROM edges WHERE parent = ?
+                UNION
+                SELECT e.child FROM edges e JOIN reach r ON e.parent = r.n
+            )
+            SELECT n FROM reach ORDER BY n
+            """, (name,)
+        )]
+
+    def ancestors(self, name):
+        """Every package that transitively depends on name."""
+        return [r[0] for r in self.conn.execute(
+            """
+            WITH RECURSIVE reach(n) AS (
+                SELECT parent FROM edges WHERE child = ?
+                UNION
+                SELECT e.parent FROM edges e JOIN reach r ON e.child = r.n
+            )
+            SELECT n FROM reach ORDER BY n
+            """, (name,)
+        )]
+
+    def dependency_graph(self):
+        graph = {}
+        for (name,) in self.conn.execute(
+            "SELECT name FROM packages WHERE latest IS NOT NULL OR error IS NOT NULL ORDER BY rowid"
+        ):
+            graph[name] = []
+        for parent, child in self.conn.execute("SELECT parent, child FROM edges ORDER BY parent, position"):
+            graph.setdefault(parent, []).append(child)
+        return graph
+
+    # -----------------------------
+    # JSON export
+    # -----------------------------
+    def export_json(self, out_path):
+        """Write the legacy dependency_audit.json layout, streaming packuments."""
+        graph = self.dependency_graph()
+        reverse_dependencies = {}
+        for parent, children in graph.items():
+            for child in children:
+                reverse_dependencies.setdefault(child, []).append(parent)
+
+        metadata = (
+            (name, self.packument(name) or {"error": error})
+            for name, _, _, _, _, error in self.iter_packages()
+        )
+        with open(out_path, "w") as f:
+            write_json_object(f, iter([
+                ("roots_analyzed", self.roots()),
+                ("dependency_graph", graph),
+                ("reverse_dependencies", reverse_dependencies),
+                ("metadata", metadata),
+            ]))
@@ -1,56 +1,293 @@
-import requests
+import argparse
 import json
+import os
+import time
 from pathlib import Path
 
+import ijson
+import requests
+
+from metrics import phase, record_upstream, write_summary
+from name_table import open_name_table
+from typosquat_index import TyposquatIndex, INDEX_DIR
+
+REGISTRY_URL = os.environ.get("NPM_REPLICATE_URL", "https://replicate.npmjs.com/registry")
 LIMIT = 10000
 headers = {"npm-replication-opt-in": "true"}
-all_packages = []
 
 # Cache file path
 CACHE_FILE = "all_packages.json"
+NAMES_FILE = "all_package_names.txt"
+CHECKPOINT_FILE = "all_packages.checkpoint.json"  # present only while a download is unfinished
+SYNC_STATE_FILE = "registry_sync.json"            # last changes-feed sequence applied
+CHANGES_FILE = "registry_changes.json"            # names touched by the last sync
+CHANGES_LOG = "registry_changes.jsonl"            # one line per sync, for incremental re-audits
+
 
-# If cache exists, load it instead of downloading
-if Path(CACHE_FILE).exists():
-    print(f"[INFO] Loading cached package list from {CACHE_FILE}")
-    with open(CACHE_FILE) as f:
-        all_packages = json.load(f)
-else:
-    print("[INFO] Downloading NPM registry package list...")
+def _load_json(path, default=None):
+    if not Path(path).exists():
+        return default
+    with open(path) as f:
+        return json.load(f)
 
-    # first batch
-    res = requests.get(f"https://replicate.npmjs.com/registry/_all_docs?limit={LIMIT}", headers=headers)
+
+def _save_json(path, obj):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def registry_get(path, params=None, timeout=60):
+    """GET from the replication endpoint, counted and timed like every upstream request."""
+    url = f"{REGISTRY_URL}{path}"
+    started = time.perf_counter()
+    try:
+        res = requests.get(url, params=params, headers=headers, timeout=timeout)
+    except requests.RequestException:
+        record_upstream(url, None, time.perf_counter() - started)
+        raise
+    record_upstream(url, res.status_code, time.perf_counter() - started)
     res.raise_for_status()
-    data = res.json()
-    rows = data['rows']
-    all_packages.extend(rows)
+    return res
 
-    while True:
-        last_key = rows[-1]['key']
-        params = {"limit": LIMIT, "startkey": json.dumps(last_key)}
-        res = requests.get("https://replicate.npmjs.com/registry/_all_docs", params=params, headers=headers)
-        res.raise_for_status()
-        rows = res.json()['rows']
 
-        # Sanity check for duplicates
-        if rows[0]['key'] != last_key:
-            raise ValueError(f"Expected first row key {last_key} but got {rows[0]['key']}")
+# -----------------------------
+# Full download (_all_docs)
+# -----------------------------
+def download_all_docs():
+    """
+    Page through _all_docs, streaming rows to CACHE_FILE and names to
+    NAMES_FILE as each page arrives. After every page the last key and the
+    byte offsets of both files are checkpointed, so an interrupted run
+    truncates back to the checkpoint and continues from that startkey.
+    """
+    ckpt = _load_json(CHECKPOINT_FILE)
+    if ckpt:
+        print(f"[INFO] Resuming download after {ckpt['last_key']!r} ({ckpt['count']} packages so far)")
+        rows_f = open(CACHE_FILE, "r+")
+        names_f = open(NAMES_FILE, "r+")
+        rows_f.truncate(ckpt["rows_offset"])
+        names_f.truncate(ckpt["names_offset"])
+        rows_f.seek(ckpt["rows_offset"])
+        names_f.seek(ckpt["names_offset"])
+    else:
+        print("[INFO] Downloading NPM registry package list...")
+        # Remember where the changes feed stands now, so a later --sync
+        # picks up everything published while this download runs.
+        res = registry_get("/", timeout=30)
+        ckpt = {"last_key": None, "count": 0, "update_seq": res.json().get("update_seq")}
+        rows_f = open(CACHE_FILE, "w")
+        names_f = open(NAMES_FILE, "w")
+        rows_f.write("[")
+
+    with rows_f, names_f:
+        while True:
+            params = {"limit": LIMIT}
+            if ckpt["last_key"] is not None:
+                params["startkey"] = json.dumps(ckpt["last_key"])
+            with phase("download"):
+                rows = registry_get("/_all_docs", params).json()["rows"]
+
+            if ckpt["last_key"] is not None:
+                # Sanity check for duplicates
+                if not rows or rows[0]["key"] != ckpt["last_key"]:
+                    got = rows[0]["key"] if rows else None
+                    raise ValueError(f"Expected first row key {ckpt['last_key']} but got {got}")
+                rows = rows[1:]  # skip duplicate first row
+
+            if not rows:
+                break
+
+            with phase("write"):
+                for row in rows:
+                    rows_f.write(("," if ckpt["count"] else "") + json.dumps(row))
+                    names_f.write(row["id"] + "\n")
+                    ckpt["count"] += 1
+
+                rows_f.flush()
+                names_f.flush()
+                os.fsync(rows_f.fileno())
+                os.fsync(names_f.fileno())
+                ckpt.update(last_key=rows[-1]["key"], rows_offset=rows_f.tell(), names_offset=names_f.tell())
+                _save_json(CHECKPOINT_FILE, ckpt)
+            print(f"[INFO] Total packages fetched: {ckpt['count']}")
+
+        rows_f.write("]")
+
+    _save_json(SYNC_STATE_FILE, {"last_seq": ckpt["update_seq"]})
+    os.remove(CHECKPOINT_FILE)
+    print(f"[INFO] Package list saved to {CACHE_FILE} and {NAMES_FILE}")
+    rebuild_typosquat_index()
+
+
+def write_names_from_cache():
+    """Regenerate NAMES_FILE from an existing CACHE_FILE without loading it."""
+    with open(CACHE_FILE, "rb") as src, open(NAMES_FILE, "w") as out:
+        for row in ijson.items(src, "item"):
+            out.write(row["id"] + "\n")
+    rebuild_typosquat_index()
+
 
-        if len(rows) == 1:
+def rebuild_typosquat_index():
+    """
+    Rebuild an existing typosquat index from a freshly written NAMES_FILE.
+    sync() patches it in place; a full download replaces the whole list, so
+    the index (read by typosquat_audit.py and the backend) is rebuilt too.
+    """
+    if not TyposquatIndex.exists(INDEX_DIR):
+        return  # built on first use instead
+    print(f"[INFO] Rebuilding the typosquat index in {INDEX_DIR}...")
+    with phase("index"):
+        TyposquatIndex.build(NAMES_FILE, INDEX_DIR).close()
+
+
+# -----------------------------
+# Incremental sync (_changes)
+# -----------------------------
+def fetch_changes(since):
+    """
+    Read the replication changes feed from `since` to its current end.
+    Returns ({name: rev} for created/updated docs, set of deleted names, last_seq).
+    """
+    changed, deleted = {}, set()
+    while True:
+        params = {"since": since, "limit": LIMIT}
+        with phase("changes"):
+            data = registry_get("/_changes", params).json()
+        results = data.get("results", [])
+        if not results:
             break
 
-        all_packages.extend(rows[1:])  # skip duplicate first row
-        print(f"[INFO] Total packages fetched: {len(all_packages)}")
+        for change in results:
+            name = change["id"]
+            if name.startswith("_design/"):
+                continue
+            if change.get("deleted"):
+                deleted.add(name)
+                changed.pop(name, None)
+            else:
+                changed[name] = (change.get("changes") or [{}])[-1].get("rev")
+                deleted.discard(name)
+
+        since = data.get("last_seq", results[-1]["seq"])
+        print(f"[INFO] Read {len(changed)} changed / {len(deleted)} deleted names so far")
+    return changed, deleted, since
+
+
+def _merge_sorted(existing, changed, deleted, key):
+    """
+    Walk a sorted iterable of entries alongside the sorted changed names.
+    Yields (entry, name, status) with status "new" (entry is None), "kept"
+    or "deleted", keeping the output in sorted order.
+    """
+    additions = iter(sorted(changed))
+    pending = next(additions, None)
+    for entry in existing:
+        name = key(entry)
+        while pending is not None and pending < name:
+            yield None, pending, "new"
+            pending = next(additions, None)
+        if pending == name:
+            pending = next(additions, None)
+        yield entry, name, "deleted" if name in deleted else "kept"
+    while pending is not None:
+        yield None, pending, "new"
+        pending = next(additions, None)
+
+
+def apply_changes(changed, deleted):
+    """Rewrite the sorted name files with the feed's changes; returns (added, removed)."""
+    added, removed = [], []
+
+    with open(NAMES_FILE) as src, open(f"{NAMES_FILE}.tmp", "w") as out:
+        existing = (line.rstrip("\n") for line in src if line.strip())
+        for _, name, status in _merge_sorted(existing, changed, deleted, key=lambda n: n):
+            if status == "deleted":
+                removed.append(name)
+                continue
+            if status == "new":
+                added.append(name)
+            out.write(name + "\n")
+    os.replace(f"{NAMES_FILE}.tmp", NAMES_FILE)
+
+    if Path(CACHE_FILE).exists():
+        with open(CACHE_FILE, "rb") as src, open(f"{CACHE_FILE}.tmp", "w") as out:
+            out.write("[")
+            first = True
+            rows = ijson.items(src, "item")
+            for row, name, status in _merge_sorted(rows, changed, deleted, key=lambda r: r["id"]):
+                if status == "deleted":
+                    continue
+                if name in changed:
+                    row = {"id": name, "key": name, "value": {"rev": changed[name]}}
+                out.write(("" if first else ",") + json.dumps(row))
+                first = False
+            out.write("]")
+        os.replace(f"{CACHE_FILE}.tmp", CACHE_FILE)
+
+    return added, removed
+
+
+def sync():
+    state = _load_json(SYNC_STATE_FILE)
+    if not state or state.get("last_seq") is None or not Path(NAMES_FILE).exists():
+        print("[INFO] No previous sync point; running a full download first.")
+        download_all_docs()
+        return
+
+    since = state["last_seq"]
+    print(f"[INFO] Syncing registry changes since sequence {since}...")
+    changed, deleted, last_seq = fetch_changes(since)
+    with phase("apply"):
+        added, removed = apply_changes(changed, deleted)
+
+    # Keep the typosquat index in step with the name list
+    if TyposquatIndex.exists(INDEX_DIR):
+        with phase("index"):
+            index = TyposquatIndex(INDEX_DIR)
+            if removed:
+                index.remove_names(removed)
+            if added:
+                index.add_names(added)
+            index.close()
+
+    # Downstream stages (incremental audits) read which names moved
+    changes = {
+        "since": since,
+        "until": last_seq,
+        "added": added,
+        "updated": sorted(set(changed) - set(added)),
+        "deleted": removed,
+    }
+    _save_json(CHANGES_FILE, changes)
+    with open(CHANGES_LOG, "a") as f:
+        f.write(json.dumps(changes) + "\n")
+    _save_json(SYNC_STATE_FILE, {"last_seq": last_seq})
+    print(f"[INFO] Sync complete: {len(added)} added, {len(changed) - len(added)} updated, {len(removed)} removed.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download or sync the npm registry name list.")
+    parser.add_argument("--sync", action="store_true", help="apply changes since the last download/sync")
+    args = parser.parse_args()
+
+    if args.sync:
+        sync()
+    elif Path(CHECKPOINT_FILE).exists() or not Path(CACHE_FILE).exists():
+        download_all_docs()
+    else:
+        print(f"[INFO] Using cached package list from {CACHE_FILE}")
+        if not Path(NAMES_FILE).exists():
+            write_names_from_cache()
 
-    # Save to JSON for future use
-    with open(CACHE_FILE, "w") as f:
-        json.dump(all_packages, f)
-    print(f"[INFO] Package list saved to {CACHE_FILE}")
+    # Pack the names for the audit/sweep scripts (rebuilt when the list changed)
+    with phase("name_table"), open_name_table(NAMES_FILE) as table:
+        print(f"[INFO] Total package names available for scanning: {len(table)}")
 
-# Extract just package names (the 'id' field) for your typosquat scanner
-all_package_names = [row['id'] for row in all_packages]
-print(f"[INFO] Total package names available for scanning: {len(all_package_names)}")
 
-# Optionally, save just names to a separate file
-with open("all_package_names.txt", "w") as f:
-    for name in all_package_names:
-        f.write(name + "\n")
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        write_summary("registry_names")
@@ -0,0 +1,223 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import ijson
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache_entries import cache_key, conditional_headers, entry_path, is_fresh, load_entry, save_entry
+from metrics import inc, record_upstream
+
+# Entries are stored in the format of cache_entries.py, shared with
+# finalproj/backend/http_cache.py, so full packuments fetched by the pipeline
+# are revalidated (not refetched) by the backend and vice versa. The crawl's
+# abbreviated packuments are a different representation of the same URL,
+# keyed by their Accept header; only the pipeline reads those.
+POOL_SIZE = int(os.environ.get("UPSTREAM_CONCURRENCY", 32))
+CHUNK_SIZE = 1 << 16
+HEADER_LIMIT = 1 << 16  # bytes searched for the start of an entry's data
+
+_session = None
+
+
+def get_session() -> requests.Session:
+    """Return a process-wide session with a keep-alive connection pool."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+class RateLimiter:
+    """
+    Blocking pacer for sequential request loops: wait() returns at most
+    `rate` times per second, and time spent on the request between two
+    calls counts towards the spacing.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + self.interval
+
+
+# -----------------------------
+# On-disk entries
+# -----------------------------
+def load_entry_meta(key):
+    """An entry's fields before "data" (etag, fetched_at, ...), without reading the body."""
+    meta = {}
+    try:
+        with open(entry_path(key), "rb") as f:
+            for prefix, event, value in ijson.parse(f, use_float=True):
+                if prefix == "" and event == "map_key" and value == "data":
+                    return meta
+                if prefix and event in ("string", "number", "null"):
+                    meta[prefix] = value
+    except (OSError, ijson.JSONError):
+        pass
+    return None
+
+
+# -----------------------------
+# Cached GET
+# -----------------------------
+def cached_get_json(url, headers=None, timeout=10, parse=None, revalidate=False):
+    """
+    GET a JSON document, revalidating any cached copy with a conditional
+    request. Returns the decoded body, or None on a 404; other non-200
+    responses raise requests.HTTPError.
+    With revalidate, even a fresh cached copy is checked with the server.
+    With parse, the body is never decoded whole: it is streamed into the
+    cache entry as is (under the same key the backend uses) and parse(file,
+    "data") reads its projection back out of the entry.
+    """
+    headers = dict(headers or {})
+    key = cache_key("GET", url, vary=headers.get("Accept", ""))
+    entry = load_entry(key) if parse is None else load_entry_meta(key)
+    if not revalidate and is_fresh(entry):
+        data = entry["data"] if parse is None else _read_entry(key, parse)
+        if data is not None:
+            inc("upstream_cache_total", result="fresh")
+            return data
+        entry = None
+
+    started = time.perf_counter()
+    try:
+        res = get_session().get(
+            url, headers=conditional_headers(entry, headers), timeout=timeout, stream=parse is not None
+        )
+    except requests.RequestException:
+        record_upstream(url, None, time.perf_counter() - started)
+        raise
+    record_upstream(url, res.status_code, time.perf_counter() - started)
+
+    with res:
+        if res.status_code == 304 and entry is not None:
+            if parse is None:
+                inc("upstream_cache_total", result="revalidated")
+                entry["fetched_at"] = time.time()
+                save_entry(key, entry)
+                return entry["data"]
+            data = _read_entry(key, parse)
+            if data is not None:
+                inc("upstream_cache_total", result="revalidated")
+                _touch_entry(key)
+                return data
+            # The entry went away or is unreadable; fetch it again unconditionally
+            entry_path(key).unlink(missing_ok=True)
+            return cached_get_json(url, headers, timeout, parse, revalidate)
+
+        inc("upstream_cache_total", result="miss")
+
+        if res.status_code == 404:
+            return None
+        if res.status_code != 200:
+            # 429, 5xx, ...: a failed request, not a missing document
+            raise requests.HTTPError(f"{res.status_code} for {url}", response=res)
+
+        meta = {
+            "url": url,
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        if parse is not None:
+            return _stream_entry(key, meta, res, parse)
+        data = res.json()
+
+    save_entry(key, {**meta, "data": data})
+    return data
+
+
+def _read_entry(key, parse):
+    """parse's projection of a stored entry's data, or None if it is missing or unreadable."""
+    try:
+        with open(entry_path(key), "rb") as f:
+            return parse(f, "data")
+    except (OSError, ValueError):
+        return None
+
+
+def _entry_header(meta):
+    """An entry's fields up to and including the "data" key; the body follows as is."""
+    return json.dumps(meta)[:-1].encode("utf-8") + b', "data": '
+
+
+def _touch_entry(key):
+    """
+    Mark a revalidated entry fresh again by rewriting only its fields
+    before "data": in place when the new ones are the same length,
+    otherwise by copying the body after them through unparsed.
+    """
+    meta = load_entry_meta(key)
+    if meta is None:
+        return
+    meta["fetched_at"] = time.time()
+    header = _entry_header(meta)
+    path = entry_path(key)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(path, "rb+") as f:
+            head = f.read(HEADER_LIMIT)
+            end = head.find(b'"data": ')
+            if end < 0:
+                return  # not written by save_entry / _stream_entry; left to expire
+            end += len(b'"data": ')
+            if end == len(header):
+                f.seek(0)
+                f.write(header)
+                return
+            f.seek(end)
+            with open(tmp, "wb") as out:
+                out.write(header)
+                shutil.copyfileobj(f, out, CHUNK_SIZE)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _stream_entry(key, meta, res, parse):
+    """
+    Write a 200 response's body into its cache entry unparsed, then return
+    parse's projection of it. If the cache cannot be written, the body is
+    parsed straight off the wire instead.
+    """
+    path = entry_path(key)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(tmp, "wb")
+    except OSError:
+        res.raw.decode_content = True
+        return parse(res.raw)
+
+    try:
+        with f:
+            # The entry's fields, then the body as the value of "data"
+            f.write(_entry_header(meta))
+            for chunk in res.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+            f.write(b"}")
+        with open(tmp, "rb") as f:
+            data = parse(f, "data")
+        os.replace(tmp, path)
+        return data
+    finally:
+        if tmp.exists():
+            tmp.unlink()
@@ -0,0 +1,183 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from tqdm import tqdm
+
+from audit_store import FETCH_FAILED
+from get_all_package_names import SYNC_STATE_FILE, CHANGES_LOG
+from metrics import phase
+
+# Re-audit support for the pipeline stages. Each stage keeps a small state
+# file with the registry sequence its results are current to. On the next
+# --incremental run the names touched since then are read from the sync log
+# (CHANGES_LOG, one line per get_all_package_names.py --sync) and only those
+# are refetched. When the log does not reach back to the stage's sequence
+# (first run, a full re-download in between), every stored package is
+# revalidated instead: conditional requests make unchanged ones a 304.
+
+
+def _load_json(path, default=None):
+    if not Path(path).exists():
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_json(path, obj, indent=None):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=indent)
+    os.replace(tmp, path)
+
+
+def load_state(path):
+    return _load_json(path, {})
+
+
+def save_state(path, last_seq):
+    _save_json(path, {"last_seq": last_seq, "updated_at": time.time()})
+
+
+def current_seq():
+    """Sequence the local name list is synced to (None before any download)."""
+    return _load_json(SYNC_STATE_FILE, {}).get("last_seq")
+
+
+# -----------------------------
+# Changed names
+# -----------------------------
+def changes_since(seq, log_file=CHANGES_LOG):
+    """
+    Names created/updated and deleted since seq, folded over the chain of
+    sync log entries starting at seq. Returns (changed, deleted, until), or
+    None when the log has no unbroken chain from seq.
+    """
+    if seq is None:
+        return None
+    if seq == current_seq():
+        return set(), set(), seq
+    if not Path(log_file).exists():
+        return None
+
+    changed, deleted = set(), set()
+    until = seq
+    with open(log_file) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn write from a crash
+            if entry.get("since") != until:
+                continue
+            for name in entry.get("added", []) + entry.get("updated", []):
+                changed.add(name)
+                deleted.discard(name)
+            for name in entry.get("deleted", []):
+                deleted.add(name)
+                changed.discard(name)
+            until = entry["until"]
+
+    if until != current_seq():
+        return None
+    return changed, deleted, until
+
+
+# -----------------------------
+# Record diffs
+# -----------------------------
+def _failed(record):
+    return record is None or "error" in record
+
+
+def diff_records(name, old, new):
+    """
+    What changed between two audit records of one package: a dict with
+    "status" (new / removed / changed), the version bump, maintainers and
+    dependencies added/removed and the other changed fields. Only keys both
+    records have are compared, so records written before a field existed
+    do not show up as changed. Returns None when nothing changed.
+    """
+    if _failed(old) and _failed(new):
+        return None
+    if _failed(old):
+        return {"name": name, "status": "new", "version": new.get("latest_version")}
+    if _failed(new):
+        return {"name": name, "status": "removed", "version": old.get("latest_version")}
+
+    fields = sorted(k for k in old.keys() & new.keys() if old[k] != new[k])
+    if not fields:
+        return None
+
+    diff = {"name": name, "status": "changed", "fields": fields}
+    if "latest_version" in fields:
+        diff["version"] = {"old": old["latest_version"], "new": new["latest_version"]}
+    for key in ("maintainers", "dependencies"):
+        if key in fields:
+            before, after = set(old[key] or []), set(new[key] or [])
+            diff[f"{key}_added"] = sorted(after - before)
+            diff[f"{key}_removed"] = sorted(before - after)
+    return diff
+
+
+def refresh_records(store, pairs, fetch, extract, total=None, desc="Re-auditing changed packages"):
+    """
+    Refetch each (name, previous record) pair with fetch(name, revalidate=True)
+    and append the new record to store when it differs. A failed fetch
+    (FETCH_FAILED) keeps the previous record. Returns (diffs, failed count);
+    callers keep their old sequence when anything failed, so the next run
+    sees those changes again.
+    """
+    diffs = []
+    failed = 0
+    for name, old in tqdm(pairs, total=total, desc=desc):
+        data = fetch(name, revalidate=True)
+        if data is FETCH_FAILED:
+            failed += 1
+            continue
+        with phase("extract"):
+            record = extract(name, data)
+        if record == old:
+            continue
+        with phase("store"):
+            store.append(name, record)
+        diff = diff_records(name, old, record)
+        if diff:
+            diffs.append(diff)
+    if failed:
+        print(f"[WARN] {failed} packages could not be fetched and keep their previous records")
+    return diffs, failed
+
+
+def summarize(diffs):
+    counts = {"new": 0, "removed": 0, "changed": 0,
+              "new_versions": 0, "maintainer_changes": 0, "new_dependencies": 0}
+    for diff in diffs:
+        counts[diff["status"]] += 1
+        if isinstance(diff.get("version"), dict):
+            counts["new_versions"] += 1
+        if diff.get("maintainers_added") or diff.get("maintainers_removed"):
+            counts["maintainer_changes"] += 1
+        if diff.get("dependencies_added"):
+            counts["new_dependencies"] += 1
+    return counts
+
+
+def write_diff_report(path, since, until, mode, diffs):
+    """Save a re-audit's diffs with their counts; mode is "changes" or "revalidated"."""
+    diffs = sorted(diffs, key=lambda d: d["name"])
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "since": since,
+        "until": until,
+        "mode": mode,
+        "counts": summarize(diffs),
+        "packages": diffs,
+    }
+    _save_json(path, report, indent=2)
+    counts = report["counts"]
+    print(f"[INFO] Re-audit: {counts['new']} new, {counts['changed']} changed, {counts['removed']} removed "
+          f"({counts['new_versions']} new versions, {counts['maintainer_changes']} maintainer changes, "
+          f"{counts['new_dependencies']} with new dependencies) → {path}")
+    return report
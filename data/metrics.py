@@ -0,0 +1,155 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from pathlib import Path
+
+import metrics_core
+
+# Process-wide counters and latency histograms for the pipeline scripts,
+# written out as <script>.metrics.json at the end of a run, plus a logger
+# that hands records to a background thread instead of writing them
+# inline. Counters, histograms and the shared metric names come from
+# metrics_core.py, which finalproj/backend/metrics.py uses too.
+#
+#   phase_seconds{phase}                      where a script's time goes (summed
+#                                             over threads/tasks, so it can exceed wall time)
+#   upstream_requests_total{upstream,status}  one per HTTP response ("error": no response)
+#   upstream_retries_total{upstream,reason}   retried attempts
+#   upstream_cache_total{result}              fresh / revalidated / miss
+#   upstream_seconds{upstream}                request latency
+
+METRICS_DIR = os.environ.get("METRICS_DIR", ".")
+LOG_BUFFER = int(os.environ.get("LOG_BUFFER", 200))  # log records held before a write
+
+
+# -----------------------------
+# Counters and histograms
+# -----------------------------
+class Metrics(metrics_core.Metrics):
+    """Shared counters and histograms, plus the run's start time and a JSON snapshot."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "histograms": [{"name": name, "labels": dict(labels), **h.snapshot()}
+                               for (name, labels), h in sorted(self.histograms.items())],
+            }
+
+
+metrics = Metrics()
+inc = metrics.inc
+observe = metrics.observe
+timer = metrics.timer
+phase = metrics.phase
+record_upstream = metrics.record_upstream
+
+
+# -----------------------------
+# End-of-run summary
+# -----------------------------
+def write_summary(script, suffix="", extra=None):
+    """
+    Save this process's metrics to METRICS_DIR/<script><suffix>.metrics.json
+    and print the phases that took the most time. Returns the path.
+    """
+    finished = time.time()
+    report = {
+        "script": script,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(metrics.started)),
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(finished)),
+        "wall_seconds": round(finished - metrics.started, 3),
+        **(extra or {}),
+        **metrics.snapshot(),
+    }
+    path = Path(METRICS_DIR) / f"{script}{suffix}.metrics.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+
+    phases = sorted((h for h in report["histograms"] if h["name"] == "phase_seconds"), key=lambda h: -h["sum"])
+    print(f"[INFO] Metrics → {path} ({report['wall_seconds']:.1f}s wall)")
+    for h in phases:
+        print(f"[INFO]   {h['labels']['phase']:<18} {h['sum']:>10.2f}s total  n={h['count']}  p95={h['p95']:.3f}s")
+    return path
+
+
+# -----------------------------
+# Logging
+# -----------------------------
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; fields passed as extra={"fields": {...}} are merged in."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class FieldLogger(logging.LoggerAdapter):
+    """log.info(msg, key=value, ...): keyword arguments become fields of the JSON line."""
+
+    def process(self, msg, kwargs):
+        passed = {k: kwargs.pop(k) for k in ("exc_info", "stack_info", "stacklevel") if k in kwargs}
+        return msg, {**passed, "extra": {"fields": kwargs}}
+
+
+_listeners = []
+
+
+def get_logger(name, path, console=True):
+    """
+    Logger that appends JSON lines to path (and echoes plain lines to
+    stdout with console). Records are put on a queue and written by a
+    background thread, LOG_BUFFER at a time (errors at once), so callers
+    never wait on the file. The queue is drained at exit.
+    """
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return FieldLogger(logger, {})
+
+    file_handler = logging.FileHandler(path, encoding="utf-8", delay=True)
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [logging.handlers.MemoryHandler(LOG_BUFFER, logging.ERROR, file_handler)]
+    if console:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+        handlers.append(stream_handler)
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, *handlers)
+    listener.start()
+    _listeners.append((listener, [*handlers, file_handler]))
+
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return FieldLogger(logger, {})
+
+
+@atexit.register
+def _close_loggers():
+    for listener, handlers in _listeners:
+        listener.stop()
+        for handler in handlers:
+            handler.close()
+    _listeners.clear()
@@ -0,0 +1,102 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Counters, histograms and the metric names recorded by both data/metrics.py
+# (written to a file at the end of a run) and finalproj/backend/metrics.py
+# (served by /metrics), so the two report comparable numbers. Standard
+# library only: the backend imports it.
+#
+#   phase_seconds{phase}                      where the time goes
+#   upstream_requests_total{upstream,status}  one per HTTP response ("error": no response)
+#   upstream_seconds{upstream}                request latency
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    """Observation counts per upper bound (seconds), with count, sum, min and max."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile, capped at max."""
+        if not self.count:
+            return None
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= q * self.count:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "min": None if self.min is None else round(self.min, 6),
+            "max": None if self.max is None else round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """Thread-safe named counters and histograms, each keyed by its labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}    # (name, labels) → value
+        self.histograms = {}  # (name, labels) → Histogram
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of the with-block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def phase(self, name):
+        """Time a with-block as phase_seconds{phase=name}."""
+        return self.timer("phase_seconds", phase=name)
+
+    def record_upstream(self, url, status, seconds):
+        """Count one upstream request by host and status (None: no response) and time it."""
+        upstream = upstream_name(url)
+        self.inc("upstream_requests_total", upstream=upstream, status=str(status or "error"))
+        self.observe("upstream_seconds", seconds, upstream=upstream)
+
+
+def upstream_name(url):
+    return urlsplit(url).hostname or "unknown"
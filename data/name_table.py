@@ -0,0 +1,183 @@
+import argparse
+import hashlib
+import mmap
+import os
+import sys
+from array import array
+from pathlib import Path
+
+ALL_PACKAGES_FILE = "all_package_names.txt"
+MAGIC = b"NPMNAME1"
+HEADER_SIZE = 16  # magic + uint64 name count
+
+
+# -----------------------------
+# Building
+# -----------------------------
+def table_path_for(names_file):
+    return Path(names_file).with_suffix(".table")
+
+
+def write_name_table(names, table_file):
+    """
+    Write names as a packed table: header, uint64 offsets (count + 1),
+    then every name's UTF-8 bytes back to back, sorted bytewise and
+    de-duplicated. Returns the number of names written.
+    """
+    encoded = sorted({n.encode("utf-8") for n in names if n})
+    offsets = array("Q", [0])
+    for raw in encoded:
+        offsets.append(offsets[-1] + len(raw))
+
+    tmp = Path(f"{table_file}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(8, sys.byteorder))
+        offsets.tofile(f)
+        for raw in encoded:
+            f.write(raw)
+    os.replace(tmp, table_file)
+    return len(encoded)
+
+
+def build_from_names_file(names_file=ALL_PACKAGES_FILE, table_file=None):
+    table_file = table_file or table_path_for(names_file)
+    with open(names_file, encoding="utf-8") as f:
+        count = write_name_table((line.strip() for line in f), table_file)
+    print(f"[INFO] Packed {count} names into {table_file}")
+    return table_file
+
+
+def open_name_table(names_file=ALL_PACKAGES_FILE, table_file=None):
+    """Open the table for names_file, (re)building it if it is missing or older."""
+    table_file = Path(table_file or table_path_for(names_file))
+    if not table_file.exists() or (
+        Path(names_file).exists() and table_file.stat().st_mtime < Path(names_file).stat().st_mtime
+    ):
+        build_from_names_file(names_file, table_file)
+    return NameTable(table_file)
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+class NameTable:
+    """
+    Read-only, memory-mapped view of a packed name table. Names are
+    sorted by UTF-8 bytes and addressed by position; membership and prefix
+    queries are binary searches over the mapping, so nothing is loaded
+    into Python objects up front and every process that opens the same
+    file shares its pages. Pickles as its path, so pool workers reopen it.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a name table")
+        self._count = int.from_bytes(self._mm[8:16], sys.byteorder)
+        blob_start = HEADER_SIZE + (self._count + 1) * 8
+        self._offsets = memoryview(self._mm)[HEADER_SIZE:blob_start].cast("Q")
+        self._blob = memoryview(self._mm)[blob_start:]
+
+    def __reduce__(self):
+        return (NameTable, (str(self.path),))
+
+    def __len__(self):
+        return self._count
+
+    def fingerprint(self):
+        """Short content hash of the table: equal for the same names, whenever it was written."""
+        return hashlib.blake2b(self._mm, digest_size=8).hexdigest()
+
+    def raw(self, i):
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("name table index out of range")
+        return self.raw(i).decode("utf-8")
+
+    def __iter__(self):
+        return self.iter_range(0, self._count)
+
+    def iter_range(self, lo, hi):
+        for i in range(lo, hi):
+            yield self.raw(i).decode("utf-8")
+
+    def _bisect_left(self, key, lo=0, hi=None):
+        hi = self._count if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def index(self, name):
+        key = name.encode("utf-8")
+        i = self._bisect_left(key)
+        if i < self._count and self.raw(i) == key:
+            return i
+        raise ValueError(f"{name!r} is not in the name table")
+
+    def __contains__(self, name):
+        try:
+            self.index(name)
+        except ValueError:
+            return False
+        return True
+
+    def prefix_range(self, prefix):
+        """Positions [lo, hi) of the names starting with prefix."""
+        key = prefix.encode("utf-8")
+        lo = self._bisect_left(key)
+        # 0xff never occurs in UTF-8, so it sorts after every continuation
+        return lo, self._bisect_left(key + b"\xff", lo)
+
+    def with_prefix(self, prefix):
+        return self.iter_range(*self.prefix_range(prefix))
+
+    def scope(self, scope):
+        """Names published under @scope/."""
+        return self.with_prefix(f"@{scope.lstrip('@')}/")
+
+    def close(self):
+        self._offsets.release()
+        self._blob.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the packed registry name table.")
+    parser.add_argument("--names", default=ALL_PACKAGES_FILE)
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--contains", help="check whether a name is registered")
+    parser.add_argument("--prefix", help="list names starting with a prefix (e.g. @babel/)")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        build_from_names_file(args.names)
+    with open_name_table(args.names) as table:
+        if args.contains:
+            print(f"{args.contains}: {'present' if args.contains in table else 'absent'}")
+        if args.prefix:
+            for name in table.with_prefix(args.prefix):
+                print(name)
+        if not (args.contains or args.prefix):
+            print(f"[INFO] {table.path}: {len(table)} names")
+
+
+if __name__ == "__main__":
+    main()
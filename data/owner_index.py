@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import ijson
+from tqdm import tqdm
+
+import owner_queries
+from audit_store import AuditStore
+from metrics import phase, write_summary
+from owner_queries import normalize_repository
+
+INDEX_FILE = "owner_index.db"
+AUDIT_FILE = "all_packages_audit.json"    # collect_all_packages_from_registry output
+AUDIT_STORE = "all_packages_audit.store"  # ... and its store, when there is no merged file
+BATCH_SIZE = 5000  # records per insert batch while building
+
+# Inverted indexes over the registry audit: maintainer → packages and
+# repository → packages, plus per-maintainer / per-repository package counts
+# kept up to date on every change, so "who controls the most packages" or
+# "what else does this maintainer own" is an index lookup instead of a scan
+# over all_packages_audit.json. Repository URLs are normalized to
+# host/owner/repo first (see owner_queries.normalize_repository, which
+# finalproj/backend shares along with the queries).
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    name        TEXT PRIMARY KEY,
+    repository  TEXT,
+    maintainers INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS packages_by_repository ON packages (repository) WHERE repository IS NOT NULL;
+CREATE TABLE IF NOT EXISTS maintained (
+    maintainer TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    PRIMARY KEY (maintainer, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS maintained_by_name ON maintained (name, maintainer);
+CREATE TABLE IF NOT EXISTS maintainers (
+    maintainer TEXT PRIMARY KEY,
+    packages   INTEGER NOT NULL,
+    sole       INTEGER NOT NULL  -- packages nobody else maintains
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS maintainers_by_packages ON maintainers (packages DESC);
+CREATE INDEX IF NOT EXISTS maintainers_by_sole ON maintainers (sole DESC);
+CREATE TABLE IF NOT EXISTS repositories (
+    repository TEXT PRIMARY KEY,
+    packages   INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS repositories_by_packages ON repositories (packages DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def owners_of(record):
+    """(sorted maintainers, normalized repository) of an audit record, or None if it failed."""
+    if not record or "error" in record:
+        return None
+    maintainers = sorted({m for m in record.get("maintainers") or [] if isinstance(m, str) and m})
+    return maintainers, normalize_repository(record.get("repository"))
+
+
+# -----------------------------
+# Index
+# -----------------------------
+class OwnerIndex:
+    """SQLite maintainer and repository index over the registry audit records."""
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @staticmethod
+    def exists(path=INDEX_FILE):
+        return Path(path).exists()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM packages").fetchone()[0]
+
+    # -----------------------------
+    # Building
+    # -----------------------------
+    @classmethod
+    def build(cls, records, path=INDEX_FILE, total=None):
+        """
+        Build a fresh index from (name, audit record) pairs next to path and
+        swap it in when done, so readers never see a half-built index.
+        Counts are computed once at the end instead of per insert.
+        """
+        tmp = f"{path}.tmp"
+        for leftover in (tmp, f"{tmp}-wal", f"{tmp}-shm"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+        index = cls(tmp)
+        conn = index.conn
+        packages, maintained = [], []
+
+        def flush():
+            conn.executemany("INSERT INTO packages VALUES (?, ?, ?)", packages)
+            conn.executemany("INSERT INTO maintained VALUES (?, ?)", maintained)
+            packages.clear()
+            maintained.clear()
+
+        # Names are unique in both sources (the store keeps the latest record per key)
+        for name, record in tqdm(records, total=total, desc="Indexing owners", unit=" packages"):
+            owners = owners_of(record)
+            if owners is None:
+                continue
+            maintainers, repository = owners
+            packages.append((name, repository, len(maintainers)))
+            maintained.extend((m, name) for m in maintainers)
+            if len(packages) >= BATCH_SIZE:
+                flush()
+        flush()
+
+        conn.execute(
+            "INSERT INTO maintainers "
+            "SELECT m.maintainer, COUNT(*), SUM(p.maintainers = 1) "
+            "FROM maintained m JOIN packages p ON p.name = m.name GROUP BY m.maintainer"
+        )
+        conn.execute(
+            "INSERT INTO repositories "
+            "SELECT repository, COUNT(*) FROM packages WHERE repository IS NOT NULL GROUP BY repository"
+        )
+        index._set_meta(built_at=time.time(), updated_at=time.time())
+        index.close()
+
+        os.replace(tmp, path)
+        for stale in (f"{path}-wal", f"{path}-shm"):
+            if os.path.exists(stale):
+                os.remove(stale)
+        return cls(path)
+
+    # -----------------------------
+    # Incremental updates
+    # -----------------------------
+    def update(self, records):
+        """
+        Re-index (name, audit record) pairs, e.g. the packages an
+        incremental audit changed. Failed records (unpublished packages)
+        are dropped from the index. Counts are adjusted in place.
+        """
+        updated = 0
+        for name, record in records:
+            self._drop(name)
+            owners = owners_of(record)
+            if owners is not None:
+                self._add(name, *owners)
+            updated += 1
+        self._set_meta(updated_at=time.time())
+        self.conn.commit()
+        return updated
+
+    def _add(self, name, maintainers, repository):
+        sole = int(len(maintainers) == 1)
+        self.conn.execute("INSERT INTO packages VALUES (?, ?, ?)", (name, repository, len(maintainers)))
+        self.conn.executemany("INSERT INTO maintained VALUES (?, ?)", [(m, name) for m in maintainers])
+        self.conn.executemany(
+            "INSERT INTO maintainers VALUES (?, 1, ?) "
+            "ON CONFLICT(maintainer) DO UPDATE SET packages = packages + 1, sole = sole + excluded.sole",
+            [(m, sole) for m in maintainers],
+        )
+        if repository:
+            self.conn.execute(
+                "INSERT INTO repositories VALUES (?, 1) "
+                "ON CONFLICT(repository) DO UPDATE SET packages = packages + 1",
+                (repository,),
+            )
+
+    def _drop(self, name):
+        row = self.conn.execute("SELECT repository, maintainers FROM packages WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return
+        repository, count = row
+        sole = int(count == 1)
+        self.conn.execute(
+            "UPDATE maintainers SET packages = packages - 1, sole = sole - ? "
+            "WHERE maintainer IN (SELECT maintainer FROM maintained WHERE name = ?)",
+            (sole, name),
+        )
+        self.conn.execute("DELETE FROM maintainers WHERE packages <= 0")
+        if repository:
+            self.conn.execute("UPDATE repositories SET packages = packages - 1 WHERE repository = ?", (repository,))
+            self.conn.execute("DELETE FROM repositories WHERE packages <= 0")
+        self.conn.execute("DELETE FROM maintained WHERE name = ?", (name,))
+        self.conn.execute("DELETE FROM packages WHERE name = ?", (name,))
+
+    def _set_meta(self, **values):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)", [(k, json.dumps(v)) for k, v in values.items()]
+        )
+
+    # -----------------------------
+    # Queries (see owner_queries)
+    # -----------------------------
+    def maintainer(self, maintainer, limit=100, offset=0):
+        return owner_queries.maintainer(self.conn, maintainer, limit, offset)
+
+    def repository(self, url, limit=100, offset=0):
+        return owner_queries.repository(self.conn, url, limit, offset)
+
+    def owners(self, names):
+        return owner_queries.owners(self.conn, names)
+
+    def top(self, limit=20):
+        return owner_queries.top(self.conn, limit)
+
+
+# -----------------------------
+# Sources
+# -----------------------------
+def audit_records(source):
+    """(name, record) pairs from an audit store directory or an {name: record} JSON file, streamed."""
+    if Path(source).is_dir():
+        store = AuditStore(source)
+        yield from store.items()
+        return
+    with open(source, "rb") as f:
+        yield from ijson.kvitems(f, "")
+
+
+def default_source():
+    return AUDIT_FILE if Path(AUDIT_FILE).exists() else AUDIT_STORE
+
+
+def update_from_diff(index, diff_file, store_dir=AUDIT_STORE):
+    """Re-index the packages listed in an incremental audit's diff report."""
+    with open(diff_file) as f:
+        names = [d["name"] for d in json.load(f)["packages"]]
+    records = AuditStore(store_dir).get_many(names)
+    return index.update((name, records.get(name)) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, update or query the maintainer/repository index.")
+    parser.add_argument("--index", default=INDEX_FILE)
+    parser.add_argument("--from", dest="source", help=f"audit store or JSON file to build from "
+                                                      f"(default: {AUDIT_FILE}, else {AUDIT_STORE})")
+    parser.add_argument("--diff", help="apply an incremental audit's diff report instead of rebuilding")
+    parser.add_argument("--store", default=AUDIT_STORE, help="store the --diff records are read from")
+    parser.add_argument("--maintainer", help="packages maintained by this npm user")
+    parser.add_argument("--package", help="maintainers and repository of this package")
+    parser.add_argument("--repository", help="packages published from this repository URL")
+    parser.add_argument("--top", type=int, help="maintainers and repositories with the most packages")
+    args = parser.parse_args()
+
+    queries = {
+        "maintainer": lambda index: index.maintainer(args.maintainer),
+        "package": lambda index: index.owners([args.package]).get(args.package),
+        "repository": lambda index: index.repository(args.repository),
+        "top": lambda index: index.top(args.top),
+    }
+    wanted = [name for name in queries if getattr(args, name)]
+    if wanted:
+        with OwnerIndex(args.index) as index:
+            for name in wanted:
+                started = time.perf_counter()
+                result = queries[name](index)
+                print(json.dumps(result, indent=2))
+                print(f"[INFO] {name} query took {(time.perf_counter() - started) * 1000:.2f} ms")
+        return
+
+    if args.diff:
+        with phase("update"), OwnerIndex(args.index) as index:
+            count = update_from_diff(index, args.diff, args.store)
+        print(f"[INFO] Re-indexed {count} changed packages in {args.index}")
+        return
+
+    source = args.source or default_source()
+    print(f"[INFO] Building owner index from {source}...")
+    with phase("build"), OwnerIndex.build(audit_records(source), args.index) as index:
+        print(f"[INFO] Indexed {len(index)} packages → {args.index}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        write_summary("owner_index")
@@ -0,0 +1,142 @@
+import re
+
+# Repository normalization and the read queries over the ownership index.
+# owner_index.py builds the index with these rules and finalproj/backend
+# serves it through the same queries, so both sides agree on what a
+# repository key looks like. Standard library only: the backend imports it.
+
+LOOKUP_CHUNK = 500  # names per IN (...) query
+
+
+# -----------------------------
+# Repository URLs
+# -----------------------------
+SHORTHAND_HOSTS = {"github": "github.com", "gitlab": "gitlab.com", "bitbucket": "bitbucket.org"}
+OWNER_REPO_HOSTS = {"github.com", "bitbucket.org"}  # paths past owner/repo are subdirectories
+_SHORTHAND = re.compile(r"^(?:(github|gitlab|bitbucket):)?([\w.-]+)/([\w.-]+)$")
+
+
+def normalize_repository(repository):
+    """
+    Canonical host/owner/repo form of a package.json repository field (a
+    dict with "url" or a string), so git+https://github.com/a/b.git,
+    git@github.com:a/b and github:a/b all map to github.com/a/b.
+    Returns None when there is no usable URL.
+    """
+    url = repository.get("url") if isinstance(repository, dict) else repository
+    if not isinstance(url, str):
+        return None
+    url = url.split("#", 1)[0].strip().lower()
+
+    m = _SHORTHAND.match(url)
+    if m:
+        host, path = SHORTHAND_HOSTS[m.group(1) or "github"], f"{m.group(2)}/{m.group(3)}"
+    else:
+        url = re.sub(r"^git\+", "", url)
+        url = re.sub(r"^[a-z][a-z0-9+.-]*://", "", url)
+        if "@" in url.split("/", 1)[0]:
+            url = url.split("@", 1)[1]  # user@ (scp-style git@host:owner/repo)
+        host, _, path = url.partition("/")
+        host, _, after_colon = host.partition(":")
+        if after_colon and not after_colon.isdigit():
+            path = f"{after_colon}/{path}"
+
+    parts = [p for p in path.split("/") if p]
+    if parts:
+        parts[-1] = parts[-1].removesuffix(".git")
+    host = host.removeprefix("www.")
+    if host in OWNER_REPO_HOSTS:
+        parts = parts[:2]
+    if not host or "." not in host or not parts or not parts[-1]:
+        return None
+    return "/".join([host, *parts])
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+def maintainer(conn, maintainer, limit=100, offset=0):
+    """Packages maintainer maintains (a page of them) with their counts, or None."""
+    row = conn.execute("SELECT packages, sole FROM maintainers WHERE maintainer = ?", (maintainer,)).fetchone()
+    if row is None:
+        return None
+    names = [r[0] for r in conn.execute(
+        "SELECT name FROM maintained WHERE maintainer = ? ORDER BY name LIMIT ? OFFSET ?",
+        (maintainer, limit, offset),
+    )]
+    return {"maintainer": maintainer, "packages": row[0], "sole": row[1], "names": names}
+
+
+def repository(conn, url, limit=100, offset=0):
+    """Packages published from the repository at url (any spelling), or None."""
+    repository = normalize_repository(url)
+    row = conn.execute("SELECT packages FROM repositories WHERE repository = ?", (repository,)).fetchone()
+    if row is None:
+        return None
+    names = [r[0] for r in conn.execute(
+        "SELECT name FROM packages WHERE repository = ? ORDER BY name LIMIT ? OFFSET ?",
+        (repository, limit, offset),
+    )]
+    return {"repository": repository, "packages": row[0], "names": names}
+
+
+def owners(conn, names):
+    """{name: {"maintainers": [...], "repository": ...}} for the indexed names among names."""
+    names = list(dict.fromkeys(names))
+    found = {}
+    for start in range(0, len(names), LOOKUP_CHUNK):
+        chunk = names[start:start + LOOKUP_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        for name, repository in conn.execute(
+            f"SELECT name, repository FROM packages WHERE name IN ({marks})", chunk
+        ):
+            found[name] = {"maintainers": [], "repository": repository}
+        for name, maintainer in conn.execute(
+            f"SELECT name, maintainer FROM maintained WHERE name IN ({marks}) ORDER BY name, maintainer", chunk
+        ):
+            found[name]["maintainers"].append(maintainer)
+    return found
+
+
+def maintainer_counts(conn, maintainers):
+    """{maintainer: {"packages": n, "sole": n}} for the indexed maintainers among maintainers."""
+    maintainers = list(dict.fromkeys(maintainers))
+    counts = {}
+    for start in range(0, len(maintainers), LOOKUP_CHUNK):
+        chunk = maintainers[start:start + LOOKUP_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        for maintainer, packages, sole in conn.execute(
+            f"SELECT maintainer, packages, sole FROM maintainers WHERE maintainer IN ({marks})", chunk
+        ):
+            counts[maintainer] = {"packages": packages, "sole": sole}
+    return counts
+
+
+def top_maintainers(conn, limit=20, by="packages"):
+    """Maintainers with the most packages (by="packages") or sole-maintained packages (by="sole")."""
+    column = "sole" if by == "sole" else "packages"
+    return [
+        {"maintainer": m, "packages": p, "sole": s}
+        for m, p, s in conn.execute(
+            f"SELECT maintainer, packages, sole FROM maintainers ORDER BY {column} DESC LIMIT ?", (limit,)
+        )
+    ]
+
+
+def top_repositories(conn, limit=20):
+    """Repositories that publish the most packages."""
+    return [
+        {"repository": r, "packages": p}
+        for r, p in conn.execute(
+            "SELECT repository, packages FROM repositories ORDER BY packages DESC LIMIT ?", (limit,)
+        )
+    ]
+
+
+def top(conn, limit=20):
+    """Maintainers (by packages and sole packages) and repositories with the most packages."""
+    return {
+        "maintainers": top_maintainers(conn, limit),
+        "sole_maintainers": top_maintainers(conn, limit, by="sole"),
+        "repositories": top_repositories(conn, limit),
+    }
@@ -0,0 +1,123 @@
+from itertools import chain
+
+import ijson
+
+# Registry "corgi" documents: dist-tags plus per-version install fields
+# (dependencies, dist.tarball/integrity, engines, ...). No readme, time,
+# maintainers or descriptions, but a fraction of the full packument's size.
+ABBREVIATED_ACCEPT = "application/vnd.npm.install-v1+json; q=1.0, application/json; q=0.8"
+
+# Fields of each version object that extract_audit_features reads
+VERSION_FIELDS = {"description", "keywords", "dependencies", "dist", "repository"}
+
+
+# -----------------------------
+# Event helpers
+# -----------------------------
+def _build(events, event, value):
+    """Materialize the value that starts with (event, value)."""
+    builder = ijson.ObjectBuilder()
+    builder.event(event, value)
+    depth = 1 if event in ("start_map", "start_array") else 0
+    while depth:
+        event, value = next(events)
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+    return builder.value
+
+
+def _skip(events, event):
+    """Consume the value that starts with event without building it."""
+    depth = 1 if event in ("start_map", "start_array") else 0
+    while depth:
+        event, _ = next(events)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+
+
+def _value_at(events, key):
+    """Advance events to the value under key of the top-level map."""
+    event, _ = next(events)
+    for k, event, value in _map_items(events, event):
+        if k == key:
+            return chain([(event, value)], events)
+        _skip(events, event)
+    raise ValueError(f"No {key!r} in document")
+
+
+def _map_items(events, event):
+    """Yield (key, first_event, first_value) for each entry of a map."""
+    if event != "start_map":
+        _skip(events, event)
+        return
+    for event, key in events:
+        if event == "end_map":
+            return
+        event, value = next(events)
+        yield key, event, value
+
+
+# -----------------------------
+# Audit projection
+# -----------------------------
+def extract_audit_document(fp, key=None):
+    """
+    Parse a full packument from a binary file object and keep only what
+    extract_audit_features needs: _rev, dist-tags, time.created/modified,
+    maintainers, the latest version's audited fields, a placeholder per
+    other version (for the count) and the readme length as
+    "_readme_length". The rest is never built. With key, the packument is
+    the value under key of the object in fp (an http_cache entry). Raises
+    ValueError on a malformed or truncated document.
+    """
+    try:
+        events = iter(ijson.basic_parse(fp, use_float=True))
+        if key is not None:
+            events = _value_at(events, key)
+        return _project_audit_document(events)
+    except (ijson.JSONError, StopIteration, RuntimeError) as e:
+        raise ValueError(f"Unreadable packument: {e}") from e
+
+
+def _project_audit_document(events):
+    event, _ = next(events)
+    doc = {"versions": {}}
+
+    for key, event, value in _map_items(events, event):
+        if key in ("_rev", "dist-tags", "maintainers"):
+            doc[key] = _build(events, event, value)
+        elif key == "time":
+            doc["time"] = {}
+            for k, e, v in _map_items(events, event):
+                if k in ("created", "modified"):
+                    doc["time"][k] = _build(events, e, v)
+                else:
+                    _skip(events, e)
+        elif key == "versions":
+            for version, v_event, _ in _map_items(events, event):
+                fields = doc["versions"][version] = {}
+                for k, e, v in _map_items(events, v_event):
+                    if k in VERSION_FIELDS:
+                        fields[k] = _build(events, e, v)
+                    else:
+                        _skip(events, e)
+        elif key == "readme":
+            if event == "string":
+                doc["_readme_length"] = len(value)
+            else:
+                _skip(events, event)
+                doc["_readme_length"] = 0
+        else:
+            _skip(events, event)
+
+    # Only the latest version's fields are needed; the rest just count
+    latest = doc.get("dist-tags", {}).get("latest")
+    for version, fields in doc["versions"].items():
+        if version != latest:
+            fields.clear()
+    return doc
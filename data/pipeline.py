@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import get_all_package_names as registry_names
+import recursive_dependency_checker as crawler
+import run_node_medic_fine as nodemedic
+import typosquat_audit as typosquat
+from async_fetch import RegistryFetcher
+from audit_store import AuditStore, FETCH_FAILED, write_json_object
+from dependency_db import DependencyDB, DB_FILE
+from incremental import current_seq, save_state
+from metrics import inc, observe, phase, write_summary
+from typosquat_index import TyposquatIndex, INDEX_DIR
+
+# Runs typosquat scan → audit → dependency crawl → NodeMedic as one process,
+# with each stage's output going to the next one as it is produced instead of
+# through the intermediate JSON files:
+#
+#   scan ──candidates──▶ audit (threads) ──▶ crawl (async) ──jobs──▶ analysis (threads)
+#                                              ▲      │
+#                                              └──────┘ newly found dependencies
+#
+# The candidate and job queues are bounded, so a slow stage holds back the
+# ones feeding it: crawl workers wait while QUEUE_SIZE tarballs are already
+# waiting for NodeMedic. The crawl frontier is not bounded, since crawl
+# workers feed it themselves (a full queue would deadlock them); it only holds
+# package names. Each stage writes to the same store as its standalone script
+# (typosquat_audit.store, dependency_audit.db, nodemedic_results.store) and
+# skips work already there, so an interrupted run picks up where it stopped.
+
+QUEUE_SIZE = 64          # items waiting between two stages
+AUDIT_WORKERS = 8        # simultaneous candidate audits (registry fetches)
+COMMIT_EVERY = 200       # crawled packages between dependency DB commits
+PROGRESS_INTERVAL = 30   # seconds between progress lines
+
+
+class Pipeline:
+    """
+    The four stages of the data/ workflow as asyncio tasks joined by queues.
+    Registry fetches and analyses run in per-stage thread pools; the stores
+    and the dependency DB are only touched from the event loop thread.
+    """
+
+    def __init__(self, targets, audit_workers=AUDIT_WORKERS, crawl_concurrency=crawler.CONCURRENCY,
+                 rate=crawler.REQUESTS_PER_SECOND, analysis_workers=None, batch=False, containers=None,
+                 queue_size=QUEUE_SIZE):
+        self.targets = targets
+        self.audit_workers = audit_workers
+        self.crawl_concurrency = crawl_concurrency
+        self.rate = rate
+        self.analysis_workers = analysis_workers or nodemedic.default_workers()
+        self.batch = batch
+        self.containers = containers
+        self.queue_size = queue_size
+
+        self.suspects = set()  # candidates found by this run's scan
+        self.seen = set()      # names that entered the crawl
+        self.current = {}      # pkg -> results key of the version analyzed this run
+        self.first = {}        # stage -> seconds until its first new output
+        # New outputs per stage this run (work found in the stores is not counted)
+        self.done = {"scan": 0, "audit": 0, "crawl": 0, "analysis": 0}
+        self.uncommitted = 0
+
+    # -----------------------------
+    # Stages
+    # -----------------------------
+    async def scan(self, index):
+        """Queue the typosquat candidates of each target, as each target is scanned."""
+        for target in self.targets:
+            matches = await asyncio.to_thread(typosquat.scan_target, index, target)
+            for name in matches:
+                if name not in self.suspects:
+                    self.suspects.add(name)
+                    self._mark("scan")
+                    await self.candidates.put(name)
+
+    async def audit(self, name):
+        if name not in self.audits:
+            metadata = await self.loop.run_in_executor(self.audit_pool, typosquat.fetch_package_info, name)
+            # A failed fetch is not stored, so the next run audits it again
+            if metadata is not FETCH_FAILED:
+                with phase("extract"):
+                    record = typosquat.extract_audit_features(name, metadata)
+                with phase("store"):
+                    self.audits.append(name, record)
+                self._mark("audit")
+        self.db.mark_roots([name])
+        self._enter_crawl(name)
+
+    async def crawl(self, name):
+        if name in self.db:
+            deps = self.db.dependencies(name)
+        else:
+            deps = await crawler.fetch_into(self.db, self.fetcher, name)
+            self.uncommitted += 1
+            if self.uncommitted >= COMMIT_EVERY:
+                with phase("commit"):
+                    self.db.commit()
+                self.uncommitted = 0
+            self._mark("crawl")
+
+        for dep in deps:
+            self._enter_crawl(dep)
+        await self.jobs.put(nodemedic.plan_job(self.db.package(name)))
+
+    async def analyze(self, job):
+        pkg, version, dist = job
+        if version is None:
+            self.current[pkg] = pkg
+            self.results.append(pkg, dist)
+            return
+
+        # Versions analyzed by an earlier run are not analyzed again
+        key = f"{pkg}@{version}"
+        self.current[pkg] = key
+        if key in self.results and key not in self.retry:
+            return
+        try:
+            result, timings = await self.loop.run_in_executor(
+                self.analysis_pool, nodemedic.analyze_package, pkg, dist["tarball"],
+                dist.get("integrity"), dist.get("shasum"), self.warm,
+            )
+        except Exception as e:
+            result, timings = {"error": f"analysis_crashed: {e}"}, {}
+        nodemedic.record_analysis(self.results, self.timings_f, key, result, timings, self.mode)
+        self._mark("analysis")
+
+    # -----------------------------
+    # Plumbing
+    # -----------------------------
+    def _enter_crawl(self, name):
+        if name not in self.seen:
+            self.seen.add(name)
+            self.frontier.put_nowait(name)
+
+    def _mark(self, stage):
+        self.done[stage] += 1
+        if stage not in self.first:
+            self.first[stage] = time.monotonic() - self.started
+            observe("pipeline_first_output_seconds", self.first[stage], stage=stage)
+            print(f"[INFO] First {stage} output after {self.first[stage]:.2f}s")
+
+    async def _drain(self, stage, queue, handle):
+        """Worker loop: take items off queue and hand them to one stage."""
+        while True:
+            item = await queue.get()
+            try:
+                with phase(f"pipeline_{stage}"):
+                    await handle(item)
+            except Exception as e:
+                inc("pipeline_errors_total", stage=stage)
+                print(f"[ERROR] {stage} failed for {item!r}: {e}")
+            finally:
+                queue.task_done()
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            print(f"[INFO] New: {self.done['scan']} candidates, {self.done['audit']} audited, "
+                  f"{self.done['crawl']} crawled, {self.done['analysis']} analyzed | "
+                  f"queued: {self.candidates.qsize()} audit, {self.frontier.qsize()} crawl, "
+                  f"{self.jobs.qsize()} analysis")
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.candidates = asyncio.Queue(self.queue_size)
+        self.frontier = asyncio.Queue()
+        self.jobs = asyncio.Queue(self.queue_size)
+
+        stages = (
+            ("audit", self.candidates, self.audit, self.audit_workers),
+            ("crawl", self.frontier, self.crawl, self.crawl_concurrency),
+            ("analysis", self.jobs, self.analyze, self.analysis_workers),
+        )
+        workers = {
+            stage: [asyncio.create_task(self._drain(stage, queue, handle)) for _ in range(count)]
+            for stage, queue, handle, count in stages
+        }
+        reporter = asyncio.create_task(self._report())
+        try:
+            with phase("index"):
+                index = await asyncio.to_thread(TyposquatIndex.open_or_build, INDEX_DIR, typosquat.ALL_PACKAGES_FILE)
+            try:
+                await self.scan(index)
+            finally:
+                index.close()
+            print(f"[INFO] Scan complete: {len(self.suspects)} potential typosquats.")
+
+            # A stage is finished once the stage before it is and its queue is empty
+            for stage, queue, _, _ in stages:
+                await queue.join()
+                for task in workers[stage]:
+                    task.cancel()
+        finally:
+            reporter.cancel()
+            tasks = [reporter, *(task for group in workers.values() for task in group)]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def execute(self):
+        """Open the stores, run every stage, and write the usual output files."""
+        self.started = time.monotonic()
+        self.audits = AuditStore(typosquat.STORE_DIR)
+        self.results = AuditStore(nodemedic.STORE_DIR)
+        # Transient download failures are retried; real analysis results are kept
+        self.retry = {key for key, result in self.results.items() if result.get("error") == "download_failed"}
+        self.mode = "warm" if self.batch else "cold"
+        self.warm = None
+
+        with self.audits, self.results, DependencyDB(DB_FILE) as self.db, \
+                ThreadPoolExecutor(self.audit_workers) as self.audit_pool, \
+                ThreadPoolExecutor(self.analysis_workers) as self.analysis_pool, \
+                open(nodemedic.TIMINGS_FILE, "a") as self.timings_f:
+            # Later --incremental runs of the standalone scripts start from here
+            if not len(self.audits):
+                save_state(typosquat.STATE_FILE, current_seq())
+            if not any(True for _ in self.db.iter_packages()):
+                save_state(crawler.STATE_FILE, current_seq())
+
+            print(f"[INFO] Scanning {len(self.targets)} targets; {self.audit_workers} audit workers, "
+                  f"{self.crawl_concurrency} crawl requests, {self.analysis_workers} analyses "
+                  f"({self.mode} containers) at a time")
+            if self.batch:
+                self.warm = nodemedic.WarmContainerPool(self.containers or self.analysis_workers)
+            try:
+                asyncio.run(self._run_with_fetcher())
+            finally:
+                if self.warm:
+                    self.warm.close()
+
+            self.export()
+
+        elapsed = time.monotonic() - self.started
+        print(f"[INFO] Pipeline complete in {elapsed:.1f}s: {len(self.suspects)} candidates, "
+              f"{len(self.seen)} packages crawled, {self.done['analysis']} analyses.")
+        return {"first_output_s": {stage: round(secs, 3) for stage, secs in self.first.items()}}
+
+    async def _run_with_fetcher(self):
+        async with RegistryFetcher(self.crawl_concurrency, self.rate, base_url=crawler.NPM_INFO_URL) as self.fetcher:
+            await self.run()
+
+    def export(self):
+        """The single-file outputs the standalone scripts write, for existing consumers."""
+        with phase("write"):
+            with open(typosquat.OUTPUT_FILE, "w") as f:
+                write_json_object(f, ((k, v) for k, v in self.audits.items() if k in self.suspects))
+            self.db.export_json(crawler.OUTPUT_FILE)
+            wanted = {key: pkg for pkg, key in self.current.items()}
+            with open(nodemedic.OUTPUT_FILE, "w") as f:
+                write_json_object(f, ((wanted[key], result) for key, result in self.results.items()
+                                      if key in wanted))
+        print(f"[INFO] Results saved → {typosquat.OUTPUT_FILE}, {crawler.OUTPUT_FILE}, {nodemedic.OUTPUT_FILE}")
+
+
+def load_targets(path=None, top=None):
+    if path is None:
+        return typosquat.TARGET_PACKAGES[:top]
+    from typosquat_sweep import load_top_packages
+    return load_top_packages(path, top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Scan, audit, crawl and analyze typosquat candidates as one streaming pipeline.")
+    parser.add_argument("--sync", action="store_true", help="sync the registry name list first")
+    parser.add_argument("--targets", help="downloads sheet to read targets from "
+                                          f"(default: {', '.join(typosquat.TARGET_PACKAGES)})")
+    parser.add_argument("--top", type=int, help="only scan the first N targets")
+    parser.add_argument("--audit-workers", type=int, default=AUDIT_WORKERS)
+    parser.add_argument("--crawl-concurrency", type=int, default=crawler.CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=crawler.REQUESTS_PER_SECOND,
+                        help="crawl requests per second")
+    parser.add_argument("--workers", type=int, help="parallel analyses (default: cores/memory)")
+    parser.add_argument("--batch", action="store_true", help="reuse long-lived analyzer containers")
+    parser.add_argument("--containers", type=int, help="warm containers in batch mode (default: workers)")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    args = parser.parse_args()
+
+    extra = None
+    try:
+        if args.sync:
+            with phase("sync"):
+                registry_names.sync()
+        pipeline = Pipeline(
+            load_targets(args.targets, args.top), args.audit_workers, args.crawl_concurrency, args.rate,
+            args.workers, args.batch, args.containers, args.queue_size,
+        )
+        extra = pipeline.execute()
+    finally:
+        write_summary("pipeline", extra=extra)
@@ -1,28 +1,49 @@
+import argparse
+import asyncio
 import json
-import requests
+import os
 from tqdm import tqdm
-from functools import lru_cache
-import time
 
-NPM_INFO_URL = "https://registry.npmjs.org"
+from async_fetch import RegistryFetcher, FetchError
+from dependency_db import DependencyDB, DB_FILE, FETCH_FAILED
+from metrics import phase, write_summary
+from incremental import changes_since, current_seq, load_state, save_state, diff_records, write_diff_report
+
+NPM_INFO_URL = os.environ.get("NPM_REGISTRY_URL", "https://registry.npmjs.org")
 INPUT_FILE = "typosquat_audit.json"
 OUTPUT_FILE = "dependency_audit.json"
+# DB_FILE (dependency_audit.db) holds the crawl: slim indexed columns, edges
+# and compressed packuments. It doubles as the resume checkpoint.
+STATE_FILE = "dependency_audit.state.json"  # registry sequence the crawl is current to
+DIFF_FILE = "dependency_audit.diff.json"    # what the last --incremental run changed
+
+CONCURRENCY = 16          # simultaneous registry requests
+REQUESTS_PER_SECOND = 20  # token-bucket rate shared by the whole crawl
 
 
 # -------------------------------
-# Fetch npm metadata with caching
+# Dependency extraction
 # -------------------------------
 
-@lru_cache(maxsize=None)
-def fetch_package(name):
-    """Fetch metadata with caching to avoid duplicate HTTP calls."""
-    try:
-        res = requests.get(f"{NPM_INFO_URL}/{name}", timeout=10)
-        if res.status_code != 200:
-            return None
-        return res.json()
-    except requests.RequestException:
-        return None
+async def fetch_into(db, fetcher, name, revalidate=False):
+    """
+    Fetch one package's install-only document and record it in db. Returns
+    its dependencies; a package that could not be fetched is recorded as
+    FETCH_FAILED (with none) so a later run tries it again.
+    """
+    # Install-only document: dist-tags, per-version dependencies and dist
+    # are all the crawl and the NodeMedic stage need
+    error = None
+    with phase("fetch"):
+        try:
+            pkg_data = await fetcher.fetch_package(name, abbreviated=True, revalidate=revalidate)
+        except FetchError as e:
+            pkg_data, error = None, FETCH_FAILED
+            print(f"[WARN] {e}")
+    deps = extract_dependencies(pkg_data)
+    with phase("store"):
+        db.add_package(name, pkg_data, deps, error)
+    return deps
 
 
 def extract_dependencies(pkg_data):
@@ -41,29 +62,65 @@ def extract_dependencies(pkg_data):
 
 
 # ------------------------------------
-# Recursive dependency crawler
+# Breadth-first dependency crawler
 # ------------------------------------
 
-def crawl_dependencies(root_name, graph, visited):
+async def crawl_dependencies(roots, db, concurrency=CONCURRENCY, rate=REQUESTS_PER_SECOND, refresh=()):
     """
-    Recursively explore dependencies.
-    graph[root_name] = list of direct dependencies.
-    visited ensures we do not loop.
+    Explore dependencies level by level.
+    Returns graph where graph[name] = list of direct dependencies; each
+    packument is written to db as soon as it arrives. Packages already in
+    the db are not refetched (unless listed in refresh, which are
+    revalidated with the registry), and every name enters the frontier
+    once, so each packument is fetched a single time no matter how many
+    parents share it.
     """
-    if root_name in visited:
-        return
-
-    visited.add(root_name)
-
-    pkg_data = fetch_package(root_name)
-    deps = extract_dependencies(pkg_data)
-    graph[root_name] = deps
-
-    for dep in deps:
-        crawl_dependencies(dep, graph, visited)
+    graph = {}
+    level = list(dict.fromkeys(roots))
+    seen = set(level)
+
+    async with RegistryFetcher(concurrency, rate, base_url=NPM_INFO_URL) as fetcher:
+        depth = 0
+        while level:
+            bar = tqdm(total=len(level), desc=f"Crawling depth {depth}")
+
+            async def visit(name):
+                if name in db and name not in refresh:
+                    deps = db.dependencies(name)
+                else:
+                    deps = await fetch_into(db, fetcher, name, revalidate=name in refresh)
+                bar.update(1)
+                return deps
+
+            results = await asyncio.gather(*(visit(name) for name in level))
+            bar.close()
+            with phase("commit"):
+                db.commit()
+
+            next_level = []
+            for name, deps in zip(level, results):
+                graph[name] = deps
+                for dep in deps:
+                    if dep not in seen:
+                        seen.add(dep)
+                        next_level.append(dep)
+            level = next_level
+            depth += 1
+
+    return graph
+
+
+def crawled_record(db, name):
+    """The part of a crawled package an incremental run compares."""
+    row = db.package(name)
+    if row is None:
+        return None
+    if row[5]:
+        return {"name": name, "error": row[5]}
+    return {"name": name, "latest_version": row[1], "dependencies": db.dependencies(name)}
 
 
-def main():
+def main(incremental=False):
     # Load suspicious packages
     with open(INPUT_FILE) as f:
         audit_data = json.load(f)
@@ -71,41 +128,51 @@ def main():
     target_packages = list(audit_data.keys())
     print(f"[INFO] Found {len(target_packages)} packages to analyze recursively.")
 
-    dependency_graph = {}
-    visited = set()
-
-    # Crawl each package
-    for pkg in tqdm(target_packages, desc="Crawling dependencies"):
-        crawl_dependencies(pkg, dependency_graph, visited)
-        time.sleep(0.05)  # Avoid hammering npm registry
-
-    # Now collect metadata for EVERYTHING discovered
-    print(f"[INFO] Fetching metadata for {len(visited)} total packages...")
-
-    meta = {}
-    for pkg in tqdm(sorted(visited)):
-        pkg_data = fetch_package(pkg)
-        meta[pkg] = pkg_data or {"error": "Package not found"}
-
-    # reverse graph: which packages depend on this package?
-    reverse_dependencies = {}
-    for parent, children in dependency_graph.items():
-        for child in children:
-            reverse_dependencies.setdefault(child, []).append(parent)
-
-    output = {
-        "roots_analyzed": target_packages,
-        "dependency_graph": dependency_graph,
-        "reverse_dependencies": reverse_dependencies,
-        "metadata": meta
-    }
-
-    # Save results
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(output, f, indent=2)
-
-    print(f"[INFO] Full recursive dependency audit saved → {OUTPUT_FILE}")
+    # Crawl everything; packuments go straight to the database
+    with DependencyDB(DB_FILE) as db:
+        crawled = {row[0] for row in db.iter_packages()}
+        refresh = set()
+        if incremental:
+            since = load_state(STATE_FILE).get("last_seq")
+            changes = changes_since(since)
+            if changes is None:
+                print("[INFO] No changes log back to the last crawl; revalidating every crawled package...")
+                refresh, until, mode = crawled, current_seq(), "revalidated"
+            else:
+                changed, deleted, until = changes
+                refresh, mode = crawled & (changed | deleted), "changes"
+                print(f"[INFO] {len(refresh)} crawled packages changed since sequence {since}")
+            before = {name: crawled_record(db, name) for name in refresh}
+        elif not crawled:
+            save_state(STATE_FILE, current_seq())
+
+        db.mark_roots(target_packages)
+        dependency_graph = asyncio.run(crawl_dependencies(target_packages, db, refresh=refresh))
+        print(f"[INFO] Discovered {len(dependency_graph)} total packages.")
+
+        if incremental:
+            # Changed packages, plus packages first reached this run (new dependencies)
+            diffs = []
+            for name in sorted(refresh | (set(dependency_graph) - crawled)):
+                diff = diff_records(name, before.get(name), crawled_record(db, name))
+                if diff:
+                    diffs.append(diff)
+            write_diff_report(DIFF_FILE, since, until, mode, diffs)
+            save_state(STATE_FILE, until)
+
+        # Legacy single-file output, streamed out of the database
+        with phase("write"):
+            db.export_json(OUTPUT_FILE)
+
+    print(f"[INFO] Full recursive dependency audit saved → {OUTPUT_FILE} (indexed copy: {DB_FILE})")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Crawl the dependency trees of the audited packages.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="refetch only crawled packages changed since the last run and write a diff report")
+    args = parser.parse_args()
+    try:
+        main(incremental=args.incremental)
+    finally:
+        write_summary("dependency_audit")
@@ -1,28 +1,43 @@
+import base64
+import hashlib
 import json
 import os
 import tarfile
 import tempfile
+import threading
+import time
+import queue
+import shlex
+import argparse
 import subprocess
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-from datetime import datetime
 
-DEPENDENCY_AUDIT = "dependency_audit.json"
+from audit_store import AuditStore, write_json_object
+from dependency_db import DependencyDB, DB_FILE, FETCH_FAILED
+from metrics import get_logger, inc, observe, phase, record_upstream, write_summary
+
+DEPENDENCY_AUDIT = "dependency_audit.json"  # fallback when DB_FILE is absent
 OUTPUT_FILE = "nodemedic_results.json"
-DEBUG_LOG = "nm_debug.log"
+STORE_DIR = "nodemedic_results.store"  # per-version results, written as they finish
+TARBALL_CACHE = "tarball_cache"        # content-addressed by dist.integrity
+# JSON lines, written from a background thread; next to this script unless overridden
+DEBUG_LOG = os.environ.get("NODEMEDIC_DEBUG_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nm_debug.log"))
+TIMINGS_FILE = "nodemedic_timings.jsonl"  # per-package phase timings, one line per analysis
+BATCH_DIR = "nodemedic_batch"             # host dir mounted into warm containers
 
-DOCKER_IMAGE = "nodemedic-fine:latest"
+DOCKER = shlex.split(os.environ.get("DOCKER", "docker"))  # container CLI (bench/ swaps in a stub)
+DOCKER_IMAGE = os.environ.get("NODEMEDIC_IMAGE", "nodemedic-fine:latest")
+ANALYSIS_MEMORY = "2g"                 # docker --memory per analysis
+ANALYSIS_MEMORY_BYTES = 2 * 1024 ** 3
+ANALYSIS_TIMEOUT = 300
 
 
 # --------------------
-# LOGGING UTILITIES
+# LOGGING
 # --------------------
-def log(msg):
-    timestamp = datetime.utcnow().strftime("[%Y-%m-%d %H:%M:%S]")
-    line = f"{timestamp} {msg}"
-    print(line)
-    with open(DEBUG_LOG, "a") as f:
-        f.write(line + "\n")
+log = get_logger("nodemedic", DEBUG_LOG)
 
 
 # --------------------
@@ -38,23 +53,86 @@ def safe_extract_tar(path_to_tar, extract_to):
 
 
 # --------------------
-# DOWNLOAD TAR
+# TARBALL CACHE
 # --------------------
-def download_tarball(url, dest):
-    try:
-        r = requests.get(url, timeout=20)
-        if r.status_code != 200:
-            return False
+def parse_integrity(integrity, shasum=None):
+    """
+    Return (algorithm, hex digest) from an SRI string such as
+    "sha512-<base64>", falling back to the legacy sha1 shasum.
+    """
+    for token in (integrity or "").split():
+        algo, _, b64 = token.partition("-")
+        if algo in ("sha512", "sha384", "sha256", "sha1") and b64:
+            try:
+                return algo, base64.b64decode(b64).hex()
+            except ValueError:
+                continue
+    if shasum:
+        return "sha1", shasum.lower()
+    return None, None
+
 
-        with open(dest, "wb") as f:
-            f.write(r.content)
+def cached_tarball_path(algo, digest):
+    return os.path.join(TARBALL_CACHE, algo, digest[:2], f"{digest}.tgz")
 
-        log(f"Downloaded tarball {url} → {dest} ({len(r.content)} bytes)")
-        return True
+
+# --------------------
+# DOWNLOAD TAR
+# --------------------
+def download_tarball(url, integrity=None, shasum=None):
+    """
+    Stream a tarball into the content-addressed cache, verifying its hash.
+    Returns the cached path, or None on failure. Already-cached tarballs
+    are not downloaded again.
+    """
+    algo, digest = parse_integrity(integrity, shasum)
+    if algo is None:
+        # No hash to address by; key on the URL instead (unverified)
+        algo, digest = "url", hashlib.sha256(url.encode()).hexdigest()
+
+    dest = cached_tarball_path(algo, digest)
+    if os.path.exists(dest):
+        inc("tarball_cache_total", result="hit")
+        log.info(f"Tarball cache hit {url} → {dest}", url=url, path=dest)
+        return dest
+
+    inc("tarball_cache_total", result="miss")
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.{threading.get_ident()}.part"
+    hasher = hashlib.new(algo) if algo != "url" else None
+    size = 0
+
+    started = time.perf_counter()
+    status = None
+    try:
+        with requests.get(url, timeout=20, stream=True) as r:
+            status = r.status_code
+            if r.status_code != 200:
+                return None
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
+                    size += len(chunk)
+                    if hasher:
+                        hasher.update(chunk)
+
+        if hasher and hasher.hexdigest() != digest:
+            log.warning(f"Integrity mismatch for {url}: expected {algo}:{digest}", url=url)
+            os.remove(tmp)
+            return None
+
+        os.replace(tmp, dest)
+        log.info(f"Downloaded tarball {url} → {dest} ({size} bytes)", url=url, path=dest, bytes=size)
+        return dest
 
     except Exception as e:
-        log(f"Download failed for {url}: {e}")
-        return False
+        log.warning(f"Download failed for {url}: {e}", url=url)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+    finally:
+        record_upstream(url, status, time.perf_counter() - started)
 
 
 # --------------------
@@ -64,109 +142,366 @@ def run_nodemedic_docker(package_dir):
     output_file = os.path.join(package_dir, "nodemedic.json")
 
     cmd = [
-        "docker", "run", "--rm",
+        *DOCKER, "run", "--rm",
+        "--memory", ANALYSIS_MEMORY,
         "-v", f"{package_dir}:/analysis",
         DOCKER_IMAGE,
         "--package-dir", "/analysis",
         "--output", "/analysis/nodemedic.json"
     ]
 
-    log(f"Running NodeMedic: {' '.join(cmd)}")
+    log.info(f"Running NodeMedic: {' '.join(cmd)}")
 
     try:
         result = subprocess.run(
             cmd,
             capture_output=True,
             text=True,
-            timeout=300
+            timeout=ANALYSIS_TIMEOUT
         )
     except Exception as e:
-        log(f"[FATAL] Docker run crashed: {e}")
+        log.error(f"Docker run crashed: {e}")
         return {"error": f"Docker crash: {str(e)}"}
 
-    log(f"NodeMedic stdout:\n{result.stdout}")
-    log(f"NodeMedic stderr:\n{result.stderr}")
+    return collect_result(result, package_dir, output_file)
+
+
+def collect_result(result, package_dir, output_file):
+    log.info(f"NodeMedic stdout:\n{result.stdout}", package_dir=package_dir)
+    log.info(f"NodeMedic stderr:\n{result.stderr}", package_dir=package_dir)
 
     if result.returncode != 0:
-        log(f"NodeMedic failed with exit code {result.returncode}")
+        log.warning(f"NodeMedic failed with exit code {result.returncode}",
+                    package_dir=package_dir, returncode=result.returncode)
         return {"error": f"NodeMedic failed: {result.stderr}"}
 
     # read the output file
     if os.path.exists(output_file):
-        log(f"NodeMedic output found for package: {package_dir}")
+        log.info(f"NodeMedic output found for package: {package_dir}")
         try:
             with open(output_file) as f:
                 return json.load(f)
         except Exception as e:
             return {"error": f"Failed reading NodeMedic output: {e}"}
 
-    log("NodeMedic output missing!")
+    log.warning("NodeMedic output missing!", package_dir=package_dir)
     return {"error": "NodeMedic output missing"}
 
 
 # --------------------
-# MAIN PIPELINE
+# WARM CONTAINER POOL (batch mode)
 # --------------------
-def main():
-    log("=== NodeMedic Batch Run Started ===")
-
-    with open(DEPENDENCY_AUDIT) as f:
-        audit = json.load(f)
-
-    metadata = audit["metadata"]
-    results = {}
-
-    log(f"Processing {len(metadata)} packages")
+class WarmContainerPool:
+    """
+    A few long-lived analyzer containers sharing one mounted work dir.
+    Each analysis is a `docker exec` of the image's entrypoint inside an
+    idle container, wrapped in `timeout` so a hanging package is killed
+    without stopping the rest of the batch. A container whose exec cannot
+    be stopped is replaced; if that fails the pool shrinks, and once it is
+    empty analyses fall back to a fresh `docker run` each.
+    """
+
+    def __init__(self, size, batch_dir=BATCH_DIR, image=DOCKER_IMAGE):
+        self.batch_dir = os.path.abspath(batch_dir)
+        self.image = image
+        os.makedirs(self.batch_dir, exist_ok=True)
+        self.entrypoint = self._entrypoint()
+        self.idle = queue.Queue()
+        self.containers = []
+
+        started = time.monotonic()
+        for _ in range(size):
+            self.idle.put(self._start())
+        self.startup_seconds = time.monotonic() - started
+        observe("phase_seconds", self.startup_seconds, phase="pool_start")
+        log.info(f"Started {size} warm NodeMedic containers in {self.startup_seconds:.1f}s",
+                 containers=size, seconds=round(self.startup_seconds, 3))
+
+    def _entrypoint(self):
+        out = subprocess.run(
+            [*DOCKER, "image", "inspect", "--format", "{{json .Config.Entrypoint}}", self.image],
+            capture_output=True, text=True, check=True,
+        )
+        entrypoint = json.loads(out.stdout.strip() or "null")
+        if not entrypoint:
+            raise RuntimeError(f"{self.image} has no entrypoint to exec")
+        return entrypoint
+
+    def _start(self):
+        out = subprocess.run(
+            [
+                *DOCKER, "run", "-d", "--rm",
+                "--memory", ANALYSIS_MEMORY,
+                "-v", f"{self.batch_dir}:/batch",
+                "--entrypoint", "sleep",
+                self.image, "infinity",
+            ],
+            capture_output=True, text=True, check=True,
+        )
+        container = out.stdout.strip()
+        self.containers.append(container)
+        return container
+
+    def _replace(self, container):
+        """Remove a stuck container and start another; None if that fails."""
+        subprocess.run([*DOCKER, "rm", "-f", container], capture_output=True)
+        self.containers.remove(container)
+        try:
+            return self._start()
+        except (subprocess.CalledProcessError, OSError) as e:
+            detail = e.stderr.strip() if isinstance(e, subprocess.CalledProcessError) and e.stderr else e
+            log.error(f"Could not replace container {container[:12]} ({detail}); "
+                      f"pool down to {len(self.containers)}", containers=len(self.containers))
+            if not self.containers:
+                self.idle.put(None)  # wakes every waiting worker: no containers left
+            return None
+
+    def _acquire(self):
+        """An idle container, or None once the pool is empty."""
+        container = self.idle.get()
+        if container is None:
+            self.idle.put(None)  # for the next worker
+        return container
+
+    def run(self, package_dir):
+        """Analyze a package extracted somewhere under batch_dir."""
+        rel = os.path.relpath(package_dir, self.batch_dir)
+        inner_dir = f"/batch/{rel}"
+        output_file = os.path.join(package_dir, "nodemedic.json")
+        cmd = [
+            "timeout", "-s", "KILL", str(ANALYSIS_TIMEOUT),
+            *self.entrypoint,
+            "--package-dir", inner_dir,
+            "--output", f"{inner_dir}/nodemedic.json",
+        ]
+
+        container = self._acquire()
+        if container is None:
+            return run_nodemedic_docker(package_dir)
+        try:
+            log.info(f"Running NodeMedic in {container[:12]}: {' '.join(cmd)}")
+            try:
+                result = subprocess.run(
+                    [*DOCKER, "exec", container, *cmd],
+                    capture_output=True, text=True,
+                    timeout=ANALYSIS_TIMEOUT + 30,
+                )
+            except subprocess.TimeoutExpired:
+                log.error(f"Container {container[:12]} stuck; replacing it", container=container)
+                container = self._replace(container)
+                return {"error": "timeout"}
+
+            if result.returncode in (124, 137):
+                log.warning(f"NodeMedic timed out after {ANALYSIS_TIMEOUT}s", package_dir=package_dir)
+                return {"error": "timeout"}
+            return collect_result(result, package_dir, output_file)
+        finally:
+            # Only live containers go back; a failed replacement leaves None
+            if container is not None:
+                self.idle.put(container)
+
+    def close(self):
+        if self.containers:
+            subprocess.run([*DOCKER, "rm", "-f", *self.containers], capture_output=True)
+            self.containers = []
 
-    for pkg, meta in tqdm(metadata.items()):
-        log(f"\n--- PACKAGE: {pkg} ---")
 
+# --------------------
+# PER-PACKAGE ANALYSIS
+# --------------------
+def default_workers():
+    """One analysis per core, capped by how many containers fit in RAM."""
+    cores = os.cpu_count() or 1
+    try:
+        mem = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return cores
+    return max(1, min(cores, mem // ANALYSIS_MEMORY_BYTES))
+
+
+def analyze_package(pkg, tarball, integrity=None, shasum=None, containers=None):
+    """
+    Download, extract and analyze one package. With containers (a
+    WarmContainerPool) the analysis runs in a warm container instead of a
+    fresh `docker run`. Returns (result, timings in seconds per phase).
+    """
+    log.info(f"--- PACKAGE: {pkg} ---", package=pkg)
+    timings = {}
+    started = time.monotonic()
+
+    # DOWNLOAD (or reuse the cached tarball)
+    tar_path = download_tarball(tarball, integrity, shasum)
+    timings["download"] = time.monotonic() - started
+    if not tar_path:
+        return {"error": "download_failed"}, timings
+
+    work_root = containers.batch_dir if containers else None
+    with tempfile.TemporaryDirectory(dir=work_root) as tmpdir:
+        # EXTRACT
+        t0 = time.monotonic()
+        try:
+            safe_extract_tar(tar_path, tmpdir)
+            log.info("Extraction successful", package=pkg)
+        except Exception as e:
+            log.warning(f"Extraction error: {e}", package=pkg)
+            return {"error": f"extract_failed: {e}"}, timings
+        finally:
+            timings["extract"] = time.monotonic() - t0
+
+        pkg_dir = os.path.join(tmpdir, "package")
+        if not os.path.isdir(pkg_dir):
+            log.warning("Extracted directory missing: expected /package", package=pkg)
+            return {"error": "no_package_dir"}, timings
+
+        # RUN NODEMEDIC
+        t0 = time.monotonic()
+        result = containers.run(pkg_dir) if containers else run_nodemedic_docker(pkg_dir)
+        timings["analysis"] = time.monotonic() - t0
+        return result, timings
+
+
+def plan_jobs(metadata):
+    """
+    Yield (pkg, version, dist) for every package, or (pkg, None, error)
+    when there is nothing to analyze.
+    """
+    for pkg, meta in metadata.items():
         latest = meta.get("dist-tags", {}).get("latest")
         if not latest:
-            log("No latest version found, skipping")
-            results[pkg] = {"error": "no_latest"}
+            yield pkg, None, {"error": "no_latest"}
             continue
 
         version_info = meta["versions"].get(latest, {})
-        tarball = version_info.get("dist", {}).get("tarball")
-        if not tarball:
-            log("No tarball URL found, skipping")
-            results[pkg] = {"error": "no_tarball"}
+        dist = version_info.get("dist", {})
+        if not dist.get("tarball"):
+            yield pkg, None, {"error": "no_tarball"}
             continue
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tar_path = os.path.join(tmpdir, "pkg.tgz")
+        yield pkg, latest, dist
 
-            # DOWNLOAD
-            if not download_tarball(tarball, tar_path):
-                results[pkg] = {"error": "download_failed"}
-                continue
 
-            # EXTRACT
-            try:
-                safe_extract_tar(tar_path, tmpdir)
-                log("Extraction successful")
-            except Exception as e:
-                log(f"Extraction error: {e}")
-                results[pkg] = {"error": f"extract_failed: {e}"}
-                continue
+def plan_job(row):
+    """(pkg, version, dist) for one slim row of the dependency DB, like plan_jobs."""
+    pkg, latest, tarball, integrity, shasum, error = row
+    if error == FETCH_FAILED:
+        return pkg, None, {"error": error}
+    if not latest:
+        return pkg, None, {"error": "no_latest"}
+    if not tarball:
+        return pkg, None, {"error": "no_tarball"}
+    return pkg, latest, {"tarball": tarball, "integrity": integrity, "shasum": shasum}
 
-            pkg_dir = os.path.join(tmpdir, "package")
-            if not os.path.isdir(pkg_dir):
-                log("Extracted directory missing: expected /package")
-                results[pkg] = {"error": "no_package_dir"}
-                continue
 
-            # RUN NODEMEDIC
-            results[pkg] = run_nodemedic_docker(pkg_dir)
+def plan_jobs_from_db(db):
+    """Same as plan_jobs, but from the slim columns of the dependency DB."""
+    for row in db.iter_packages():
+        yield plan_job(row)
+
+
+def load_jobs():
+    if os.path.exists(DB_FILE):
+        with DependencyDB(DB_FILE) as db:
+            return list(plan_jobs_from_db(db))
+
+    with open(DEPENDENCY_AUDIT) as f:
+        audit = json.load(f)
+    return list(plan_jobs(audit["metadata"]))
+
+
+def record_analysis(store, timings_f, key, result, timings, mode):
+    """Persist one finished analysis and its phase timings."""
+    store.append(key, result)
+    inc("analyses_total", result="ok" if "error" not in result else result["error"].split(":")[0])
+    for name, secs in timings.items():
+        observe("phase_seconds", secs, phase=name)
+    timings_f.write(json.dumps({
+        "package": key,
+        "mode": mode,
+        "ok": "error" not in result,
+        **{f"{name}_s": round(secs, 3) for name, secs in timings.items()},
+    }) + "\n")
+    timings_f.flush()
+
+
+# --------------------
+# MAIN PIPELINE
+# --------------------
+def main(workers=None, batch=False, containers=None):
+    log.info("=== NodeMedic Batch Run Started ===")
+
+    jobs = load_jobs()
+    workers = workers or default_workers()
+    store = AuditStore(STORE_DIR)
+    current = {}  # pkg -> store key of the version analyzed this run
+    # Transient download failures are retried; real analysis results are kept.
+    # Packages with nothing to analyze are only re-recorded when that changes.
+    retry, skipped = set(), {}
+    for key, result in store.items():
+        error = result.get("error")
+        if error == "download_failed":
+            retry.add(key)
+        elif error in ("no_latest", "no_tarball", FETCH_FAILED):
+            skipped[key] = result
+
+    mode = "warm" if batch else "cold"
+    log.info(f"Processing {len(jobs)} packages with {workers} workers ({mode} containers)",
+             jobs=len(jobs), workers=workers, mode=mode)
+    warm = WarmContainerPool(containers or workers) if batch else None
+    timings_f = open(TIMINGS_FILE, "a")
+    if warm:
+        timings_f.write(json.dumps({"event": "pool_start", "containers": len(warm.containers),
+                                    "seconds": warm.startup_seconds}) + "\n")
+
+    try:
+        with store, ThreadPoolExecutor(workers) as pool:
+            futures = {}
+            for pkg, version, dist in jobs:
+                if version is None:
+                    log.info(f"{pkg}: {dist['error']}, skipping", package=pkg)
+                    current[pkg] = pkg
+                    if skipped.get(pkg) != dist:
+                        store.append(pkg, dist)
+                    continue
+
+                # Versions analyzed by an earlier run are not analyzed again
+                key = f"{pkg}@{version}"
+                current[pkg] = key
+                if key in store and key not in retry:
+                    continue
+                fut = pool.submit(
+                    analyze_package, pkg, dist["tarball"],
+                    dist.get("integrity"), dist.get("shasum"), warm,
+                )
+                futures[fut] = key
+
+            # Results are persisted one by one as analyses finish
+            for fut in tqdm(as_completed(futures), total=len(futures)):
+                try:
+                    result, timings = fut.result()
+                except Exception as e:
+                    result, timings = {"error": f"analysis_crashed: {e}"}, {}
+                record_analysis(store, timings_f, futures[fut], result, timings, mode)
+    finally:
+        timings_f.close()
+        if warm:
+            warm.close()
 
     # WRITE FINAL OUTPUT
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(results, f, indent=2)
+    wanted = {key: pkg for pkg, key in current.items()}
+    with phase("write"), open(OUTPUT_FILE, "w") as f:
+        write_json_object(f, ((wanted[key], result) for key, result in store.items() if key in wanted))
 
-    log("=== NodeMedic Batch Run Complete ===")
-    log(f"Results saved → {OUTPUT_FILE}")
+    log.info("=== NodeMedic Batch Run Complete ===")
+    log.info(f"Results saved → {OUTPUT_FILE}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run NodeMedic-FINE over dependency_audit.json.")
+    parser.add_argument("--workers", type=int, help="parallel analyses (default: cores/memory)")
+    parser.add_argument("--batch", action="store_true", help="reuse long-lived analyzer containers")
+    parser.add_argument("--containers", type=int, help="warm containers in batch mode (default: workers)")
+    args = parser.parse_args()
+    try:
+        main(args.workers, args.batch, args.containers)
+    finally:
+        write_summary("nodemedic")
@@ -0,0 +1,28 @@
+import hashlib
+
+# Registry-wide stages can be split into K shards by a stable hash of the
+# package name, so every worker (process or machine) that is given the same
+# name list agrees on which names are its own, whatever K and wherever it runs.
+
+
+def shard_of(name, count):
+    """Shard (0..count-1) a package name belongs to; the same on every machine."""
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def parse_shard(spec):
+    """Parse "I/K" (0-based shard I of K) into (I, K)."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like I/K, got {spec!r}") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in 0..{count - 1}, got {spec!r}")
+    return index, count
+
+
+def shard_suffix(index, count):
+    """Suffix for a shard's output paths, e.g. ".shard-03-of-16"."""
+    width = len(str(count))
+    return f".shard-{index:0{width}d}-of-{count:0{width}d}"
@@ -1,60 +1,42 @@
-import json
+import argparse
+import os
 import requests
 from tqdm import tqdm
 
-NPM_INFO_URL = "https://registry.npmjs.org"
+from audit_store import AuditStore, FETCH_FAILED, write_json_object
+from http_cache import cached_get_json
+from metrics import phase, write_summary
+from incremental import changes_since, current_seq, load_state, save_state, refresh_records, write_diff_report
+from packument_stream import extract_audit_document
+from typosquat_index import TyposquatIndex, INDEX_DIR
+from typosquat_rules import is_typo_squat
+
+NPM_INFO_URL = os.environ.get("NPM_REGISTRY_URL", "https://registry.npmjs.org")
 
 ALL_PACKAGES_FILE = "all_package_names.txt"  # local cached list
 OUTPUT_FILE = "typosquat_audit.json"
+STORE_DIR = "typosquat_audit.store"  # append-only results + resume checkpoint
+STATE_FILE = "typosquat_audit.state.json"  # registry sequence the store is current to
+DIFF_FILE = "typosquat_audit.diff.json"    # what the last --incremental run changed
 
-
-# -----------------------------
-# Typosquat detection rules
-# -----------------------------
-from rapidfuzz.distance import Levenshtein
-
-def is_typo_squat(original: str, candidate: str) -> bool:
-    if candidate == original:
-        return False
-
-    o = original.lower()
-    c = candidate.lower()
-
-    banned_prefixes = ("@types/", "@nestjs/", "@nx/", "@vitejs/", "@angular/")
-
-    if c.startswith(banned_prefixes) or o.startswith(banned_prefixes):
-        return False
-
-    if "-" in c or "/" in c:
-        return False
-
-    if abs(len(o) - len(c)) > 1:
-        return False
-
-    dist = Levenshtein.distance(o, c)
-    if dist not in (1, 2):
-        return False
-
-    set_o = set(o)
-    set_c = set(c)
-    overlap = len(set_o & set_c) / max(len(set_o), 1)
-    if overlap < 0.7:
-        return False
-
-    return True
+# Original target packages to check for typosquats (the sweep and the
+# pipeline can read the top-downloads sheet instead)
+TARGET_PACKAGES = ["express", "react", "lodash"]
 
 
 # -----------------------------
 # Audit functions
 # -----------------------------
-def fetch_package_info(name):
-    try:
-        res = requests.get(f"{NPM_INFO_URL}/{name}", timeout=10)
-        if res.status_code != 200:
-            return None
-        return res.json()
-    except requests.RequestException:
-        return None
+def fetch_package_info(name, revalidate=False):
+    with phase("fetch"):
+        try:
+            return cached_get_json(
+                f"{NPM_INFO_URL}/{name}", timeout=10,
+                parse=extract_audit_document, revalidate=revalidate,
+            )
+        except (requests.RequestException, ValueError) as e:
+            print(f"[WARN] Could not fetch {name}: {e}")
+            return FETCH_FAILED
 
 
 def extract_audit_features(name, data):
@@ -72,14 +54,16 @@ def extract_audit_features(name, data):
         "latest_version": latest,
         "created": time_info.get("created"),
         "modified": time_info.get("modified"),
+        "rev": data.get("_rev"),
         "num_versions": len(versions),
         "num_maintainers": len(maintainers),
         "maintainers": [m.get("name") for m in maintainers],
         "description": latest_meta.get("description"),
         "keywords": latest_meta.get("keywords"),
-        "has_readme": "readme" in data,
-        "readme_length": len(data.get("readme", "")),
+        "has_readme": "readme" in data or "_readme_length" in data,
+        "readme_length": data.get("_readme_length", len(data.get("readme", ""))),
         "dependencies_count": len(latest_meta.get("dependencies", {}) or {}),
+        "dependencies": sorted(latest_meta.get("dependencies", {}) or {}),
         "dist_size": latest_meta.get("dist", {}).get("unpackedSize", None),
         "repository": latest_meta.get("repository", {}),
     }
@@ -88,40 +72,92 @@ def extract_audit_features(name, data):
 # -----------------------------
 # Main auditing logic
 # -----------------------------
-def audit_typosquats(target_packages_file=ALL_PACKAGES_FILE):
-    # Load all NPM package names locally
-    with open(target_packages_file) as f:
-        all_packages = [line.strip() for line in f]
+def scan_target(index, target):
+    """Registry names in index that look like typosquats of target."""
+    with phase("scan"):
+        return [c for c in index.candidates(target) if is_typo_squat(target, c)]
 
-    # Load your original target packages to check for typosquats
-    # For demo purposes, let's assume you have a list
-    target_packages = ["express", "react", "lodash"]  # replace with your Excel loader if needed
+
+def audit_typosquats(target_packages_file=ALL_PACKAGES_FILE, index_dir=INDEX_DIR, incremental=False):
+    # Candidate index over all NPM package names (built on first run)
+    with phase("index"):
+        index = TyposquatIndex.open_or_build(index_dir, target_packages_file)
 
     # Generate candidate typosquats from the full registry
     typosquat_candidates = {}
-    for pkg in tqdm(target_packages, desc="Scanning for typosquats"):
-        matches = [c for c in all_packages if is_typo_squat(pkg, c)]
+    for pkg in tqdm(TARGET_PACKAGES, desc="Scanning for typosquats"):
+        matches = scan_target(index, pkg)
         if matches:
             typosquat_candidates[pkg] = matches
 
     print(f"[INFO] Found {sum(len(v) for v in typosquat_candidates.values())} potential typosquats.")
+    audit_candidates(typosquat_candidates, incremental=incremental)
+
 
-    # Audit all found typosquats
-    audit_results = {}
+def audit_candidates(typosquat_candidates, incremental=False):
+    """
+    Fetch and audit every package in a {target: [candidates]} mapping.
+    With incremental, stored candidates that changed since the last run are
+    refetched too, and new or changed candidates are written to DIFF_FILE.
+    """
     all_candidates = set()
     for matches in typosquat_candidates.values():
         all_candidates.update(matches)
 
-    print(f"[INFO] Auditing {len(all_candidates)} potential typosquat packages...")
-    for pkg in tqdm(sorted(all_candidates), desc="Auditing packages"):
-        metadata = fetch_package_info(pkg)
-        audit_results[pkg] = extract_audit_features(pkg, metadata)
-
-    # Save results
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(audit_results, f, indent=2)
+    store = AuditStore(STORE_DIR)
+    done = all_candidates & store.completed()
+    remaining = sorted(all_candidates - done)
+
+    with store:
+        if incremental:
+            since = load_state(STATE_FILE).get("last_seq")
+            changes = changes_since(since)
+            if changes is None:
+                print("[INFO] No changes log back to the last audit; revalidating every stored candidate...")
+                refresh, until, mode = done, current_seq(), "revalidated"
+            else:
+                changed, deleted, until = changes
+                refresh, mode = done & (changed | deleted), "changes"
+
+            # New candidates go through the same pass so they are reported too
+            names = sorted(refresh) + remaining
+            print(f"[INFO] Re-auditing {len(refresh)} changed and {len(remaining)} new candidates...")
+            previous = store.get_many(refresh)
+            diffs, failed = refresh_records(store, ((n, previous.get(n)) for n in names),
+                                    fetch_package_info, extract_audit_features, total=len(names))
+            write_diff_report(DIFF_FILE, since, until, mode, diffs)
+            # Failed candidates are only retried if the next run looks back this far again
+            save_state(STATE_FILE, since if failed else until)
+        else:
+            if not len(store):
+                save_state(STATE_FILE, current_seq())
+            print(f"[INFO] Auditing {len(remaining)} potential typosquat packages "
+                  f"({len(done)} already done)...")
+            failed = 0
+            for pkg in tqdm(remaining, desc="Auditing packages"):
+                metadata = fetch_package_info(pkg)
+                if metadata is FETCH_FAILED:
+                    failed += 1
+                    continue
+                with phase("extract"):
+                    record = extract_audit_features(pkg, metadata)
+                with phase("store"):
+                    store.append(pkg, record)
+            if failed:
+                print(f"[WARN] {failed} packages could not be fetched; rerun to retry them")
+
+    # Save results (only this run's candidates, in case the store is shared)
+    with phase("write"), open(OUTPUT_FILE, "w") as f:
+        write_json_object(f, ((k, v) for k, v in store.items() if k in all_candidates))
     print(f"[INFO] Audit complete → saved to {OUTPUT_FILE}")
 
 
 if __name__ == "__main__":
-    audit_typosquats()
+    parser = argparse.ArgumentParser(description="Find and audit typosquat candidates of the target packages.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="refetch only candidates changed since the last run and write a diff report")
+    args = parser.parse_args()
+    try:
+        audit_typosquats(incremental=args.incremental)
+    finally:
+        write_summary("typosquat_audit")
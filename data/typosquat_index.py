@@ -0,0 +1,296 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from name_table import open_name_table
+from typosquat_rules import is_indexable
+
+ALL_PACKAGES_FILE = "all_package_names.txt"
+INDEX_DIR = "typosquat_index"
+
+# Each index entry packs a 40-bit hash of a deletion variant with a 24-bit
+# name id into one uint64, so a segment is a single sorted array of ints.
+HASH_BITS = 40
+ID_BITS = 24
+ID_MASK = (1 << ID_BITS) - 1
+SEGMENT_LIMIT = 1 << ID_BITS
+SORT_BUCKETS = 256
+
+
+# -----------------------------
+# Candidate generation
+# -----------------------------
+# is_typo_squat only accepts candidates without "-" or "/" that are within
+# Levenshtein distance 2 and length difference 1 of the target, so only those
+# names are indexed. dist(o, c) <= 2 means some t has dist(o, t) <= 1 and
+# dist(t, c) <= 1, and any two strings within distance 1 share a variant with
+# at most one character deleted. Indexing the 1-deletion variants of every
+# name and probing with the 1-deletion variants of every 1-edit neighbour of
+# the target therefore finds every match without scanning the registry.
+
+def deletes1(s):
+    return {s} | {s[:i] + s[i + 1:] for i in range(len(s))}
+
+
+def neighbours1(s, alphabet):
+    out = deletes1(s)
+    for i in range(len(s) + 1):
+        for ch in alphabet:
+            out.add(s[:i] + ch + s[i:])
+            if i < len(s):
+                out.add(s[:i] + ch + s[i + 1:])
+    return out
+
+
+def variant_hash(s):
+    digest = hashlib.blake2b(s.encode("utf-8"), digest_size=HASH_BITS // 8).digest()
+    return int.from_bytes(digest, "big")
+
+
+# -----------------------------
+# Segment files
+# -----------------------------
+def _map_array(path, typecode="Q"):
+    """Memory-map a file of native uint64s; returns (mmap or None, view)."""
+    if os.path.getsize(path) == 0:
+        return None, array(typecode)
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm, memoryview(mm).cast(typecode)
+
+
+class _Segment:
+    """One immutable, memory-mapped slice of the index."""
+
+    def __init__(self, prefix):
+        self._keys_mm, self.keys = _map_array(f"{prefix}.keys")
+        self._offsets_mm, self.offsets = _map_array(f"{prefix}.offsets")
+        self._names_mm, self.names = _map_array(f"{prefix}.names", "B")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lookup(self, h):
+        lo = bisect_left(self.keys, h << ID_BITS)
+        hi = bisect_left(self.keys, (h + 1) << ID_BITS, lo)
+        return [k & ID_MASK for k in self.keys[lo:hi]]
+
+    def name(self, i):
+        return bytes(self.names[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def iter_names(self):
+        for i in range(len(self)):
+            yield self.name(i)
+
+    def close(self):
+        for attr in ("keys", "offsets", "names"):
+            view = getattr(self, attr)
+            if isinstance(view, memoryview):
+                view.release()
+        for mm in (self._keys_mm, self._offsets_mm, self._names_mm):
+            if mm is not None:
+                mm.close()
+
+
+def _write_segment(prefix, names):
+    """Write names (already filtered) as a segment; returns the alphabet seen."""
+    alphabet = set()
+    buckets = [array("Q") for _ in range(SORT_BUCKETS)]
+    offsets = array("Q", [0])
+
+    with open(f"{prefix}.names", "wb") as f:
+        for local_id, name in enumerate(names):
+            raw = name.encode("utf-8")
+            f.write(raw)
+            offsets.append(offsets[-1] + len(raw))
+
+            lowered = name.lower()
+            alphabet.update(lowered)
+            for variant in deletes1(lowered):
+                h = variant_hash(variant)
+                buckets[h >> (HASH_BITS - 8)].append((h << ID_BITS) | local_id)
+
+    with open(f"{prefix}.offsets", "wb") as f:
+        offsets.tofile(f)
+
+    # Buckets partition the hash space in order, so sorting each one and
+    # concatenating yields a fully sorted key array.
+    with open(f"{prefix}.keys", "wb") as f:
+        for bucket in buckets:
+            array("Q", sorted(bucket)).tofile(f)
+
+    return alphabet
+
+
+# -----------------------------
+# Index
+# -----------------------------
+class TyposquatIndex:
+    """
+    On-disk typosquat candidate index: a list of memory-mapped segments plus
+    meta.json. New names are appended as extra segments and removals are
+    recorded as tombstones, so updates never rewrite the base segment.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = Path(index_dir)
+        with open(self.index_dir / "meta.json") as f:
+            self.meta = json.load(f)
+        self.alphabet = sorted(self.meta["alphabet"])
+        # name -> number of segments that existed when it was removed
+        self.removed = self.meta["removed"]
+        self.segments = [_Segment(self.index_dir / seg) for seg in self.meta["segments"]]
+
+    @staticmethod
+    def exists(index_dir=INDEX_DIR):
+        return (Path(index_dir) / "meta.json").exists()
+
+    @classmethod
+    def build(cls, names_file=ALL_PACKAGES_FILE, index_dir=INDEX_DIR):
+        """Build a fresh index from a one-name-per-line file (via its name table)."""
+        from tqdm import tqdm  # only needed to build; the backend just opens the index
+
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        for stale in index_dir.glob("seg-*"):
+            stale.unlink()
+
+        meta = {"segments": [], "alphabet": "", "removed": {}}
+        with open_name_table(names_file) as names:
+            _append_segments(index_dir, meta, tqdm(names, total=len(names), desc="Indexing names", unit=" names"))
+        _save_meta(index_dir, meta)
+        return cls(index_dir)
+
+    @classmethod
+    def open_or_build(cls, index_dir=INDEX_DIR, names_file=ALL_PACKAGES_FILE):
+        if cls.exists(index_dir):
+            return cls(index_dir)
+        print(f"[INFO] Building typosquat index from {names_file}...")
+        return cls.build(names_file, index_dir)
+
+    def add_names(self, names):
+        """Index newly published names as a new segment."""
+        _append_segments(self.index_dir, self.meta, names)
+        self._reload()
+
+    def remove_names(self, names):
+        """Hide names (e.g. unpublished packages) from future lookups."""
+        for name in names:
+            self.removed[name] = len(self.segments)
+        _save_meta(self.index_dir, self.meta)
+
+    def compact(self):
+        """Fold all segments and tombstones back into a single base segment."""
+        live = list(self.iter_names())
+        self.close()
+        tmp_dir = self.index_dir.with_name(self.index_dir.name + ".compact")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        meta = {"segments": [], "alphabet": "", "removed": {}}
+        _append_segments(tmp_dir, meta, live)
+        _save_meta(tmp_dir, meta)
+        for old in self.index_dir.iterdir():
+            old.unlink()
+        for new in tmp_dir.iterdir():
+            os.replace(new, self.index_dir / new.name)
+        tmp_dir.rmdir()
+        self._reload()
+
+    def candidates(self, target):
+        """
+        Return every indexed name within edit distance 2 and length
+        difference 1 of target (case-insensitive), in the order the names
+        were added. Callers apply is_typo_squat on top.
+        """
+        o = target.lower()
+        probes = set()
+        for t in neighbours1(o, self.alphabet):
+            probes.update(deletes1(t))
+        hashes = {variant_hash(p) for p in probes}
+
+        results = []
+        for seg_no, seg in enumerate(self.segments):
+            ids = set()
+            for h in hashes:
+                ids.update(seg.lookup(h))
+            for i in sorted(ids):
+                name = seg.name(i)
+                if abs(len(name.lower()) - len(o)) > 1 or self._is_removed(name, seg_no):
+                    continue
+                results.append(name)
+        return results
+
+    def iter_names(self):
+        for seg_no, seg in enumerate(self.segments):
+            for name in seg.iter_names():
+                if not self._is_removed(name, seg_no):
+                    yield name
+
+    def close(self):
+        for seg in self.segments:
+            seg.close()
+        self.segments = []
+
+    def _is_removed(self, name, seg_no):
+        return name in self.removed and seg_no < self.removed[name]
+
+    def _reload(self):
+        self.close()
+        self.__init__(self.index_dir)
+
+
+def _append_segments(index_dir, meta, names):
+    alphabet = set(meta["alphabet"])
+    batch = []
+
+    def flush():
+        prefix = f"seg-{len(meta['segments']):04d}"
+        alphabet.update(_write_segment(index_dir / prefix, batch))
+        meta["segments"].append(prefix)
+        batch.clear()
+
+    for name in names:
+        if not is_indexable(name):
+            continue
+        batch.append(name)
+        if len(batch) == SEGMENT_LIMIT:
+            flush()
+    if batch:
+        flush()
+    meta["alphabet"] = "".join(sorted(alphabet))
+    _save_meta(index_dir, meta)
+
+
+def _save_meta(index_dir, meta):
+    tmp = index_dir / "meta.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, index_dir / "meta.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the typosquat candidate index.")
+    parser.add_argument("--names", default=ALL_PACKAGES_FILE, help="one package name per line")
+    parser.add_argument("--index", default=INDEX_DIR)
+    parser.add_argument("--add", help="file of newly published names to append")
+    parser.add_argument("--compact", action="store_true")
+    args = parser.parse_args()
+
+    if args.add:
+        index = TyposquatIndex(args.index)
+        with open(args.add) as f:
+            index.add_names(line.strip() for line in f)
+    else:
+        index = TyposquatIndex.build(args.names, args.index)
+
+    if args.compact:
+        index.compact()
+    print(f"[INFO] Index at {args.index}: {len(index.segments)} segment(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from rapidfuzz.distance import Levenshtein
+
+# What counts as a typosquat. typosquat_audit.py, typosquat_sweep.py and the
+# backend's /api/typosquats all apply this one predicate, so a name flagged
+# in the UI is one the audit would flag too. Depends on rapidfuzz only: the
+# backend imports it.
+
+BANNED_PREFIXES = ("@types/", "@nestjs/", "@nx/", "@vitejs/", "@angular/")
+
+
+def is_indexable(name):
+    """Whether is_typo_squat could ever accept name as a candidate (no "-" or "/")."""
+    c = name.lower()
+    return bool(c) and "-" not in c and "/" not in c
+
+
+def is_typo_squat(original: str, candidate: str) -> bool:
+    if candidate == original:
+        return False
+
+    o = original.lower()
+    c = candidate.lower()
+
+    if c.startswith(BANNED_PREFIXES) or o.startswith(BANNED_PREFIXES):
+        return False
+
+    if "-" in c or "/" in c:
+        return False
+
+    if abs(len(o) - len(c)) > 1:
+        return False
+
+    dist = Levenshtein.distance(o, c)
+    if dist not in (1, 2):
+        return False
+
+    set_o = set(o)
+    set_c = set(c)
+    overlap = len(set_o & set_c) / max(len(set_o), 1)
+    if overlap < 0.7:
+        return False
+
+    return True
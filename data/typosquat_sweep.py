@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import json
+import os
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+import numpy as np
+from openpyxl import load_workbook
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
+from tqdm import tqdm
+
+from metrics import phase, write_summary
+from name_table import NameTable, open_name_table
+from typosquat_audit import audit_candidates
+from typosquat_rules import BANNED_PREFIXES, is_indexable, is_typo_squat
+
+TOP_DOWNLOADS_FILE = "NPM Most Weekly Downloads of 2024.xlsx"
+ALL_PACKAGES_FILE = "all_package_names.txt"
+PROGRESS_FILE = "typosquat_sweep.jsonl"
+OUTPUT_FILE = "typosquat_candidates.json"
+
+CHUNK_SIZE = 20000  # registry names per cdist call (targets x chunk uint8 matrix)
+
+
+# -----------------------------
+# Inputs
+# -----------------------------
+def load_top_packages(path=TOP_DOWNLOADS_FILE, limit=None):
+    """Stream the distinct package names from the first column of the downloads sheet."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(min_row=2, max_col=1, values_only=True)
+        names = {}  # ordered set: a name listed twice is swept once
+        for (name,) in rows:
+            if name and str(name).strip():
+                names[str(name).strip()] = None
+            if limit and len(names) >= limit:
+                break
+        return list(names)
+    finally:
+        wb.close()
+
+
+def load_length_buckets(table):
+    """
+    Group the positions of the registry names is_typo_squat could accept
+    by lowercased length. Positions index the name table, so matches are
+    reported in table order, the same order typosquat_audit uses.
+    """
+    buckets = defaultdict(lambda: array("I"))
+    for pos, name in enumerate(table):
+        if is_indexable(name):
+            buckets[len(name.lower())].append(pos)
+    return buckets
+
+
+def plan_tasks(targets, buckets, table_path, table_fingerprint, chunk_size=CHUNK_SIZE):
+    """
+    Yield (task_id, targets, table_path, positions) work units. A registry
+    chunk of length L is only compared with targets of length L-1..L+1.
+    """
+    by_length = defaultdict(list)
+    for t in dict.fromkeys(targets):
+        if not t.lower().startswith(BANNED_PREFIXES):
+            by_length[len(t.lower())].append(t)
+
+    for length in sorted(buckets):
+        group = by_length[length - 1] + by_length[length] + by_length[length + 1]
+        if not group:
+            continue
+        # Task ids change with the target set and the name table, so a
+        # progress file left by a sweep over different targets, or over a
+        # table whose positions mean other names, is never mistaken for this one.
+        digest = hashlib.sha1("\n".join(group).encode("utf-8")).hexdigest()[:10]
+        positions = buckets[length]
+        for start in range(0, len(positions), chunk_size):
+            task_id = f"{length}:{start}:{table_fingerprint}:{digest}"
+            yield (task_id, group, str(table_path), positions[start:start + chunk_size])
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+_tables = {}  # per worker process: table path -> NameTable (shared mmap)
+
+
+def sweep_chunk(task, threads=1):
+    task_id, targets, table_path, positions = task
+    if table_path not in _tables:
+        _tables[table_path] = NameTable(table_path)
+    table = _tables[table_path]
+    names = [table[i] for i in positions]
+
+    dist = process.cdist(
+        [t.lower() for t in targets],
+        [n.lower() for n in names],
+        scorer=Levenshtein.distance,
+        score_cutoff=2,
+        dtype=np.uint8,
+        workers=threads,
+    )
+    matches = defaultdict(list)
+    for row, col in zip(*np.nonzero(dist <= 2)):
+        target, name = targets[row], names[col]
+        if is_typo_squat(target, name):
+            matches[target].append([positions[col], name])
+    return task_id, dict(matches)
+
+
+# -----------------------------
+# Sweep driver
+# -----------------------------
+def _load_progress(progress_file):
+    """{task id: matches} of the tasks finished so far."""
+    done = {}
+    if not Path(progress_file).exists():
+        return done
+    with open(progress_file, "rb+") as f:
+        complete = 0  # bytes up to the end of the last whole line
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Drop a partial trailing line so the next append starts cleanly
+                f.truncate(complete)
+                break
+            complete += len(line)
+            try:
+                rec = json.loads(line)
+                done[rec["task"]] = rec["matches"]
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def sweep(targets, names_file=ALL_PACKAGES_FILE, progress_file=PROGRESS_FILE,
+          processes=None, threads=1, chunk_size=CHUNK_SIZE):
+    """
+    Compare every target against the registry across a process pool.
+    Each finished task is appended to progress_file straight away, so an
+    interrupted sweep resumes from the tasks it has not finished yet.
+    """
+    processes = processes or os.cpu_count() or 1
+    done = _load_progress(progress_file)
+
+    print("[INFO] Loading registry names...")
+    with open_name_table(names_file) as table:
+        buckets = load_length_buckets(table)
+        table_path = table.path
+        fingerprint = table.fingerprint()
+
+    # Only this plan's finished tasks count; records left by other sweeps are ignored
+    tasks, found, resumed = [], defaultdict(list), 0
+    for task in plan_tasks(targets, buckets, table_path, fingerprint, chunk_size):
+        if task[0] not in done:
+            tasks.append(task)
+            continue
+        resumed += 1
+        for target, hits in done[task[0]].items():
+            found[target].extend(hits)
+    print(f"[INFO] {len(tasks)} sweep tasks pending ({resumed} already done).")
+
+    with open(progress_file, "a") as out, ProcessPoolExecutor(processes) as pool:
+        pending = set()
+        remaining = iter(tasks)
+        bar = tqdm(total=len(tasks), desc="Sweeping registry")
+
+        # Keep a bounded number of chunks in flight so the pool does not
+        # pickle the whole registry up front.
+        while True:
+            while len(pending) < processes * 2:
+                task = next(remaining, None)
+                if task is None:
+                    break
+                pending.add(pool.submit(sweep_chunk, task, threads))
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                task_id, matches = fut.result()
+                out.write(json.dumps({"task": task_id, "matches": matches}) + "\n")
+                out.flush()
+                for target, hits in matches.items():
+                    found[target].extend(hits)
+                bar.update(1)
+        bar.close()
+
+    return {
+        target: [name for _, name in sorted(hits)]
+        for target, hits in found.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Typosquat sweep over the top-downloads list.")
+    parser.add_argument("--targets", default=TOP_DOWNLOADS_FILE)
+    parser.add_argument("--names", default=ALL_PACKAGES_FILE)
+    parser.add_argument("--top", type=int, help="only sweep the first N targets")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--threads", type=int, default=1, help="rapidfuzz workers per process")
+    parser.add_argument("--audit", action="store_true", help="fetch and audit the candidates afterwards")
+    args = parser.parse_args()
+
+    with phase("load"):
+        targets = load_top_packages(args.targets, args.top)
+    print(f"[INFO] Loaded {len(targets)} target packages.")
+
+    with phase("sweep"):
+        candidates = sweep(targets, args.names, processes=args.processes, threads=args.threads)
+    with phase("write"), open(OUTPUT_FILE, "w") as f:
+        json.dump(candidates, f, indent=2)
+    print(f"[INFO] Found {sum(len(v) for v in candidates.values())} potential typosquats → {OUTPUT_FILE}")
+
+    if args.audit:
+        audit_candidates(candidates)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        write_summary("typosquat_sweep")
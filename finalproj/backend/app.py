@@ -1,17 +1,54 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Request, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from deps_fetcher import parse_dependency_json
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
+from lockfile import ingest_upload, close_pool
 from npm_client import get_package_metadata
-from osv_client import get_vulnerabilities
-import requests
-from rapidfuzz.distance import Levenshtein
-
+from osv_client import get_vulnerabilities, get_vulnerabilities_batch
+from http_cache import close_client
+from response_cache import cache_stats
+from metrics import metrics, phase, timer, watch_event_loop, RequestTimer
+from name_index import ReloadingNameIndex
+from owner_index import OwnerIndex
+from risk import attach_risk
+from graph_session import GraphSession, SessionStore, PAGE_SIZE, MAX_PAGE
 
 import json
 import asyncio
-import requests
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Literal
+
+VULN_BATCH_SIZE = 200   # pairs per streamed querybatch call
+VULN_BATCH_LINGER = 0.05  # seconds to wait for a batch to fill
+ENRICH_CONCURRENCY = 64   # package names being enriched at once
+DISCONNECT_POLL = 0.5     # seconds between client disconnect checks while streaming
+
+name_index = ReloadingNameIndex()
+owner_index = OwnerIndex()
+sessions = SessionStore()
+background = set()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Start the name index load and the event loop lag probe; on shutdown,
+    or if startup fails partway, stop them and close the upstream client
+    and the ingest pool.
+    """
+    try:
+        name_index.start()
+        background.add(asyncio.create_task(watch_event_loop()))
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        background.clear()
+        await close_client()
+        close_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,23 +57,274 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestTimer)
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss/eviction counters for the in-process upstream caches."""
+    return cache_stats()
+
+
+metrics.gauge("response_cache", lambda: {
+    (("cache", name), ("stat", stat)): value
+    for name, stats in cache_stats().items()
+    for stat, value in stats.items() if value is not None
+})
+metrics.gauge("graph_sessions", lambda: {(): len(sessions)})
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Counters, histograms and gauges in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/api/upload")
 async def upload_json(file: UploadFile = File(...)):
-    """Accepts a dependency JSON file and returns enriched graph data."""
-    content = await file.read()
-    obj = json.loads(content)
-    graph = parse_dependency_json(obj)
+    """
+    Accepts a package-lock.json (v1/v2/v3) or `npm ls --json` file and
+    returns enriched graph data.
+    """
+    graph = await ingest_upload(file)
+
+    await enrich_graph(graph["nodes"])
+    # Risk and encoding are CPU-bound on big graphs; keep them off the loop
+    with phase("risk"):
+        await asyncio.to_thread(attach_risk, graph)
+
+    with phase("encode"):
+        body = await asyncio.to_thread(json.dumps, graph)
+    return Response(body, media_type="application/json")
+
+
+@app.post("/api/upload/stream")
+async def upload_json_stream(request: Request, file: UploadFile = File(...)):
+    """
+    Streaming variant of /api/upload (NDJSON). The first line is the graph
+    structure; each following line is a patch
+    {"type": "patch", "ids": [...], "data": {...}} to merge into those
+    nodes, and the last line is {"type": "done"}, or
+    {"type": "error", "error": ...} if enrichment failed part way (the
+    graph is then only partly enriched). Enrichment stops as soon as the
+    client disconnects.
+    """
+    graph = await ingest_upload(file)
+    with phase("risk"):
+        risk = await asyncio.to_thread(attach_risk, graph)
+    with phase("encode"):
+        head = await asyncio.to_thread(json.dumps, {"type": "graph", **graph})
+
+    async def lines():
+        yield head + "\n"
+
+        patches = asyncio.Queue()
+        task = asyncio.create_task(stream_enrichment(graph["nodes"], patches, risk))
+        task.add_done_callback(_retrieve_exception)
+        # Checked on its own schedule, not per patch: a slow upstream phase
+        # can go a long time without producing one
+        watcher = asyncio.create_task(watch_disconnect(request, task.cancel))
+        try:
+            while (patch := await patches.get()) is not None:
+                yield json.dumps(patch) + "\n"
+            await asyncio.wait([task])
+            if task.cancelled():  # the client went away
+                return
+            error = task.exception()
+            if error is not None:
+                print(f"[ERROR] Enrichment failed: {error!r}")
+                yield json.dumps({"type": "error", "error": str(error) or type(error).__name__}) + "\n"
+                return
+            yield json.dumps({"type": "done"}) + "\n"
+        finally:
+            watcher.cancel()
+            task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def watch_disconnect(request, on_disconnect):
+    """Call on_disconnect once the client of a streaming response has gone."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL)
+    on_disconnect()
+
+
+def _retrieve_exception(task):
+    # Marks a failed task's exception as seen even when nobody awaits it
+    if not task.cancelled():
+        task.exception()
+
+
+# -----------------------------
+# Graph sessions
+# -----------------------------
+Grouping = Literal["scope", "maintainer", "repository"] | None
+
+
+def get_session(session_id):
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return session
+
+
+async def enrich_session(session, ids):
+    """Enrich the session nodes among ids that have not been enriched yet."""
+    pending = [i for i in dict.fromkeys(ids) if i in session.nodes and i not in session.enriched]
+    await enrich_graph([{"data": session.nodes[i]} for i in pending])
+    session.enriched.update(pending)
+
+
+async def index_owners(session, ids):
+    """
+    Fill in maintainers and repository_url of the given session nodes from
+    the ownership index. Returns False when there is no index.
+    """
+    with timer("enrich_lookup_seconds", source="owner_index"):
+        owners = await owner_index.owners(session.nodes[i]["name"] for i in ids)
+    if owners is None:
+        return False
+    for node_id in ids:
+        data = session.nodes[node_id]
+        found = owners.get(data["name"])
+        if found:
+            if node_id not in session.enriched:
+                data["maintainers"] = found["maintainers"]
+            data["repository_url"] = found["repository"]
+    return True
+
 
-    # Enrich nodes concurrently
-    tasks = []
-    for node in graph["nodes"]:
-        name = node["data"]["id"]
-        tasks.append(enrich_node(node, name))
-    await asyncio.gather(*tasks)
+async def session_summary(session, depth, group, limit):
+    if group in ("maintainer", "repository"):
+        # The index answers for every top-level dependency at once; without
+        # it, maintainers come from enrichment and repositories are unknown
+        indexed = await index_owners(session, session.grouping_targets())
+        if not indexed and group == "repository":
+            raise HTTPException(status_code=503, detail=f"Ownership index not available: {owner_index.path}")
+        if not indexed:
+            await enrich_session(session, session.grouping_targets())
+    if group != session.grouping:
+        session.set_grouping(group)
+    shown, edges = session.summary(depth, limit)
+    await enrich_session(session, shown)
+    return {"session": session.id, "stats": session.stats(), **session.render(shown, edges)}
 
-    return graph
+
+@app.post("/api/sessions")
+async def create_session(
+    file: UploadFile = File(...),
+    depth: int = Query(1, ge=0, le=10),
+    group: Grouping = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE),
+):
+    """
+    Upload a dependency file like /api/upload, but keep the graph on the
+    server and return only a folded summary: the root and its dependencies
+    down to depth, at most limit children per node, each node carrying
+    child_count / hidden_children. With group=scope or group=maintainer the
+    top-level dependencies are folded into one node per scope / primary
+    maintainer (group=repository: per source repository, from the
+    ownership index). Only the returned nodes are enriched; the rest are
+    loaded through /api/sessions/{id}/children as the client expands them.
+    """
+    if group == "repository" and not owner_index.status()["available"]:
+        raise HTTPException(status_code=503, detail=f"Ownership index not available: {owner_index.path}")
+    graph = await ingest_upload(file)
+    session = sessions.add(await asyncio.to_thread(GraphSession, graph))
+    return await session_summary(session, depth, group, limit)
+
+
+@app.get("/api/sessions/{session_id}")
+async def get_session_summary(
+    session_id: str,
+    depth: int = Query(1, ge=0, le=10),
+    group: Grouping = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE),
+):
+    """The summary again, e.g. with another depth or grouping."""
+    return await session_summary(get_session(session_id), depth, group, limit)
+
+
+@app.get("/api/sessions/{session_id}/children")
+async def get_session_children(
+    session_id: str,
+    node: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE),
+):
+    """
+    One page of a node's (or group's) children with the edges to them,
+    enriched on first request. hidden is how many children are left after
+    this page.
+    """
+    session = get_session(session_id)
+    if node not in session:
+        raise HTTPException(status_code=404, detail=f"Unknown node: {node}")
+    edges, total = session.page(node, offset, limit)
+    shown = {edge["target"]: 0 for edge in edges}
+    await enrich_session(session, shown)
+    return {
+        "node": node,
+        "offset": offset,
+        "total": total,
+        "hidden": max(total - offset - len(edges), 0),
+        **session.render(shown, edges),
+    }
+
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    return {"deleted": sessions.remove(session_id)}
+
+
+@app.get("/api/sessions/{session_id}/ownership")
+async def get_session_ownership(
+    session_id: str,
+    limit: int = Query(20, ge=1, le=MAX_PAGE),
+):
+    """
+    Ownership concentration of a session's graph from the ownership index:
+    the maintainers and repositories behind the most packages in it (with
+    how many packages each maintainer has across the registry), and the
+    packages nobody but one person maintains.
+    """
+    session = get_session(session_id)
+    names = {data["name"] for data in session.nodes.values()}
+    owners = await owner_index.owners(names)
+    if owners is None:
+        raise HTTPException(status_code=503, detail=f"Ownership index not available: {owner_index.path}")
+
+    by_maintainer, by_repository, single = defaultdict(list), defaultdict(list), []
+    for name, found in sorted(owners.items()):
+        for maintainer in found["maintainers"]:
+            by_maintainer[maintainer].append(name)
+        if found["repository"]:
+            by_repository[found["repository"]].append(name)
+        if len(found["maintainers"]) == 1:
+            single.append(name)
+
+    top = sorted(by_maintainer.items(), key=lambda kv: (-len(kv[1]), kv[0]))[:limit]
+    registry = await owner_index.maintainer_counts([m for m, _ in top])
+    repositories = sorted(
+        ((repo, members) for repo, members in by_repository.items() if len(members) > 1),
+        key=lambda kv: (-len(kv[1]), kv[0]),
+    )[:limit]
+    return {
+        "packages": len(names),
+        "indexed": len(owners),
+        "maintainers": len(by_maintainer),
+        "single_maintainer_packages": len(single),
+        "top_maintainers": [
+            {"maintainer": m, "packages": len(members), "names": members[:PAGE_SIZE],
+             "registry_packages": registry.get(m, {}).get("packages")}
+            for m, members in top
+        ],
+        "shared_repositories": [
+            {"repository": repo, "packages": len(members), "names": members[:PAGE_SIZE]}
+            for repo, members in repositories
+        ],
+    }
 
 
 @app.get("/api/dependencies/{package}")
@@ -48,71 +336,174 @@ async def get_package_graph(package: str):
     repo_url = meta.get("repository", {}).get("url")
 
     node_data = {**meta, **vulns}
-    node = {"data": {"id": package, **node_data}}
+    node = {"data": {"id": package, "name": package, **node_data}}
     return {"nodes": [node], "edges": []}
 
 
-async def enrich_node(node, name):
-    meta = await get_package_metadata(name)
-    vulns = await get_vulnerabilities(name, meta.get("version"))
-    
-    node["data"].update(meta)
-    node["data"].update(vulns)
+async def enrich_graph(nodes):
+    """
+    Enrich every node with registry metadata and OSV vulnerabilities.
+    Each distinct package name is fetched once, however many versions or
+    occurrences it has; vulnerabilities are then looked up for the whole
+    graph at once through OSV's querybatch endpoint, for each node's
+    installed version (the latest one when the upload does not say).
+    """
+    names = list(dict.fromkeys(node["data"]["name"] for node in nodes))
+    metas = {}
+    todo = iter(names)
+
+    async def fetch_meta():
+        for name in todo:  # shared by the workers: each takes the next name
+            with timer("enrich_lookup_seconds", source="registry"):
+                metas[name] = await get_package_metadata(name)
+
+    with phase("metadata"):
+        await asyncio.gather(*(fetch_meta() for _ in range(ENRICH_CONCURRENCY)))
 
-NPM_SEARCH_URL = "https://registry.npmjs.com/-/v1/search"
+    pairs = [vuln_pair(node["data"], metas[node["data"]["name"]]) for node in nodes]
+    with phase("vulnerabilities"), timer("enrich_lookup_seconds", source="osv"):
+        vulns = await get_vulnerabilities_batch(pairs)
 
-def is_typo_squat(original: str, candidate: str) -> bool:
+    for node, pair in zip(nodes, pairs):
+        node["data"].update(metas[node["data"]["name"]])
+        node["data"].update(vulns[pair])
+
+
+def vuln_pair(data, meta):
+    """The (name, version) a node's vulnerabilities are looked up for."""
+    return data["name"], data.get("installed_version") or meta.get("version")
+
+
+async def stream_enrichment(nodes, patches, risk=None):
     """
-    Returns True if candidate is a realistic typosquat of original.
-    Rules:
-    - Length difference must be small (≤ 2)
-    - Levenshtein distance must be small (1–2)
-    - Candidate cannot add meaningful prefixes/suffixes
+    Enrich nodes like enrich_graph, but put a patch on the patches queue as
+    soon as each piece arrives: metadata per package, then vulnerabilities
+    for small querybatch batches that fill while metadata is still coming
+    in. With risk (a RiskGraph), each vulnerability batch is folded in
+    incrementally and the nodes whose transitive risk changed are patched
+    too. None marks the end of the stream.
     """
-    if candidate == original:
-        return False
+    ids_by_name = defaultdict(list)
+    ids_by_version = defaultdict(list)  # (name, installed version) -> node ids
+    for node in nodes:
+        data = node["data"]
+        ids_by_name[data["name"]].append(data["id"])
+        ids_by_version[(data["name"], data.get("installed_version"))].append(data["id"])
+    versions_of = defaultdict(list)
+    for name, version in ids_by_version:
+        versions_of[name].append(version)
+    pairs = asyncio.Queue()  # ((name, version) to look up, node ids)
+    todo = iter(ids_by_name)
 
-    # Normalize
-    o = original.lower()
-    c = candidate.lower()
+    async def fetch_meta():
+        for name in todo:  # shared by the workers: each takes the next name
+            with timer("enrich_lookup_seconds", source="registry"):
+                meta = await get_package_metadata(name)
+            await patches.put({"type": "patch", "ids": ids_by_name[name], "data": meta})
+            for version in versions_of[name]:
+                ids = ids_by_version[(name, version)]
+                await pairs.put((vuln_pair({"name": name, "installed_version": version}, meta), ids))
 
-    # Skip names that append/prepend full words (e.g. express-ws)
-    if "-" in c or "/" in c:
-        return False
+    async def fetch_vulns():
+        remaining = len(ids_by_version)
+        while remaining:
+            batch = [await pairs.get()]
+            try:
+                while len(batch) < VULN_BATCH_SIZE:
+                    batch.append(await asyncio.wait_for(pairs.get(), VULN_BATCH_LINGER))
+            except asyncio.TimeoutError:
+                pass
+            remaining -= len(batch)
 
-    # Hard length cutoff (avoid things like express-ws)
-    if abs(len(o) - len(c)) > 1:
-        return False
+            with timer("enrich_lookup_seconds", source="osv"):
+                vulns = await get_vulnerabilities_batch(pair for pair, _ in batch)
+            changed = set()
+            for pair, ids in batch:
+                result = vulns[pair]
+                await patches.put({"type": "patch", "ids": ids, "data": result})
+                if risk is not None:
+                    for node_id in ids:
+                        changed.update(risk.set_risk(node_id, result["vulnerability_count"]))
+            for node_id in changed:
+                await patches.put({"type": "patch", "ids": [node_id], "data": risk.node_summary(node_id)})
+
+    tasks = [asyncio.create_task(fetch_vulns())]
+    tasks += [asyncio.create_task(fetch_meta()) for _ in range(ENRICH_CONCURRENCY)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # One failed fetch (or a cancelled stream) stops the rest
+        for task in tasks:
+            task.cancel()
+        patches.put_nowait(None)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# -----------------------------
+# Ownership index
+# -----------------------------
+def require_index(result):
+    if result is None:
+        raise HTTPException(status_code=503, detail=f"Ownership index not available: {owner_index.path}")
+    return result
 
-    # Compute edit distance
-    dist = Levenshtein.distance(o, c)
 
-    # Only true typos if 1–2 edits apart
-    return dist in (1, 2)
+@app.get("/api/owners")
+async def ownership_overview(limit: int = Query(20, ge=1, le=MAX_PAGE)):
+    """Registry-wide concentration: who maintains (or solely maintains) the most packages."""
+    return {**owner_index.status(), **require_index(await owner_index.top(limit))}
+
+
+@app.get("/api/owners/{package:path}")
+async def package_owners(package: str, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE)):
+    """
+    Maintainers and source repository of one package, with the packages
+    each maintainer controls and the packages published from the same
+    repository (first limit of each, plus totals).
+    """
+    found = require_index(await owner_index.owners([package])).get(package)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"Not in the ownership index: {package}")
+    maintainers = [await owner_index.maintainer(m, limit) for m in found["maintainers"]]
+    repository = await owner_index.repository(found["repository"], limit) if found["repository"] else {}
+    return {"package": package, "maintainers": maintainers, "repository": repository}
+
+
+@app.get("/api/maintainers/{maintainer}")
+async def maintainer_packages(
+    maintainer: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE),
+):
+    """One page of the packages an npm user maintains, with their totals."""
+    result = require_index(await owner_index.maintainer(maintainer, limit, offset))
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Unknown maintainer: {maintainer}")
+    return result
+
+
+@app.get("/api/repositories")
+async def repository_packages(
+    url: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE),
+):
+    """Packages published from one repository (any URL spelling: git+https, git@, github:...)."""
+    result = require_index(await owner_index.repository(url, limit, offset))
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Unknown repository: {url}")
+    return result
 
 
 @app.get("/api/typosquats/{package}")
 async def typosquats(package: str):
-    params = {"text": package, "size": 100}
+    """Similar registry names from the local name index (no network calls)."""
+    results = await name_index.similar(package)
+    if results is None:
+        return {"package": package, "error": f"Name index not available: {name_index.path}", "similar_names": []}
+    return {"package": package, "similar_names": results}
 
-    try:
-        res = requests.get(NPM_SEARCH_URL, params=params, timeout=10)
-        res.raise_for_status()
-        data = res.json()
-
-        results = []
-        for obj in data.get("objects", []):
-            name = obj.get("package", {}).get("name")
-            if not name or name == package:
-                continue
-
-            if is_typo_squat(package, name):
-                results.append({
-                    "name": name,
-                    "levenshtein": Levenshtein.distance(package, name)
-                })
-
-        return {"package": package, "similar_names": results}
-
-    except requests.RequestException as e:
-        return {"error": str(e), "similar_names": []}
\ No newline at end of file
+
+@app.get("/api/typosquats")
+async def typosquat_index_status():
+    return name_index.status()
@@ -1,14 +1,69 @@
-def parse_dependency_json(obj):
-    """Recursively walk a dependency JSON tree."""
-    nodes = []
-    edges = []
+def node_key(name, version=None):
+    return f"{name}@{version}" if version else name
+
+
+class GraphBuilder:
+    """
+    Accumulates a dependency graph with one node per name@version.
+    Repeated occurrences bump the node's `occurrences` count and widen its
+    `depth` / `max_depth` range; repeated edges bump the edge's `count`.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+
+    def add_node(self, name, version=None, depth=0):
+        key = node_key(name, version)
+        data = self.nodes.get(key)
+        if data is None:
+            data = self.nodes[key] = {
+                "id": key,
+                "name": name,
+                "installed_version": version,
+                "occurrences": 0,
+                "depth": depth,
+                "max_depth": depth,
+            }
+        data["occurrences"] += 1
+        data["depth"] = min(data["depth"], depth)
+        data["max_depth"] = max(data["max_depth"], depth)
+        return key
 
-    def walk(name, deps):
-        nodes.append({"data": {"id": name}})
+    def add_edge(self, source, target):
+        edge = self.edges.get((source, target))
+        if edge is None:
+            edge = self.edges[(source, target)] = {
+                "id": f"{source}->{target}",
+                "source": source,
+                "target": target,
+                "count": 0,
+            }
+        edge["count"] += 1
+
+    def to_graph(self):
+        return {
+            "nodes": [{"data": data} for data in self.nodes.values()],
+            "edges": [{"data": data} for data in self.edges.values()],
+        }
+
+
+def add_tree(builder, parent, deps, depth=1):
+    """Add a nested {name: {"version", "dependencies"}} tree below parent."""
+    # Explicit stack so deep trees cannot hit the recursion limit
+    stack = [(parent, deps, depth)]
+    while stack:
+        parent, deps, depth = stack.pop()
         for dep, meta in (deps or {}).items():
-            edges.append({"data": {"source": name, "target": dep}})
-            walk(dep, meta.get("dependencies", {}))
+            meta = meta or {}
+            child = builder.add_node(dep, meta.get("version"), depth)
+            builder.add_edge(parent, child)
+            stack.append((child, meta.get("dependencies"), depth + 1))
 
-    root_name = obj.get("name", "root")
-    walk(root_name, obj.get("dependencies", {}))
-    return {"nodes": nodes, "edges": edges}
+
+def parse_dependency_json(obj):
+    """Walk a nested dependency JSON tree into a deduplicated graph."""
+    builder = GraphBuilder()
+    root = builder.add_node(obj.get("name", "root"), obj.get("version"))
+    add_tree(builder, root, obj.get("dependencies"))
+    return builder.to_graph()
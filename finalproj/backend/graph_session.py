@@ -0,0 +1,188 @@
+import os
+import secrets
+import time
+from collections import OrderedDict, deque
+
+SESSION_TTL_SECONDS = float(os.environ.get("GRAPH_SESSION_TTL", 1800))
+SESSION_LIMIT = int(os.environ.get("GRAPH_SESSION_LIMIT", 16))
+PAGE_SIZE = 50    # children shown per node before the rest are folded
+MAX_PAGE = 500
+GROUPINGS = ("scope", "maintainer", "repository")
+
+
+def scope_of(data):
+    name = data["name"]
+    return name.split("/", 1)[0] if name.startswith("@") and "/" in name else "(unscoped)"
+
+
+def primary_maintainer(data):
+    """Alphabetically first maintainer (needs enriched data)."""
+    return min(data.get("maintainers") or ["(unknown)"])
+
+
+def repository_of(data):
+    """Normalized source repository (from the ownership index)."""
+    return data.get("repository_url") or "(unknown)"
+
+
+GROUP_KEYS = {"scope": scope_of, "maintainer": primary_maintainer, "repository": repository_of}
+
+
+class GraphSession:
+    """
+    An uploaded graph kept server-side so the client can load it a piece
+    at a time: a folded summary first, then pages of children for the
+    nodes it expands. With a grouping, the roots' children are folded into
+    one group node per npm scope, primary maintainer or source repository,
+    and expanding a group pages through its members. Node data dicts are
+    enriched in place; `enriched` records which ones are done.
+    """
+
+    def __init__(self, graph):
+        self.id = secrets.token_urlsafe(12)
+        self.nodes = {n["data"]["id"]: n["data"] for n in graph["nodes"]}
+        self.children = {node_id: [] for node_id in self.nodes}
+        targets = set()
+        for edge in graph["edges"]:
+            data = edge["data"]
+            if data["source"] in self.nodes and data["target"] in self.nodes:
+                self.children[data["source"]].append(data)
+                targets.add(data["target"])
+        self.edge_count = sum(len(edges) for edges in self.children.values())
+        self.roots = [i for i, d in self.nodes.items() if d.get("depth") == 0] or \
+            [i for i in self.nodes if i not in targets][:1]
+        self.enriched = set()
+        self.set_grouping(None)
+
+    def stats(self):
+        return {
+            "nodes": len(self.nodes),
+            "edges": self.edge_count,
+            "roots": self.roots,
+            "max_depth": max((d.get("max_depth") or 0 for d in self.nodes.values()), default=0),
+            "grouping": self.grouping,
+        }
+
+    # -----------------------------
+    # Grouping
+    # -----------------------------
+    def set_grouping(self, kind):
+        """Fold the roots' children by kind (one of GROUPINGS), or unfold with None."""
+        self.grouping = kind
+        self.group_nodes = {}
+        self.group_edges = {}   # group id → member edges (group → member)
+        self.root_groups = {}   # root id → edges (root → group)
+        if kind is None:
+            return
+
+        key_of = GROUP_KEYS[kind]
+        for root in self.roots:
+            buckets = {}
+            for edge in self.children[root]:
+                buckets.setdefault(key_of(self.nodes[edge["target"]]), []).append(edge)
+
+            self.root_groups[root] = []
+            for key, members in sorted(buckets.items(), key=lambda kv: (-len(kv[1]), kv[0])):
+                group_id = f"{root}|{kind}:{key}"
+                self.group_nodes[group_id] = {
+                    "id": group_id, "name": key, "kind": "group", "grouping": kind, "member_count": len(members),
+                }
+                self.group_edges[group_id] = [
+                    {**edge, "id": f"{group_id}->{edge['target']}", "source": group_id} for edge in members
+                ]
+                self.root_groups[root].append({
+                    "id": f"{root}->{group_id}", "source": root, "target": group_id, "count": len(members),
+                })
+
+    def grouping_targets(self):
+        """Nodes whose data the current grouping is keyed on (to enrich before grouping)."""
+        return [edge["target"] for root in self.roots for edge in self.children[root]]
+
+    # -----------------------------
+    # Views
+    # -----------------------------
+    def __contains__(self, node_id):
+        return node_id in self.nodes or node_id in self.group_nodes
+
+    def child_edges(self, node_id):
+        if node_id in self.group_edges:
+            return self.group_edges[node_id]
+        if node_id in self.root_groups:
+            return self.root_groups[node_id]
+        return self.children[node_id]
+
+    def summary(self, depth=1, limit=PAGE_SIZE):
+        """
+        The roots and everything within depth hops, at most limit children
+        per node. Returns ({node id: children shown}, edges).
+        """
+        shown = {root: 0 for root in self.roots}
+        edges = []
+        frontier = deque((root, 0) for root in self.roots)
+        while frontier:
+            node_id, level = frontier.popleft()
+            if level >= depth:
+                continue
+            page = self.child_edges(node_id)[:limit]
+            shown[node_id] = len(page)
+            for edge in page:
+                edges.append(edge)
+                if edge["target"] not in shown:
+                    shown[edge["target"]] = 0
+                    frontier.append((edge["target"], level + 1))
+        return shown, edges
+
+    def page(self, node_id, offset=0, limit=PAGE_SIZE):
+        """One page of node_id's child edges, and how many it has in all."""
+        edges = self.child_edges(node_id)
+        return edges[offset:offset + limit], len(edges)
+
+    def render(self, shown, edges):
+        """
+        Client payload for the given nodes and edges. Each node carries
+        child_count and hidden_children (children not shown yet), which is
+        what the client expands from.
+        """
+        nodes = []
+        for node_id, count in shown.items():
+            data = self.group_nodes.get(node_id) or self.nodes[node_id]
+            total = len(self.child_edges(node_id))
+            nodes.append({"data": {**data, "child_count": total, "hidden_children": total - count}})
+        return {"nodes": nodes, "edges": [{"data": edge} for edge in edges]}
+
+
+class SessionStore:
+    """Live graph sessions, least recently used first; idle ones expire after ttl."""
+
+    def __init__(self, limit=SESSION_LIMIT, ttl=SESSION_TTL_SECONDS):
+        self.limit = limit
+        self.ttl = ttl
+        self._sessions = OrderedDict()   # id → (session, last used)
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._sessions:
+            session_id, (_, used) = next(iter(self._sessions.items()))
+            if now - used < self.ttl and len(self._sessions) <= self.limit:
+                break
+            del self._sessions[session_id]
+
+    def add(self, session):
+        self._sessions[session.id] = (session, time.monotonic())
+        self._expire()
+        return session
+
+    def get(self, session_id):
+        self._expire()
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        self._sessions[session_id] = (entry[0], time.monotonic())
+        self._sessions.move_to_end(session_id)
+        return entry[0]
+
+    def remove(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
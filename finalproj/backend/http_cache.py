@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+import pipeline_modules  # puts data/ on sys.path
+from cache_entries import FRESH_SECONDS, cache_key, conditional_headers, is_fresh, load_entry, save_entry
+from metrics import inc, observe, record_upstream
+from metrics_core import upstream_name
+
+# Keys and on-disk format come from data/cache_entries.py, which
+# data/http_cache.py uses too, so the pipeline scripts and the backend
+# revalidate the same full packuments.
+POST_TTL_SECONDS = float(os.environ.get("NPM_HTTP_CACHE_POST_TTL", 3600))
+MAX_CONCURRENCY = int(os.environ.get("UPSTREAM_CONCURRENCY", 32))
+TIMEOUT = 10
+
+_client = None
+_semaphore = None
+
+
+# -----------------------------
+# Shared client pool
+# -----------------------------
+def get_client() -> httpx.AsyncClient:
+    """Return the app-lifetime client, creating it on first use."""
+    global _client, _semaphore
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONCURRENCY,
+                max_keepalive_connections=MAX_CONCURRENCY,
+            ),
+        )
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# -----------------------------
+# Cached requests
+# -----------------------------
+async def _send(method: str, url: str, **kwargs):
+    """One upstream request through the shared pool, counted and timed."""
+    client = get_client()
+    upstream = upstream_name(url)
+    queued = time.perf_counter()
+    async with _semaphore:
+        started = time.perf_counter()
+        observe("upstream_wait_seconds", started - queued, upstream=upstream)
+        try:
+            r = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            record_upstream(url, None, time.perf_counter() - started)
+            raise
+    record_upstream(url, r.status_code, time.perf_counter() - started)
+    return r
+
+
+async def cached_get(url: str, headers: dict | None = None):
+    """
+    GET a JSON document through the shared pool.
+    Returns (status_code, data). Cached entries younger than FRESH_SECONDS
+    are served without a request; older ones are revalidated with
+    If-None-Match / If-Modified-Since and a 304 reuses the stored body.
+    """
+    key = cache_key("GET", url, vary=(headers or {}).get("Accept", ""))
+    entry = await asyncio.to_thread(load_entry, key)
+    if is_fresh(entry, FRESH_SECONDS):
+        inc("upstream_cache_total", result="fresh")
+        return 200, entry["data"]
+
+    r = await _send("GET", url, headers=conditional_headers(entry, headers))
+
+    if r.status_code == 304 and entry is not None:
+        inc("upstream_cache_total", result="revalidated")
+        entry["fetched_at"] = time.time()
+        await asyncio.to_thread(save_entry, key, entry)
+        return 200, entry["data"]
+
+    inc("upstream_cache_total", result="miss")
+    if r.status_code != 200:
+        return r.status_code, None
+
+    data = r.json()
+    await asyncio.to_thread(save_entry, key, {
+        "url": url,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "fetched_at": time.time(),
+        "data": data,
+    })
+    return 200, data
+
+
+async def cached_post_json(url: str, payload: dict):
+    """
+    POST a JSON query through the shared pool.
+    OSV query responses carry no validators, so they are cached for
+    POST_TTL_SECONDS keyed on the request body.
+    """
+    body = json.dumps(payload, sort_keys=True)
+    key = cache_key("POST", url, body=body)
+    entry = await asyncio.to_thread(load_entry, key)
+    if is_fresh(entry, POST_TTL_SECONDS):
+        inc("upstream_cache_total", result="fresh")
+        return 200, entry["data"]
+
+    r = await _send("POST", url, json=payload)
+    inc("upstream_cache_total", result="miss")
+    if r.status_code != 200:
+        return r.status_code, None
+
+    data = r.json()
+    await asyncio.to_thread(save_entry, key, {
+        "url": url,
+        "fetched_at": time.time(),
+        "data": data,
+    })
+    return 200, data
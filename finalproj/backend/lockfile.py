@@ -0,0 +1,243 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import ijson
+from fastapi import HTTPException
+
+from deps_fetcher import GraphBuilder, add_tree
+from metrics import phase
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", min(4, os.cpu_count() or 1)))
+SPOOL_CHUNK = 1 << 20  # bytes copied per read when spooling an upload to disk
+
+# Dependency fields that become edges. Lockfiles only carry devDependencies
+# on the root and workspace entries, which is where they matter.
+DEP_FIELDS = ("dependencies", "optionalDependencies", "peerDependencies", "devDependencies")
+
+_pool = None
+
+
+# -----------------------------
+# Format detection
+# -----------------------------
+def read_header(fp):
+    """
+    Top-level name, version and lockfileVersion of a document, plus the set
+    of top-level keys seen. npm writes these before "packages" and
+    "dependencies", so reading stops at the first of those two.
+    """
+    header = {"keys": set()}
+    for prefix, event, value in ijson.parse(fp, use_float=True):
+        if prefix == "" and event == "map_key":
+            header["keys"].add(value)
+            if value in ("packages", "dependencies"):
+                break
+        elif prefix in ("name", "version", "lockfileVersion") and event in ("string", "number"):
+            header[prefix] = value
+    return header
+
+
+def lockfile_format(header):
+    """"packages" (lockfile v2/v3), "lockfile-v1" or "tree" (npm ls --json)."""
+    version = header.get("lockfileVersion")
+    if "packages" in header["keys"] or (version or 0) >= 2:
+        return "packages"
+    if version == 1:
+        return "lockfile-v1"
+    return "tree"
+
+
+# -----------------------------
+# Installed locations
+# -----------------------------
+def _name_from_location(location):
+    """node_modules/a/node_modules/@s/b → @s/b; a workspace path → its last segment."""
+    i = location.rfind("node_modules/")
+    return location[i + len("node_modules/"):] if i != -1 else location.rsplit("/", 1)[-1]
+
+
+def read_packages(fp):
+    """
+    {location: (name, version, dependency names, link target)} from a v2/v3
+    "packages" map, one entry at a time.
+    """
+    locations = {}
+    for location, entry in ijson.kvitems(fp, "packages", use_float=True):
+        deps = []
+        for field in DEP_FIELDS:
+            deps.extend(entry.get(field) or {})
+        link = entry.get("resolved") if entry.get("link") else None
+        locations[location] = (entry.get("name") or _name_from_location(location), entry.get("version"), deps, link)
+    return locations
+
+
+def read_v1_dependencies(fp):
+    """
+    The same mapping from a v1 lockfile, whose nested "dependencies" mirror
+    node_modules nesting and whose "requires" are the actual dependencies.
+    Each top-level entry is materialized on its own.
+    """
+    locations = {}
+    for top, entry in ijson.kvitems(fp, "dependencies", use_float=True):
+        stack = [(f"node_modules/{top}", top, entry)]
+        while stack:
+            location, name, entry = stack.pop()
+            locations[location] = (name, entry.get("version"), list(entry.get("requires") or {}), None)
+            for child, sub in (entry.get("dependencies") or {}).items():
+                stack.append((f"{location}/node_modules/{child}", child, sub))
+    return locations
+
+
+def resolve(locations, location, dep):
+    """Node's lookup: the nearest node_modules/dep walking up from location, links followed."""
+    base = location
+    while True:
+        candidate = f"{base}/node_modules/{dep}" if base else f"node_modules/{dep}"
+        if candidate in locations:
+            link = locations[candidate][3]
+            if link is not None:
+                return link if link in locations else None
+            return candidate
+        if not base:
+            return None
+        i = base.rfind("/node_modules/")
+        base = base[:i] if i != -1 else ""
+
+
+def graph_from_locations(locations, root):
+    """
+    Build the graph from installed locations. Depth is the shortest
+    dependency path from the root; packages nothing reaches (extraneous)
+    are kept at their nesting depth. Link entries only redirect lookups.
+    """
+    locations = {"": root, **locations}
+    depth = {"": 0}
+    edges = []
+    queue = deque([""])
+    while queue:
+        location = queue.popleft()
+        for dep in locations[location][2]:
+            target = resolve(locations, location, dep)
+            if target is None:
+                continue  # optional or peer dependency that is not installed
+            edges.append((location, target))
+            if target not in depth:
+                depth[target] = depth[location] + 1
+                queue.append(target)
+
+    builder = GraphBuilder()
+    keys = {}
+    for location, (name, version, _, link) in locations.items():
+        if link is None:
+            level = depth.get(location, location.count("node_modules/"))
+            keys[location] = builder.add_node(name, version, level)
+    for source, target in edges:
+        builder.add_edge(keys[source], keys[target])
+    return builder.to_graph()
+
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def parse_lockfile(path):
+    """
+    Graph for the document at path: a package-lock.json (v1, v2 or v3) or
+    `npm ls --json` output. The file is read incrementally; only a compact
+    entry per installed package (or one top-level subtree of an npm ls
+    tree at a time) is held in memory. Raises ValueError on malformed JSON.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = read_header(f)
+        kind = lockfile_format(header)
+        name, version = header.get("name", "root"), header.get("version")
+
+        with open(path, "rb") as f:
+            if kind == "tree":
+                builder = GraphBuilder()
+                root = builder.add_node(name, version)
+                for dep, meta in ijson.kvitems(f, "dependencies", use_float=True):
+                    add_tree(builder, root, {dep: meta})
+                return builder.to_graph()
+
+            if kind == "packages":
+                locations = read_packages(f)
+                root = locations.pop("", None) or (name, version, [], None)
+                # Workspaces are linked from node_modules; the root depends on them
+                workspaces = [loc[len("node_modules/"):] for loc, entry in locations.items()
+                              if entry[3] is not None and loc.count("node_modules/") == 1]
+                root = (root[0] or name, root[1] or version, list(dict.fromkeys(root[2] + workspaces)), None)
+            else:
+                locations = read_v1_dependencies(f)
+                # v1 does not list the root's own dependencies: take the
+                # top-level packages no other package requires
+                required = {dep for entry in locations.values() for dep in entry[2]}
+                top = [loc[len("node_modules/"):] for loc in locations if loc.count("node_modules/") == 1]
+                root = (name, version, [dep for dep in top if dep not in required], None)
+    except (ijson.JSONError, UnicodeDecodeError, AttributeError, TypeError) as e:
+        raise ValueError(f"Unreadable dependency file: {e}") from e
+
+    return graph_from_locations(locations, root)
+
+
+# -----------------------------
+# Upload ingestion
+# -----------------------------
+def get_pool():
+    """Process pool for parsing; spawned, so workers hold no copy of the server's state."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(INGEST_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def discard_pool(pool):
+    """Drop a broken pool (a worker died) so the next upload spawns a fresh one."""
+    global _pool
+    if _pool is pool:
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def spool_upload(file):
+    """Copy an UploadFile to a named temp file in chunks; returns its path."""
+    tmp = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".json", delete=False)
+    try:
+        with tmp:
+            while chunk := await file.read(SPOOL_CHUNK):
+                await asyncio.to_thread(tmp.write, chunk)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    return tmp.name
+
+
+async def ingest_upload(file):
+    """Parse an uploaded lockfile / npm ls document into a graph off the event loop."""
+    with phase("spool"):
+        path = await spool_upload(file)
+    pool = get_pool()
+    try:
+        with phase("parse"):
+            return await asyncio.get_running_loop().run_in_executor(pool, parse_lockfile, path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BrokenProcessPool:
+        # e.g. a worker killed for running out of memory on a huge file
+        print("[ERROR] A lockfile parser process died; restarting the pool")
+        discard_pool(pool)
+        raise HTTPException(status_code=503, detail="The parser process died while reading this file; try again")
+    finally:
+        os.unlink(path)
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pipeline_modules  # puts data/ on sys.path
+import metrics_core
+
+# Process-wide counters and latency histograms, served by /metrics in the
+# Prometheus text format. Counters, histograms and the metric names shared
+# with data/metrics.py (which writes the same data to a file at the end of a
+# run) come from data/metrics_core.py.
+#
+#   phase_seconds{phase}                      ingest / risk / metadata / vulnerabilities ...
+#   http_request_seconds{route,method}        per endpoint, until the response starts
+#   upstream_requests_total{upstream,status}  one per HTTP response ("error": no response)
+#   upstream_cache_total{result}              fresh / revalidated / miss
+#   upstream_wait_seconds{upstream}           queued for a connection slot
+#   upstream_seconds{upstream}                request latency
+#   event_loop_lag_seconds                    how late a periodic wake-up ran
+
+LOOP_LAG_INTERVAL = 0.25  # seconds between event loop lag probes
+
+
+# -----------------------------
+# Counters and histograms
+# -----------------------------
+class Metrics(metrics_core.Metrics):
+    """Shared counters and histograms, plus gauges read at scrape time."""
+
+    def __init__(self):
+        super().__init__()
+        self.gauges = {}  # name → callable returning {labels: value}
+
+    def gauge(self, name, read):
+        """Register a gauge read at scrape time: read() returns {(label, value) tuple: number}."""
+        self.gauges[name] = read
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, h.buckets, list(h.counts), h.count, h.sum)
+                                for key, h in self.histograms.items())
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for (name, labels), buckets, counts, count, total in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, n in zip((*buckets, "+Inf"), counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for name, read in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(read().items()):
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+metrics = Metrics()
+inc = metrics.inc
+observe = metrics.observe
+timer = metrics.timer
+phase = metrics.phase
+record_upstream = metrics.record_upstream
+
+
+# -----------------------------
+# Request timing
+# -----------------------------
+class RequestTimer:
+    """
+    ASGI middleware observing http_request_seconds by route template, up
+    to the start of the response (for streams: before the first line).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                observe("http_request_seconds", time.perf_counter() - started,
+                        route=getattr(route, "path", "unmatched"), method=scope["method"])
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+
+# -----------------------------
+# Event loop lag
+# -----------------------------
+async def watch_event_loop(interval=LOOP_LAG_INTERVAL):
+    """
+    Sleep interval seconds at a time and record how much later than that
+    the loop woke us up: time the loop spent running something else
+    without yielding (CPU-bound work, blocking calls).
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        observe("event_loop_lag_seconds", max(0.0, time.perf_counter() - started - interval))
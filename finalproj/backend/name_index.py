@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+
+from rapidfuzz.distance import Levenshtein
+
+from pipeline_modules import DATA_DIR
+from typosquat_index import TyposquatIndex
+from typosquat_rules import is_typo_squat
+
+# Built by data/typosquat_index.py from the registry name list and kept up
+# to date by its --add runs: memory-mapped deletion-variant segments plus
+# meta.json. Candidates are checked with the audit's own is_typo_squat.
+INDEX_DIR = Path(os.environ.get("NPM_TYPOSQUAT_INDEX", DATA_DIR / "typosquat_index"))
+RELOAD_CHECK_SECONDS = 30
+MAX_RESULTS = 100
+
+
+def similar_names(index, package, limit=MAX_RESULTS):
+    """Names in index that is_typo_squat accepts for package, closest first."""
+    results = [
+        {"name": name, "levenshtein": Levenshtein.distance(package, name)}
+        for name in index.candidates(package)
+        if is_typo_squat(package, name)
+    ]
+    results.sort(key=lambda r: (r["levenshtein"], r["name"]))
+    return results[:limit]
+
+
+class ReloadingNameIndex:
+    """
+    Serves the typosquat candidate index at INDEX_DIR and reopens it in a
+    worker thread when its meta.json changes (checked at most every
+    RELOAD_CHECK_SECONDS). Segments are memory-mapped, so the names stay in
+    the page cache rather than in Python objects. Queries keep using the
+    old index until the new one is open; its mappings are released once
+    the last of them finishes.
+    """
+
+    def __init__(self, path=INDEX_DIR):
+        self.path = Path(path)
+        self.index = None
+        self.mtime = None
+        self.loaded_at = None
+        self.checked_at = 0.0
+        self._reload_task = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        """Open the index if it is new or changed."""
+        async with self._lock:
+            self.checked_at = time.monotonic()
+            try:
+                mtime = (self.path / "meta.json").stat().st_mtime
+            except OSError:
+                return
+            if mtime == self.mtime:
+                return
+            try:
+                self.index = await asyncio.to_thread(TyposquatIndex, self.path)
+            except (OSError, ValueError) as e:
+                # Mid-rebuild (segments replaced before meta.json); retried on a later check
+                print(f"[WARN] Could not open typosquat index {self.path}: {e}")
+                return
+            self.mtime = mtime
+            self.loaded_at = time.time()
+            print(f"[INFO] Opened typosquat index {self.path} ({len(self.index.segments)} segment(s))")
+
+    def start(self):
+        """Load in the background; the first query waits if it is not done."""
+        self._reload_task = asyncio.create_task(self.load())
+
+    def _maybe_reload(self):
+        if self._lock.locked() or time.monotonic() - self.checked_at < RELOAD_CHECK_SECONDS:
+            return
+        self.checked_at = time.monotonic()
+        self._reload_task = asyncio.create_task(self.load())
+
+    async def similar(self, package, limit=MAX_RESULTS):
+        """Typosquat candidates for package, or None if there is no index yet."""
+        if self.index is None:
+            await self.load()
+        else:
+            self._maybe_reload()
+        if self.index is None:
+            return None
+        return await asyncio.to_thread(similar_names, self.index, package, limit)
+
+    def status(self):
+        return {
+            "index_dir": str(self.path),
+            "loaded": self.index is not None,
+            "names": sum(len(seg) for seg in self.index.segments) if self.index else 0,
+            "removed": len(self.index.removed) if self.index else 0,
+            "loaded_at": self.loaded_at,
+        }
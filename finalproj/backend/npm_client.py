@@ -1,18 +1,28 @@
-import httpx
+import os
+
+from http_cache import cached_get
+from response_cache import ResponseCache
+
+NPM_REGISTRY_URL = os.environ.get("NPM_REGISTRY_URL", "https://registry.npmjs.org")
+
+_metadata_cache = ResponseCache("npm_metadata")
+
 
 async def get_package_metadata(package_name: str):
-    """Fetch maintainer and version info from npm registry."""
-    url = f"https://registry.npmjs.org/{package_name}"
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, timeout=10)
-        if r.status_code != 200:
-            return {"maintainers": [], "maintainer_count": 0, "version": None}
-        data = r.json()
-        latest = data.get("dist-tags", {}).get("latest")
-        version_info = data.get("versions", {}).get(latest, {})
-        maintainers = [m["name"] for m in version_info.get("maintainers", [])]
-        return {
-            "version": latest,
-            "maintainers": maintainers,
-            "maintainer_count": len(maintainers)
-        }
+    """Fetch maintainer and version info from npm registry (cached in-process)."""
+    return await _metadata_cache.get(package_name, lambda: _fetch_package_metadata(package_name))
+
+
+async def _fetch_package_metadata(package_name: str):
+    url = f"{NPM_REGISTRY_URL}/{package_name}"
+    status, data = await cached_get(url)
+    if status != 200:
+        return {"maintainers": [], "maintainer_count": 0, "version": None}
+    latest = data.get("dist-tags", {}).get("latest")
+    version_info = data.get("versions", {}).get(latest, {})
+    maintainers = [m["name"] for m in version_info.get("maintainers", [])]
+    return {
+        "version": latest,
+        "maintainers": maintainers,
+        "maintainer_count": len(maintainers)
+    }
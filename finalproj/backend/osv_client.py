@@ -1,23 +1,106 @@
-import httpx
+import asyncio
+import os
+
+from http_cache import cached_get, cached_post_json
+from response_cache import ResponseCache
+
+OSV_API_URL = os.environ.get("OSV_API_URL", "https://api.osv.dev")
+QUERYBATCH_SIZE = 1000  # OSV's per-request query limit
+
+# Keyed by (name, version); shared by the single and batch lookups
+_vuln_cache = ResponseCache("osv_vulnerabilities")
+
 
 async def get_vulnerabilities(package_name: str, version: str | None = None):
-    url = "https://api.osv.dev/v1/query"
+    key = (package_name, version or None)
+    return await _vuln_cache.get(key, lambda: _fetch_vulnerabilities(package_name, version))
+
+
+async def _fetch_vulnerabilities(package_name: str, version: str | None = None):
+    url = f"{OSV_API_URL}/v1/query"
     payload = {
         "package": {"name": package_name, "ecosystem": "npm"}
     }
     if version:
         payload["version"] = version
 
-    async with httpx.AsyncClient() as client:
-        r = await client.post(url, json=payload, timeout=10)
-        if r.status_code != 200:
-            return {"vulnerability_count": 0, "vulnerabilities": []}
-        data = r.json()
-        vulns = data.get("vulns", [])
-        return {
-            "vulnerability_count": len(vulns),
-            "vulnerabilities": [
-                {"id": v.get("id"), "summary": v.get("summary")}
-                for v in vulns
-            ]
+    status, data = await cached_post_json(url, payload)
+    if status != 200:
+        return {"vulnerability_count": 0, "vulnerabilities": []}
+    vulns = data.get("vulns", [])
+    return {
+        "vulnerability_count": len(vulns),
+        "vulnerabilities": [
+            {"id": v.get("id"), "summary": v.get("summary")}
+            for v in vulns
+        ]
+    }
+
+
+async def get_vulnerabilities_batch(pairs):
+    """
+    Look up many (name, version) pairs, sending only the ones not already
+    cached or in flight to OSV. Returns {(name, version): result} in the
+    same shape as get_vulnerabilities.
+    """
+    return await _vuln_cache.get_many(pairs, _fetch_vulnerabilities_batch)
+
+
+async def _fetch_vulnerabilities_batch(pairs):
+    """
+    Query /v1/querybatch for pairs. querybatch only returns vuln IDs, so
+    each distinct ID is then hydrated once from /v1/vulns/{id}.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    ids_by_pair = {pair: [] for pair in pairs}
+
+    pending = [(pair, None) for pair in pairs]
+    while pending:
+        chunks = [
+            pending[i:i + QUERYBATCH_SIZE]
+            for i in range(0, len(pending), QUERYBATCH_SIZE)
+        ]
+        responses = await asyncio.gather(*(_query_batch(chunk) for chunk in chunks))
+
+        pending = []
+        for chunk, results in zip(chunks, responses):
+            for (pair, _), result in zip(chunk, results):
+                ids_by_pair[pair].extend(v["id"] for v in result.get("vulns", []))
+                token = result.get("next_page_token")
+                if token:
+                    pending.append((pair, token))
+
+    vuln_ids = sorted({i for ids in ids_by_pair.values() for i in ids})
+    summaries = await asyncio.gather(*(_get_vuln_summary(i) for i in vuln_ids))
+    details = dict(zip(vuln_ids, summaries))
+
+    return {
+        pair: {
+            "vulnerability_count": len(ids),
+            "vulnerabilities": [{"id": i, "summary": details[i]} for i in ids],
         }
+        for pair, ids in ids_by_pair.items()
+    }
+
+
+async def _query_batch(chunk):
+    queries = []
+    for (name, version), page_token in chunk:
+        query = {"package": {"name": name, "ecosystem": "npm"}}
+        if version:
+            query["version"] = version
+        if page_token:
+            query["page_token"] = page_token
+        queries.append(query)
+
+    status, data = await cached_post_json(f"{OSV_API_URL}/v1/querybatch", {"queries": queries})
+    results = (data or {}).get("results", []) if status == 200 else []
+    # Treat a failed or short response as "no known vulns", like get_vulnerabilities
+    return results + [{}] * (len(chunk) - len(results))
+
+
+async def _get_vuln_summary(vuln_id):
+    status, data = await cached_get(f"{OSV_API_URL}/v1/vulns/{vuln_id}")
+    if status != 200:
+        return None
+    return data.get("summary")
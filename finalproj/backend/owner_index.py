@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from pipeline_modules import DATA_DIR
+import owner_queries
+
+# Built by data/owner_index.py from the registry-wide audit and updated by
+# its incremental runs: maintainer → packages and repository → packages.
+# Queried with the builder's own owner_queries, so repository URLs are
+# normalized by the same rules that produced the stored keys.
+INDEX_FILE = Path(os.environ.get("NPM_OWNER_INDEX", DATA_DIR / "owner_index.db"))
+REOPEN_CHECK_SECONDS = 30
+
+
+class OwnerIndex:
+    """
+    Read-only access to the ownership index. Queries run in a worker thread
+    over one shared connection, reopened when a rebuild replaces the file
+    (checked at most every REOPEN_CHECK_SECONDS); incremental updates are
+    visible straight away. Every query returns None while there is no index.
+    """
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = Path(path)
+        self.conn = None
+        self.inode = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        now = time.monotonic()
+        if self.conn is not None and now - self.checked_at < REOPEN_CHECK_SECONDS:
+            return self.conn
+        self.checked_at = now
+        try:
+            inode = self.path.stat().st_ino
+        except OSError:
+            inode = None
+        if inode != self.inode:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            if inode is not None:
+                uri = f"{self.path.resolve().as_uri()}?mode=ro"
+                self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.inode = inode
+        return self.conn
+
+    def _run(self, query, *args):
+        with self._lock:
+            conn = self._connection()
+            return None if conn is None else query(conn, *args)
+
+    async def _query(self, query, *args):
+        return await asyncio.to_thread(self._run, query, *args)
+
+    async def maintainer(self, maintainer, limit=100, offset=0):
+        """Packages maintainer maintains (one page) with their counts; {} if unknown."""
+        return await self._query(lambda conn: owner_queries.maintainer(conn, maintainer, limit, offset) or {})
+
+    async def repository(self, url, limit=100, offset=0):
+        """Packages published from the repository at url (any spelling); {} if unknown."""
+        return await self._query(lambda conn: owner_queries.repository(conn, url, limit, offset) or {})
+
+    async def owners(self, names):
+        """{name: {"maintainers": [...], "repository": ...}} for the indexed names among names."""
+        return await self._query(owner_queries.owners, list(names))
+
+    async def maintainer_counts(self, maintainers):
+        """{maintainer: {"packages": n, "sole": n}} across the whole registry."""
+        return await self._query(owner_queries.maintainer_counts, list(maintainers))
+
+    async def top(self, limit=20):
+        """Maintainers (by packages and sole packages) and repositories with the most packages."""
+        return await self._query(owner_queries.top, limit)
+
+    def status(self):
+        return {"index_file": str(self.path), "available": self.path.exists()}
@@ -0,0 +1,14 @@
+import os
+import sys
+from pathlib import Path
+
+# The data/ pipeline builds the indexes the backend serves. The rules both
+# sides must agree on live there in small standard-library-only modules
+# (owner_queries, ...) that the backend imports instead of copying; import
+# this module first to make them importable.
+DATA_DIR = Path(os.environ.get("NPM_DATA_DIR", Path(__file__).resolve().parents[2] / "data"))
+
+# Appended, so the backend's own metrics.py, http_cache.py and owner_index.py
+# still shadow the pipeline modules of the same name
+if str(DATA_DIR) not in sys.path:
+    sys.path.append(str(DATA_DIR))
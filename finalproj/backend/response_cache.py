@@ -0,0 +1,166 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL", 300))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_SIZE", 10000))
+
+_MISS = object()
+_caches = {}
+
+
+class ResponseCache:
+    """
+    Bounded in-process cache for upstream lookups. Entries expire after
+    ttl seconds and the least recently used entry is evicted once maxsize
+    is reached. Lookups for a key that is already being fetched wait for
+    that fetch instead of starting another one (single flight); a fetch
+    is cancelled once every caller waiting on it has been. Cached values
+    are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, name, maxsize=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}            # key -> Future
+        self._fill_of = {}             # key -> the fill task fetching it
+        self._waiters = {}             # fill task -> callers waiting on it
+        self._tasks = set()            # running fills, kept alive until done
+        self.hits = self.misses = self.coalesced = 0
+        self.evictions = self.expirations = 0
+        _caches[name] = self
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISS
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return _MISS
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key, fetch):
+        """Return the cached value for key, or await fetch() once to fill it."""
+        async def fetch_many(keys):
+            return {key: await fetch()}
+        return (await self.get_many([key], fetch_many))[key]
+
+    async def get_many(self, keys, fetch_many):
+        """
+        Return {key: value} for keys. Keys that are neither cached nor
+        already in flight are fetched together with one
+        fetch_many(missing_keys) call, which must return {key: value}.
+        """
+        results, waiting, missing = {}, {}, []
+        for key in dict.fromkeys(keys):
+            value = self._lookup(key)
+            if value is not _MISS:
+                self.hits += 1
+                results[key] = value
+            elif key in self._inflight:
+                self.coalesced += 1
+                waiting[key] = self._inflight[key]
+            else:
+                self.misses += 1
+                missing.append(key)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in missing}
+            self._inflight.update(futures)
+            waiting.update(futures)
+            # The fetch runs as its own task so that a cancelled caller does
+            # not cancel it for everyone else waiting on the same keys.
+            task = asyncio.create_task(self._fill(futures, fetch_many))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            self._fill_of.update(dict.fromkeys(missing, task))
+
+        fills = {self._fill_of[key] for key in waiting}
+        for task in fills:
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            for key, future in waiting.items():
+                results[key] = await asyncio.shield(future)
+        finally:
+            for task in fills:
+                self._release(task)
+        return results
+
+    def _release(self, task):
+        """One caller stopped waiting on task; cancel it if it was the last."""
+        self._waiters[task] -= 1
+        if not self._waiters[task]:
+            del self._waiters[task]
+            if not task.done():
+                # Later lookups of its keys start a new fetch instead of
+                # joining the cancelled one
+                for key in [key for key, fill in self._fill_of.items() if fill is task]:
+                    del self._fill_of[key]
+                    del self._inflight[key]
+                task.cancel()
+
+    async def _fill(self, futures, fetch_many):
+        try:
+            values = await fetch_many(list(futures))
+        except asyncio.CancelledError:
+            self._settle(futures, lambda future: future.cancel())
+            raise
+        except Exception as e:
+            # Failures are not cached; mark them retrieved in case nobody waits
+            self._settle(futures, lambda future: (future.set_exception(e), future.exception()))
+            return
+
+        for key, future in futures.items():
+            self._forget(key, future)
+            self._store(key, values[key])
+            if not future.done():
+                future.set_result(values[key])
+
+    def _settle(self, futures, finish):
+        for key, future in futures.items():
+            self._forget(key, future)
+            if not future.done():
+                finish(future)
+
+    def _forget(self, key, future):
+        """Drop key's in-flight entry if it is still this fetch's."""
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+            del self._fill_of[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "inflight": len(self._inflight),
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+        }
+
+
+def cache_stats():
+    """Stats for every ResponseCache in the process, by name."""
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,319 @@
+from collections import deque
+
+
+def _bits(mask):
+    """Yield the positions of the set bits of an int."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def local_risk(data):
+    """Risk a node carries by itself: its known advisories."""
+    return data.get("vulnerability_count") or 0
+
+
+class RiskGraph:
+    """
+    Transitive risk over a dependency graph.
+
+    Strongly connected components are condensed once (iterative Tarjan).
+    Full transitive closures are not kept (they grow with the square of the
+    graph); each component only stores which risky components it reaches,
+    as an int bitset over slots handed out to risky components. Tarjan
+    numbers components sinks first, so every dependency of a component has
+    a lower number and the initial pass is a single sweep. Changing one
+    node's risk walks that component's ancestors (reverse BFS) and sets or
+    clears its slot bit there; other reachability queries walk the graph.
+    """
+
+    def __init__(self, node_ids, edges, risks=None):
+        self.ids = list(node_ids)
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+        self.adj = [[] for _ in self.ids]
+        for source, target in edges:
+            if source in self.index and target in self.index:
+                self.adj[self.index[source]].append(self.index[target])
+
+        self._condense()
+
+        self.risk = [0] * len(self.ids)
+        self.comp_risk = [0] * len(self.members)
+        for node_id, value in (risks or {}).items():
+            i = self.index[node_id]
+            self.risk[i] = value
+            self.comp_risk[self.comp[i]] += value
+
+        self.slot = {}        # risky component -> its bit in reach
+        self.slot_comp = []   # bit -> risky component (None when free)
+        self.free_slots = []
+        for c, value in enumerate(self.comp_risk):
+            if value:
+                self._claim_slot(c)
+        self._reach_risky()
+        self.score = [sum(self.comp_risk[self.slot_comp[s]] for s in _bits(self.reach[c]))
+                      for c in range(len(self.members))]
+        self.dist = [None] * len(self.members)  # hops (between components) to nearest risk
+        self._distances(range(len(self.members)))
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Build from the {"nodes", "edges"} shape parse_dependency_json returns."""
+        nodes = [n["data"] for n in graph["nodes"]]
+        return cls(
+            [d["id"] for d in nodes],
+            [(e["data"]["source"], e["data"]["target"]) for e in graph["edges"]],
+            {d["id"]: local_risk(d) for d in nodes if local_risk(d)},
+        )
+
+    # -----------------------------
+    # Construction
+    # -----------------------------
+    def _condense(self):
+        n = len(self.ids)
+        order = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        stack = []
+        self.comp = [-1] * n
+        self.members = []
+        counter = 0
+
+        for start in range(n):
+            if order[start] != -1:
+                continue
+            work = [(start, 0)]
+            order[start] = low[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack[start] = True
+            while work:
+                v, i = work[-1]
+                if i < len(self.adj[v]):
+                    work[-1] = (v, i + 1)
+                    w = self.adj[v][i]
+                    if order[w] == -1:
+                        order[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = True
+                        work.append((w, 0))
+                    elif on_stack[w]:
+                        low[v] = min(low[v], order[w])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[v])
+                if low[v] == order[v]:
+                    members = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        self.comp[w] = len(self.members)
+                        members.append(w)
+                        if w == v:
+                            break
+                    self.members.append(members)
+
+        # Condensed edges, remembering one real edge per component pair
+        self.cadj = [set() for _ in self.members]
+        self.radj = [set() for _ in self.members]
+        self.link = {}
+        for v, targets in enumerate(self.adj):
+            for w in targets:
+                a, b = self.comp[v], self.comp[w]
+                if a != b and b not in self.cadj[a]:
+                    self.cadj[a].add(b)
+                    self.radj[b].add(a)
+                    self.link[(a, b)] = (v, w)
+
+    def _claim_slot(self, c):
+        s = self.free_slots.pop() if self.free_slots else len(self.slot_comp)
+        if s == len(self.slot_comp):
+            self.slot_comp.append(c)
+        else:
+            self.slot_comp[s] = c
+        self.slot[c] = s
+        return s
+
+    def _reach_risky(self):
+        """reach[c]: slots of the risky components c depends on (itself included)."""
+        self.reach = [0] * len(self.members)
+        for c in range(len(self.members)):  # dependencies first
+            mask = 1 << self.slot[c] if c in self.slot else 0
+            for d in self.cadj[c]:
+                mask |= self.reach[d]
+            self.reach[c] = mask
+
+    def _walk(self, c, adj):
+        """Components reachable from c along adj (cadj: dependencies, radj: dependents), c included."""
+        seen = {c}
+        stack = [c]
+        while stack:
+            for d in adj[stack.pop()]:
+                if d not in seen:
+                    seen.add(d)
+                    stack.append(d)
+        return seen
+
+    def _distances(self, comps):
+        """Recompute hops-to-nearest-risk for comps, visited sinks first."""
+        for c in sorted(comps):
+            if self.comp_risk[c]:
+                self.dist[c] = 0
+                continue
+            best = None
+            for d in self.cadj[c]:
+                if self.dist[d] is not None and (best is None or self.dist[d] + 1 < best):
+                    best = self.dist[d] + 1
+            self.dist[c] = best
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+    def reaches(self, source, target):
+        """True if source depends on target, directly or transitively."""
+        a, b = self.comp[self.index[source]], self.comp[self.index[target]]
+        if b in self.slot:
+            return bool(self.reach[a] >> self.slot[b] & 1)
+        if b > a:  # dependencies always have lower numbers
+            return False
+        return b in self._walk(a, self.cadj)
+
+    def _expand(self, comps, exclude):
+        return [self.ids[v] for c in sorted(comps) for v in self.members[c] if v != exclude]
+
+    def descendants(self, node_id):
+        i = self.index[node_id]
+        return self._expand(self._walk(self.comp[i], self.cadj), i)
+
+    def ancestors(self, node_id):
+        i = self.index[node_id]
+        return self._expand(self._walk(self.comp[i], self.radj), i)
+
+    def _risky_members(self, c, exclude):
+        return [v for s in _bits(self.reach[c]) for v in self.members[self.slot_comp[s]]
+                if v != exclude and self.risk[v]]
+
+    def risky_descendants(self, node_id):
+        i = self.index[node_id]
+        return [self.ids[v] for v in self._risky_members(self.comp[i], i)]
+
+    def exposed(self, node_ids, risky_id):
+        """Which of node_ids (e.g. top-level deps) pull in risky_id."""
+        target = self.comp[self.index[risky_id]]
+        if target in self.slot:
+            bit = 1 << self.slot[target]
+            return [n for n in node_ids if self.reach[self.comp[self.index[n]]] & bit]
+        dependents = self._walk(target, self.radj)
+        return [n for n in node_ids if self.comp[self.index[n]] in dependents]
+
+    def exposures(self, node_ids):
+        """For each of node_ids carrying or pulling in risk: the risky nodes and one shortest path."""
+        out = []
+        for node_id in node_ids:
+            risky = self.risky_descendants(node_id)
+            if risky or self.risk[self.index[node_id]]:
+                out.append({"id": node_id, "risky": risky, "path": self.path_to_risk(node_id)})
+        return out
+
+    def path_to_risk(self, node_id):
+        """A shortest dependency path from node_id to a risky node, or []."""
+        c = self.comp[self.index[node_id]]
+        if self.dist[c] is None:
+            return []
+        path, current = [], self.index[node_id]
+        while True:
+            if self.dist[c] == 0:
+                goal = next(v for v in self.members[c] if self.risk[v])
+                path += self._within(current, goal)
+                return [self.ids[v] for v in path]
+            d = next(d for d in self.cadj[c] if self.dist[d] == self.dist[c] - 1)
+            exit_node, entry = self.link[(c, d)]
+            path += self._within(current, exit_node)
+            current, c = entry, d
+
+    def _within(self, start, goal):
+        """Path from start to goal inside one component (BFS), goal included."""
+        if start == goal:
+            return [start]
+        c = self.comp[start]
+        prev = {start: None}
+        queue = deque([start])
+        while queue:
+            v = queue.popleft()
+            for w in self.adj[v]:
+                if self.comp[w] == c and w not in prev:
+                    prev[w] = v
+                    if w == goal:
+                        path = [w]
+                        while prev[path[-1]] is not None:
+                            path.append(prev[path[-1]])
+                        return path[::-1]
+                    queue.append(w)
+        return [start, goal]
+
+    def node_summary(self, node_id):
+        i = self.index[node_id]
+        c = self.comp[i]
+        return {
+            "transitive_risk": self.score[c],
+            "risky_dependencies": len(self._risky_members(c, i)),
+            "risk_distance": self.dist[c],
+        }
+
+    def summaries(self, node_ids=None):
+        return {n: self.node_summary(n) for n in (self.ids if node_ids is None else node_ids)}
+
+    # -----------------------------
+    # Updates
+    # -----------------------------
+    def set_risk(self, node_id, value):
+        """
+        Change one node's local risk. Scores, distances and risky-reach bits
+        are patched for the node's ancestors only (found by reverse BFS);
+        returns the ids whose summary changed.
+        """
+        i = self.index[node_id]
+        delta = value - self.risk[i]
+        if not delta:
+            return []
+        c = self.comp[i]
+        was_risky = bool(self.comp_risk[c])
+        self.risk[i] = value
+        self.comp_risk[c] += delta
+        is_risky = bool(self.comp_risk[c])
+
+        affected = sorted(self._walk(c, self.radj))
+        for a in affected:
+            self.score[a] += delta
+        if was_risky != is_risky:
+            if is_risky:
+                bit = 1 << self._claim_slot(c)
+                for a in affected:
+                    self.reach[a] |= bit
+            else:
+                s = self.slot.pop(c)
+                for a in affected:
+                    self.reach[a] &= ~(1 << s)
+                self.slot_comp[s] = None
+                self.free_slots.append(s)
+            self._distances(affected)
+        return [self.ids[v] for a in affected for v in self.members[a]]
+
+
+def attach_risk(graph):
+    """
+    Compute transitive risk for an enriched graph: add each node's summary
+    to its data, and list which top-level dependencies (depth 1) pull in
+    risk under graph["risk"]["exposures"]. Returns the RiskGraph.
+    """
+    risk = RiskGraph.from_graph(graph)
+    for node in graph["nodes"]:
+        node["data"].update(risk.node_summary(node["data"]["id"]))
+    top_level = [n["data"]["id"] for n in graph["nodes"] if n["data"].get("depth") == 1]
+    graph["risk"] = {"exposures": risk.exposures(top_level)}
+    return risk
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 import GraphView from './components/GraphView';
 import DependencyInput from './components/DependencyInput';
 import SidePanel from './components/SidePanel';
@@ -7,6 +7,19 @@ export default function App() {
   const [pkgName, setPkgName] = useState('');
   const [graphData, setGraphData] = useState(null);
   const [selectedNode, setSelectedNode] = useState(null);
+  // Enrichment patches from a streamed upload, drained by GraphView
+  const patchQueue = useRef([]);
+  const [patchTick, setPatchTick] = useState(0);
+
+  function handleGraph(data) {
+    patchQueue.current = [];
+    setGraphData(data);
+  }
+
+  function handlePatches(patches) {
+    patchQueue.current.push(...patches);
+    setPatchTick(t => t + 1);
+  }
 
   async function fetchPackage() {
     if (!pkgName.trim()) return;
@@ -36,11 +49,13 @@ export default function App() {
           </button>
         </div>
 
-        <DependencyInput onGraph={setGraphData} />
+        <DependencyInput onGraph={handleGraph} onPatches={handlePatches} />
 
         {graphData ? (
           <GraphView
             graphData={graphData}
+            patchQueue={patchQueue}
+            patchTick={patchTick}
             onNodeClick={setSelectedNode}
           />
         ) : (
@@ -1,7 +1,97 @@
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 
-export default function DependencyInput({ onGraph }) {
+// Files above this size load as a collapsed summary in 'auto' view
+const LARGE_UPLOAD = 1 << 20;
+
+const VIEWS = {
+  auto: 'Auto',
+  full: 'Full graph',
+  collapsed: 'Collapsed',
+  scope: 'Collapsed, by scope',
+  maintainer: 'Collapsed, by maintainer',
+  repository: 'Collapsed, by repository'
+};
+
+const GROUPINGS = ['scope', 'maintainer', 'repository'];
+
+export default function DependencyInput({ onGraph, onPatches }) {
   const [status, setStatus] = useState('');
+  const [view, setView] = useState('auto');
+  const controllerRef = useRef(null);
+
+  // Upload to the streaming endpoint: render the graph from the first
+  // line, then hand enrichment patches over as they arrive.
+  const upload = async form => {
+    controllerRef.current?.abort();
+    const controller = new AbortController();
+    controllerRef.current = controller;
+
+    const res = await fetch('/api/upload/stream', {
+      method: 'POST',
+      body: form,
+      signal: controller.signal
+    });
+    if (!res.ok) throw new Error(`Upload failed: ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let received = 0;
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+
+      const patches = [];
+      lines.filter(line => line.trim()).forEach(line => {
+        const msg = JSON.parse(line);
+        if (msg.type === 'graph') {
+          onGraph({ nodes: msg.nodes, edges: msg.edges });
+          setStatus('Enriching...');
+        } else if (msg.type === 'patch') {
+          patches.push(msg);
+        } else if (msg.type === 'done') {
+          setStatus('Loaded.');
+        } else if (msg.type === 'error') {
+          setStatus(`Loaded, but enrichment failed: ${msg.error}`);
+        }
+      });
+      if (patches.length) {
+        received += patches.length;
+        onPatches(patches);
+        setStatus(`Enriching... (${received} updates)`);
+      }
+    }
+  };
+
+  // Upload into a server-side session: only a folded summary comes back,
+  // and GraphView fetches children as nodes are expanded.
+  const uploadSession = async (form, group) => {
+    controllerRef.current?.abort();
+    const controller = new AbortController();
+    controllerRef.current = controller;
+
+    const query = group ? `?group=${group}` : '';
+    const res = await fetch(`/api/sessions${query}`, {
+      method: 'POST',
+      body: form,
+      signal: controller.signal
+    });
+    if (!res.ok) throw new Error(`Upload failed: ${res.status}`);
+
+    const data = await res.json();
+    onGraph({ nodes: data.nodes, edges: data.edges, session: data.session });
+    setStatus(
+      `Showing ${data.nodes.length} of ${data.stats.nodes} packages. Double-click a node to expand it.`
+    );
+  };
+
+  const load = (form, size) => {
+    if (view === 'full' || (view === 'auto' && size < LARGE_UPLOAD)) return upload(form);
+    return uploadSession(form, GROUPINGS.includes(view) ? view : null);
+  };
 
   const handleFile = async e => {
     const file = e.target.files[0];
@@ -9,10 +99,11 @@ export default function DependencyInput({ onGraph }) {
     const form = new FormData();
     form.append('file', file);
     setStatus('Uploading...');
-    const res = await fetch('/api/upload', { method: 'POST', body: form });
-    const data = await res.json();
-    onGraph(data);
-    setStatus('Loaded.');
+    try {
+      await load(form, file.size);
+    } catch (err) {
+      if (err.name !== 'AbortError') setStatus('Upload failed.');
+    }
   };
 
   const handlePaste = async e => {
@@ -22,11 +113,9 @@ export default function DependencyInput({ onGraph }) {
       const blob = new Blob([text], { type: 'application/json' });
       const form = new FormData();
       form.append('file', blob, 'paste.json');
-      const res = await fetch('/api/upload', { method: 'POST', body: form });
-      const data = await res.json();
-      onGraph(data);
-    } catch {
-      alert('Invalid JSON.');
+      await load(form, blob.size);
+    } catch (err) {
+      if (err.name !== 'AbortError') alert('Invalid JSON.');
     }
   };
 
@@ -35,6 +124,14 @@ export default function DependencyInput({ onGraph }) {
       <label>
         Load dependency JSON: <input type="file" accept=".json" onChange={handleFile} />
       </label>
+      <label style={{ marginLeft: '1rem' }}>
+        View:{' '}
+        <select value={view} onChange={e => setView(e.target.value)}>
+          {Object.entries(VIEWS).map(([value, label]) => (
+            <option key={value} value={value}>{label}</option>
+          ))}
+        </select>
+      </label>
       <div
         onPaste={handlePaste}
         style={{
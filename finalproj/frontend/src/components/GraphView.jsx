@@ -5,10 +5,39 @@ import SidePanel from './SidePanel';
 
 cytoscape.use(coseBilkent);
 
-export default function GraphView({ graphData }) {
+export default function GraphView({ graphData, patchQueue, patchTick }) {
   const cyRef = useRef(null);
   const [selectedNode, setSelectedNode] = useState(null);
   const [typosquats, setTyposquats] = useState([]);
+  const [owners, setOwners] = useState(null);
+
+  // Load the next page of a folded node's children from the upload session
+  const expandNode = async id => {
+    const cy = cyRef.current;
+    const node = cy?.getElementById(id);
+    if (!graphData?.session || !node?.length || !node.data('hidden_children')) return;
+
+    const offset = node.data('child_count') - node.data('hidden_children');
+    const res = await fetch(
+      `/api/sessions/${graphData.session}/children?node=${encodeURIComponent(id)}&offset=${offset}`
+    );
+    if (!res.ok || cy !== cyRef.current) return;
+    const page = await res.json();
+
+    cy.batch(() => {
+      page.nodes.forEach(n => {
+        if (cy.getElementById(n.data.id).empty()) {
+          cy.add({ group: 'nodes', data: n.data, position: { ...node.position() } });
+        }
+      });
+      page.edges.forEach(e => {
+        if (cy.getElementById(e.data.id).empty()) cy.add({ group: 'edges', data: e.data });
+      });
+      node.data('hidden_children', page.hidden);
+    });
+    cy.layout({ name: 'cose-bilkent', animate: true, fit: false, randomize: false, padding: 50 }).run();
+    setSelectedNode(sel => (sel?.id === id ? { ...sel, hidden_children: page.hidden } : sel));
+  };
 
   useEffect(() => {
     if (!graphData?.nodes?.length) return;
@@ -17,11 +46,10 @@ export default function GraphView({ graphData }) {
     if (cyRef.current) cyRef.current.destroy();
 
     // Validate edges to avoid broken refs
-    const validEdges = (graphData.edges || []).filter(e => {
-      const src = graphData.nodes.some(n => n.data.id === e.data.source);
-      const tgt = graphData.nodes.some(n => n.data.id === e.data.target);
-      return src && tgt;
-    });
+    const nodeIds = new Set(graphData.nodes.map(n => n.data.id));
+    const validEdges = (graphData.edges || []).filter(
+      e => nodeIds.has(e.data.source) && nodeIds.has(e.data.target)
+    );
 
     // Init Cytoscape instance
     cyRef.current = cytoscape({
@@ -31,7 +59,11 @@ export default function GraphView({ graphData }) {
         {
           selector: 'node',
           style: {
-            label: 'data(id)',
+            // Folded nodes show how many children are still hidden
+            label: ele => {
+              const hidden = ele.data('hidden_children');
+              return hidden ? `${ele.data('name')} (+${hidden})` : ele.data('name');
+            },
             'text-outline-width': 0.75,
             'text-outline-color': '#0d0d1a',
             color: '#00ffff',
@@ -55,6 +87,17 @@ export default function GraphView({ graphData }) {
             'border-width': 2,
           }
         },
+        {
+          selector: 'node[kind = "group"]',
+          style: {
+            shape: 'round-rectangle',
+            'background-color': '#1a1a2e',
+            'border-color': '#7d2eff',
+            'border-style': 'dashed',
+            width: 70,
+            height: 34
+          }
+        },
         {
           selector: 'edge',
           style: {
@@ -87,6 +130,16 @@ export default function GraphView({ graphData }) {
     }
   };
 
+  // Who else the package's maintainers and repository publish (ownership index)
+  const fetchOwners = async pkgName => {
+    try {
+      const res = await fetch(`/api/owners/${pkgName}`);
+      setOwners(res.ok ? await res.json() : null);
+    } catch (err) {
+      setOwners(null);
+    }
+  };
+
   // Node click handler
   cyRef.current.on('tap', 'node', (evt) => {
     const nodeData = evt.target.data();
@@ -100,25 +153,56 @@ export default function GraphView({ graphData }) {
     });
 
     // Call fetchTyposquats here for the clicked node
-    fetchTyposquats(nodeData.id);
+    if (nodeData.kind === 'group') {
+      setTyposquats([]);
+      setOwners(null);
+    } else {
+      fetchTyposquats(nodeData.name || nodeData.id);
+      fetchOwners(nodeData.name || nodeData.id);
+    }
   });
 
+  // Double click expands a folded node (upload sessions only)
+  cyRef.current.on('dbltap', 'node', evt => expandNode(evt.target.id()));
+
   // Background click clears selection
   cyRef.current.on('tap', (evt) => {
     if (evt.target === cyRef.current) {
       setSelectedNode(null);
       setTyposquats([]);
+      setOwners(null);
     }
   });
 
   return () => cyRef.current.destroy();
 }, [graphData]);
 
+  // Apply streamed enrichment patches in one batch per render
+  useEffect(() => {
+    const cy = cyRef.current;
+    if (!cy || !patchQueue?.current.length) return;
+    const patches = patchQueue.current.splice(0);
+    cy.batch(() => {
+      patches.forEach(patch => {
+        patch.ids.forEach(id => cy.getElementById(id).data(patch.data));
+      });
+    });
+    setSelectedNode(node => {
+      if (!node || !patches.some(p => p.ids.includes(node.id))) return node;
+      return { ...node, ...cy.getElementById(node.id).data() };
+    });
+  }, [patchTick]);
+
   return (
     <div className="graph-container">
       <div id="cy" className="cytoscape-view" />
       <div className={`sidepanel-wrapper ${selectedNode ? 'open' : ''}`}>
-        <SidePanel node={selectedNode} typosquats={typosquats}/>
+        <SidePanel
+          node={selectedNode}
+          typosquats={typosquats}
+          owners={owners}
+          onExpand={graphData?.session ? expandNode : undefined}
+        />
       </div>
     </div>
   );
@@ -1,6 +1,8 @@
 import React from 'react';
 
-export default function SidePanel({ node, typosquats = []  }) {
+const PAGE_SIZE = 50; // children loaded per expansion (the server's default)
+
+export default function SidePanel({ node, typosquats = [], owners = null, onExpand }) {
   if (!node) {
     return (
       <aside className="sidepanel empty">
@@ -8,11 +10,31 @@ export default function SidePanel({ node, typosquats = []  }) {
       </aside>
     );
   }
-  
+
+  const expandButton = onExpand && node.hidden_children > 0 && (
+    <button onClick={() => onExpand(node.id)}>
+      Show {Math.min(node.hidden_children, PAGE_SIZE)} more
+    </button>
+  );
+
+  if (node.kind === 'group') {
+    return (
+      <aside className="sidepanel">
+        <h2 className="neon-text">{node.name}</h2>
+        <section className="panel-section">
+          <h3>Group</h3>
+          <p>{node.member_count} top-level dependencies by {node.grouping}</p>
+          <p>{node.child_count - node.hidden_children} shown</p>
+          {expandButton}
+        </section>
+      </aside>
+    );
+  }
+
   return (
     <aside className="sidepanel">
       <h2 className="neon-text">
-        {node.id}
+        {node.name || node.id}
         <small className="version-tag">v{node.version || 'N/A'}</small>
       </h2>
 
@@ -30,6 +52,22 @@ export default function SidePanel({ node, typosquats = []  }) {
         </section>
       )}
 
+      {node.occurrences !== undefined && (
+        <section className="panel-section">
+          <h3>Usage</h3>
+          <p>Installed: v{node.installed_version || 'N/A'}</p>
+          <p>Appears {node.occurrences} time(s), depth {node.depth}–{node.max_depth}</p>
+        </section>
+      )}
+
+      {node.child_count > 0 && (
+        <section className="panel-section">
+          <h3>Dependencies</h3>
+          <p>{node.child_count - node.hidden_children} of {node.child_count} shown</p>
+          {expandButton}
+        </section>
+      )}
+
       <section className="panel-section">
         <h3>Maintainers</h3>
         <p>{node.maintainer_count || 0} maintainers</p>
@@ -42,6 +80,24 @@ export default function SidePanel({ node, typosquats = []  }) {
         )}
       </section>
 
+      {owners && (
+        <section className="panel-section">
+          <h3>Ownership</h3>
+          <ul className="data-list">
+            {owners.maintainers.map(m => (
+              <li key={m.maintainer}>
+                <b>{m.maintainer}</b> maintains {m.packages} package(s), {m.sole} alone
+              </li>
+            ))}
+          </ul>
+          {owners.repository?.repository && (
+            <p>
+              {owners.repository.repository} publishes {owners.repository.packages} package(s)
+            </p>
+          )}
+        </section>
+      )}
+
       <section className="panel-section">
         <h3>Vulnerabilities</h3>
         <p>{node.vulnerability_count || 0} known issues</p>
@@ -56,6 +112,20 @@ export default function SidePanel({ node, typosquats = []  }) {
         )}
       </section>
 
+      {node.transitive_risk !== undefined && (
+        <section className="panel-section">
+          <h3>Transitive Risk</h3>
+          <p>Score {node.transitive_risk} from {node.risky_dependencies} risky dependencies</p>
+          <p>
+            {node.risk_distance === null
+              ? 'No risky package reachable'
+              : node.risk_distance === 0
+                ? 'Risky itself'
+                : `Nearest risky package ${node.risk_distance} hop(s) away`}
+          </p>
+        </section>
+      )}
+
       <section className="panel-section">
         <h3>Connected Packages</h3>
         <ul className="data-list">